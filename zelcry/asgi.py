@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zelcry.settings')
+# Marks a web server process, which may run the job scheduler (see
+# core/scheduler.py); set before setup so CoreConfig.ready() sees it
+os.environ.setdefault('ZELCRY_WEB_SERVER', '1')
 
 application = get_asgi_application()
@@ -1,11 +1,21 @@
 from django.contrib import admin
-from .models import UserProfile, PortfolioAsset, CryptoAssetDetails, ChatMessage, PriceAlert
+from .models import UserProfile, PortfolioAsset, CryptoAssetDetails, ChatMessage, PriceAlert, JobRun, CoinListing, XPEvent
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'risk_tolerance', 'xp_points', 'theme']
     list_filter = ['risk_tolerance', 'theme']
     search_fields = ['user__username', 'user__email']
+    # The balance only moves through XP awards (see XPEvent)
+    readonly_fields = ['xp_points']
+
+@admin.register(XPEvent)
+class XPEventAdmin(admin.ModelAdmin):
+    list_display = ['user', 'reason', 'points', 'created_at']
+    list_filter = ['reason', 'created_at']
+    search_fields = ['user__username']
+    date_hierarchy = 'created_at'
+    readonly_fields = [f.name for f in XPEvent._meta.fields]
 
 @admin.register(PortfolioAsset)
 class PortfolioAssetAdmin(admin.ModelAdmin):
@@ -41,3 +51,16 @@ class PriceAlertAdmin(admin.ModelAdmin):
     list_filter = ['condition', 'is_active', 'created_at']
     search_fields = ['user__username', 'coin_name', 'coin_id']
     date_hierarchy = 'created_at'
+
+@admin.register(CoinListing)
+class CoinListingAdmin(admin.ModelAdmin):
+    list_display = ['name', 'symbol', 'market_cap_rank', 'current_price', 'total_volume', 'synced_at']
+    search_fields = ['coin_id', 'name', 'symbol']
+    readonly_fields = [f.name for f in CoinListing._meta.fields]
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'name', 'last_status', 'last_started_at', 'last_duration_ms', 'run_count', 'failure_count']
+    list_filter = ['last_status']
+    search_fields = ['job_id', 'name', 'last_error']
+    readonly_fields = [f.name for f in JobRun._meta.fields]
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Replies to the same non-personal prompt are reused for this long. Each
+# worker keeps the most recently used ones in memory; the shared cache lets
+# a reply generated by one worker serve the others.
+RESPONSE_TTL = 60 * 60 * 6
+LOCAL_MAX_ENTRIES = 512
+
+_lock = threading.Lock()
+_local = OrderedDict()
+_stats = {
+    'hits': 0,
+    'local_hits': 0,
+    'misses': 0,
+    'bypassed': 0,
+    'stored': 0,
+    'evictions': 0,
+    'saved_seconds': 0.0,
+}
+
+
+def normalize_message(message):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', message.lower()).split())
+
+
+def response_key(message, context, model, conversation_history=None):
+    """Key for a prompt; follow-ups also match on the normalized earlier turns"""
+    turns = [
+        f"{turn.get('role')}:{normalize_message(turn.get('content') or '')}"
+        for turn in conversation_history or []
+    ]
+    fingerprint = hashlib.sha1(
+        '\0'.join([model, context, *turns, normalize_message(message)]).encode()
+    ).hexdigest()
+    return f'ai_response_{fingerprint}'
+
+
+def _record(**counts):
+    with _lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+
+def _remember(key, entry):
+    with _lock:
+        _local[key] = entry
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def get_response(key):
+    """Cached reply for key, checking this worker's LRU before the shared cache"""
+    with _lock:
+        entry = _local.get(key)
+        if entry and entry['expires_at'] > time.time():
+            _local.move_to_end(key)
+        elif entry:
+            del _local[key]
+            entry = None
+
+    if entry:
+        _record(hits=1, local_hits=1, saved_seconds=entry['elapsed'])
+        return entry['response']
+
+    entry = cache.get(key)
+    if entry:
+        _remember(key, entry)
+        _record(hits=1, saved_seconds=entry['elapsed'])
+        return entry['response']
+
+    _record(misses=1)
+    return None
+
+
+def set_response(key, response, elapsed):
+    """Store a successful reply and how long it took to generate"""
+    entry = {'response': response, 'elapsed': elapsed, 'expires_at': time.time() + RESPONSE_TTL}
+    _remember(key, entry)
+    cache.set(key, entry, RESPONSE_TTL)
+    _record(stored=1)
+
+
+def record_bypass():
+    """Count a personalized prompt that skipped the cache"""
+    _record(bypassed=1)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['local_entries'] = len(_local)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    stats['saved_seconds'] = round(stats['saved_seconds'], 3)
+    return stats
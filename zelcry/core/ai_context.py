@@ -0,0 +1,92 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from .market_data import get_coin_prices
+from .models import PortfolioAsset, UserProfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Holdings rarely change between chat turns, so the aggregated rows are
+# cached until a PortfolioAsset or UserProfile signal drops them. Values
+# are priced from the shared price cache when the context is rendered.
+CONTEXT_TIMEOUT = 60 * 60 * 24
+TOP_HOLDINGS = 5
+
+
+def _cache_key(user_id):
+    return f'ai_user_context_{user_id}'
+
+
+def invalidate_user_context(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def load_user_holdings(user):
+    """Risk tolerance plus holdings aggregated per coin, cached per user"""
+    key = _cache_key(user.pk)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    rows = PortfolioAsset.objects.filter(user=user).values('coin_id', 'coin_symbol').annotate(
+        total_quantity=Sum('quantity'),
+        total_invested=Sum(ExpressionWrapper(F('quantity') * F('purchase_price'), output_field=DecimalField())),
+    ).order_by('coin_id')
+    risk_tolerance = UserProfile.objects.filter(user=user).values_list('risk_tolerance', flat=True).first()
+
+    data = {
+        'username': user.username,
+        'risk_tolerance': risk_tolerance or 'Low',
+        'holdings': [
+            {
+                'coin_id': row['coin_id'],
+                'symbol': row['coin_symbol'].upper(),
+                'quantity': row['total_quantity'] or Decimal('0'),
+                'invested': row['total_invested'] or Decimal('0'),
+            }
+            for row in rows
+        ],
+    }
+    cache.set(key, data, CONTEXT_TIMEOUT)
+    return data
+
+
+def _money(value):
+    return f"${value:,.0f}" if value >= 100 else f"${value:,.2f}"
+
+
+def _quantity(value):
+    return f"{value.normalize():f}"
+
+
+def build_user_context(user):
+    """
+    Compact, deterministic prompt context for a signed-in user: risk
+    tolerance, portfolio value and the largest holdings by current value.
+    """
+    data = load_user_holdings(user)
+    holdings = data['holdings']
+    prices = get_coin_prices(holding['coin_id'] for holding in holdings)
+
+    valued = []
+    for holding in holdings:
+        price = prices.get(holding['coin_id'], {}).get('usd') or 0
+        valued.append((float(holding['quantity']) * price, holding))
+    valued.sort(key=lambda item: (-item[0], item[1]['coin_id']))
+    total = sum(value for value, holding in valued)
+    invested = float(sum(holding['invested'] for holding in holdings))
+
+    lines = [f"User: {data['username']}", f"Risk tolerance: {data['risk_tolerance']}"]
+    if not holdings:
+        lines.append("Portfolio: no holdings yet")
+    else:
+        change = f", {((total - invested) / invested * 100):+.1f}% vs cost" if invested and total else ""
+        lines.append(f"Portfolio: {len(holdings)} coins worth {_money(total)}{change}")
+        top = []
+        for value, holding in valued[:TOP_HOLDINGS]:
+            share = f" ({value / total * 100:.0f}%)" if total else ""
+            top.append(f"{holding['symbol']} {_quantity(holding['quantity'])} = {_money(value)}{share}")
+        lines.append(f"Top holdings: {'; '.join(top)}")
+    lines.append("Focus on sustainable crypto investing. Be concise and helpful.")
+    return "\n".join(lines)
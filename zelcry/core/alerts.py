@@ -0,0 +1,162 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from functools import reduce
+import operator
+import threading
+import time
+from django.db.models import Q
+from django.utils import timezone
+from .cache_utils import state_cache
+from .models import PriceAlert
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set by PriceAlert signals when an existing alert is edited or deleted;
+# new alerts are picked up incrementally by primary key instead.
+INDEX_DIRTY_KEY = 'price_alert_index_dirty'
+INDEX_REBUILD_SECONDS = 900
+LOAD_CHUNK_SIZE = 20000
+
+_lock = threading.Lock()
+_index = {
+    'coins': {},
+    'max_id': 0,
+    'built_at': 0,
+    'size': 0,
+}
+
+
+def mark_index_dirty():
+    """Force a full index rebuild on the next evaluation tick"""
+    state_cache.set(INDEX_DIRTY_KEY, True, None)
+
+
+def _empty_side():
+    # Parallel arrays sorted by target price: thresholds and alert ids.
+    return {'targets': array('d'), 'ids': array('q')}
+
+
+def _load(queryset):
+    """Stream active alerts ordered by threshold into per-coin sorted arrays"""
+    coins = {}
+    max_id = 0
+    rows = queryset.order_by('coin_id', 'condition', 'target_price').values_list(
+        'coin_id', 'condition', 'target_price', 'id'
+    ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    for coin_id, condition, target_price, alert_id in rows:
+        side = coins.setdefault(coin_id, {}).setdefault(condition, _empty_side())
+        side['targets'].append(float(target_price))
+        side['ids'].append(alert_id)
+        max_id = max(max_id, alert_id)
+    return coins, max_id
+
+
+def _insert(coins, coin_id, condition, target, alert_id):
+    side = coins.setdefault(coin_id, {}).setdefault(condition, _empty_side())
+    position = bisect_right(side['targets'], target)
+    side['targets'].insert(position, target)
+    side['ids'].insert(position, alert_id)
+
+
+def sync_index():
+    """
+    Bring the in-process alert index up to date.
+    Rebuilds from scratch when an existing alert changed or the index is old;
+    otherwise only alerts created since the last sync are inserted.
+    """
+    dirty = state_cache.get(INDEX_DIRTY_KEY)
+    stale = time.time() - _index['built_at'] > INDEX_REBUILD_SECONDS
+
+    if dirty or stale:
+        state_cache.delete(INDEX_DIRTY_KEY)
+        coins, max_id = _load(PriceAlert.objects.filter(is_active=True))
+        _index.update(coins=coins, max_id=max_id, built_at=time.time())
+    else:
+        new_alerts = PriceAlert.objects.filter(is_active=True, id__gt=_index['max_id']).values_list(
+            'coin_id', 'condition', 'target_price', 'id'
+        )
+        for coin_id, condition, target_price, alert_id in new_alerts:
+            _insert(_index['coins'], coin_id, condition, float(target_price), alert_id)
+            _index['max_id'] = max(_index['max_id'], alert_id)
+
+    _index['size'] = sum(len(side['ids']) for sides in _index['coins'].values() for side in sides.values())
+
+
+def find_crossed(prices):
+    """
+    Bisect each coin's sorted thresholds against its current price.
+    'above' alerts fire for every target <= price (a prefix of the array),
+    'below' alerts for every target >= price (a suffix).
+    Returns {(coin_id, condition): (price, crossed_ids)} for non-empty sets.
+    """
+    crossed = {}
+    for coin_id, sides in _index['coins'].items():
+        price = prices.get(coin_id, {}).get('usd')
+        if not price:
+            continue
+
+        above = sides.get('above')
+        if above:
+            end = bisect_right(above['targets'], price)
+            if end:
+                crossed[(coin_id, 'above')] = (price, above['ids'][:end])
+
+        below = sides.get('below')
+        if below:
+            start = bisect_left(below['targets'], price)
+            if start < len(below['ids']):
+                crossed[(coin_id, 'below')] = (price, below['ids'][start:])
+    return crossed
+
+
+def _drop_crossed(crossed):
+    for (coin_id, condition), (price, ids) in crossed.items():
+        side = _index['coins'][coin_id][condition]
+        if condition == 'above':
+            del side['targets'][:len(ids)]
+            del side['ids'][:len(ids)]
+        else:
+            del side['targets'][len(side['targets']) - len(ids):]
+            del side['ids'][len(side['ids']) - len(ids):]
+        _index['size'] -= len(ids)
+
+
+def evaluate_price_alerts(prices):
+    """
+    Trigger every active alert crossed by the latest price tick.
+    The crossed thresholds are found by bisection in memory and then flipped
+    with one UPDATE whose WHERE clause repeats each coin's price predicate,
+    so the statement size depends on the number of coins, not alerts.
+    Returns the number of alerts triggered.
+    """
+    with _lock:
+        sync_index()
+        crossed = find_crossed(prices)
+        if not crossed:
+            return 0
+
+        predicates = []
+        for (coin_id, condition), (price, ids) in crossed.items():
+            threshold = 'target_price__lte' if condition == 'above' else 'target_price__gte'
+            predicates.append(Q(coin_id=coin_id, condition=condition, **{threshold: Decimal(str(price))}))
+
+        triggered = PriceAlert.objects.filter(reduce(operator.or_, predicates), is_active=True).update(
+            triggered=True,
+            is_active=False,
+            triggered_at=timezone.now()
+        )
+        _drop_crossed(crossed)
+
+    logger.info(f"Triggered {triggered} price alerts across {len(crossed)} coin thresholds")
+    return triggered
+
+
+def get_index_stats():
+    return {
+        'coins': len(_index['coins']),
+        'alerts': _index['size'],
+        'max_id': _index['max_id'],
+        'built_at': _index['built_at'],
+    }
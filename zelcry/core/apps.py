@@ -8,6 +8,7 @@ class CoreConfig(AppConfig):
     def ready(self):
         try:
             from . import scheduler
-            scheduler.start_scheduler()
+            if scheduler.should_start_in_process():
+                scheduler.start_scheduler()
         except Exception as e:
             print(f"Scheduler initialization error: {e}")
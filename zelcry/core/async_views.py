@@ -0,0 +1,87 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import aget_object_or_404, render
+from .charts import get_chart_payload
+from .crypto_news import get_crypto_news_snapshot
+from .market_analysis import get_latest_market_analysis
+from .market_data import aget_coin_prices, get_market_snapshot
+from .models import CryptoAssetDetails, PortfolioAsset, Watchlist
+from . import views
+
+# Async variants of the I/O-heavy pages, routed by zelcry/urls.py when
+# ASYNC_VIEWS is on and the site is served over ASGI. Independent loads
+# start together; the context and template are shared with views.py.
+
+# Cache-only reads never touch the database, so they may run on any thread
+# in parallel; anything that can query the ORM keeps Django's default
+# thread-sensitive executor.
+_market_snapshot = sync_to_async(get_market_snapshot, thread_sensitive=False)
+_news_snapshot = sync_to_async(get_crypto_news_snapshot, thread_sensitive=False)
+_chart_payload = sync_to_async(get_chart_payload)
+_market_analysis = sync_to_async(get_latest_market_analysis, thread_sensitive=False)
+
+
+async def _render(request, template_name, build_context, *args):
+    """Build the context (which may touch the ORM) and render it off the event loop"""
+    def render_page():
+        return render(request, template_name, build_context(*args))
+    return await sync_to_async(render_page)()
+
+
+async def _with_prices(queryset):
+    """Rows of queryset plus one batched price lookup for their coins"""
+    rows = [row async for row in queryset]
+    return rows, await aget_coin_prices(row.coin_id for row in rows)
+
+
+@login_required
+async def dashboard(request):
+    user = await request.auser()
+    market, (portfolio_assets, prices), bitcoin_chart_data = await asyncio.gather(
+        _market_snapshot(100),
+        _with_prices(PortfolioAsset.objects.filter(user=user)),
+        _chart_payload('bitcoin', days=30),
+    )
+    return await _render(
+        request, 'dashboard.html', views.build_dashboard_context,
+        user, market, portfolio_assets, prices, bitcoin_chart_data
+    )
+
+
+@login_required
+async def crypto_details(request, coin_id):
+    # Unknown coins 404 before anything is fetched upstream or cached
+    crypto = await aget_object_or_404(CryptoAssetDetails, coin_id=coin_id)
+    chart_days = views.get_chart_days(request)
+    prices, chart_data = await asyncio.gather(
+        aget_coin_prices([coin_id]),
+        _chart_payload(coin_id, days=chart_days),
+    )
+    return await _render(
+        request, 'crypto_details.html', views.build_crypto_details_context,
+        crypto, prices.get(coin_id, {}), chart_data, chart_days
+    )
+
+
+async def news(request):
+    market, news_snapshot = await asyncio.gather(_market_snapshot(100), _news_snapshot())
+    return await _render(request, 'news.html', views.build_news_context, request, market, news_snapshot)
+
+
+@login_required
+async def watchlist(request):
+    if request.method == 'POST':
+        return await sync_to_async(views.watchlist)(request)
+
+    user = await request.auser()
+    watchlist_items, prices = await _with_prices(Watchlist.objects.filter(user=user))
+    return await _render(request, 'watchlist.html', views.build_watchlist_context, watchlist_items, prices)
+
+
+@login_required
+async def market_insights(request):
+    """AI-powered market insights and personalized recommendations"""
+    user = await request.auser()
+    market, analysis = await asyncio.gather(_market_snapshot(100), _market_analysis())
+    return await _render(request, 'market_insights.html', views.build_market_insights_context, user, market, analysis)
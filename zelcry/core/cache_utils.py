@@ -0,0 +1,219 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+import hashlib
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.connection import ConnectionProxy
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines fall back to per-process locks
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Entries outlive their freshness window so a slow or failing upstream
+# degrades to slightly old data instead of an empty page.
+STALE_TIMEOUT = 60 * 60 * 6
+
+# Shared state that is written by jobs and signals and never re-derived on
+# read, kept apart from the per-user entries that fill (and cull) 'default'
+state_cache = ConnectionProxy(caches, 'state')
+
+LOCK_WAIT_TIMEOUT = 15
+LOCK_POLL_INTERVAL = 0.05
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='zelcry-revalidate')
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+_local_locks = {}
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'stale_hits': 0,
+    'misses': 0,
+    'recomputes': 0,
+    'lock_waits': 0,
+    'lock_wait_seconds': 0.0,
+    'lock_timeouts': 0,
+    'revalidations_skipped': 0,
+}
+
+
+def record(**counts):
+    """Add to the per-process cache counters"""
+    with _stats_lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+
+def get_stats():
+    """Snapshot of this process's cache hit/miss/lock-wait counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else None
+    stats['lock_wait_seconds'] = round(stats['lock_wait_seconds'], 3)
+    stats['backend'] = settings.CACHES['default']['BACKEND']
+    stats['pid'] = os.getpid()
+    return stats
+
+
+def make_entry(data):
+    return {'data': data, 'fetched_at': time.time()}
+
+
+def set_entry(key, data, timeout=STALE_TIMEOUT, store=cache):
+    """Store data with the time it was fetched"""
+    store.set(key, make_entry(data), timeout)
+
+
+def set_entries(mapping, timeout=STALE_TIMEOUT):
+    """Store several key -> data pairs sharing one fetch time"""
+    fetched_at = time.time()
+    cache.set_many({key: {'data': data, 'fetched_at': fetched_at} for key, data in mapping.items()}, timeout)
+
+
+def is_fresh(entry, fresh_for):
+    return entry is not None and time.time() - entry['fetched_at'] < fresh_for
+
+
+def as_of(entry):
+    """Aware datetime of when an entry was fetched, or None"""
+    if not entry:
+        return None
+    return datetime.fromtimestamp(entry['fetched_at'], tz=dt_timezone.utc)
+
+
+def _lock_path(key):
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return os.path.join(settings.CACHE_LOCK_DIR, f'{digest}.lock')
+
+
+@contextmanager
+def _local_lock(key, blocking, timeout):
+    with _in_flight_lock:
+        lock = _local_locks.setdefault(key, threading.Lock())
+    acquired = lock.acquire(blocking, timeout if blocking else -1)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+
+
+@contextmanager
+def _file_lock(key, blocking, timeout):
+    os.makedirs(settings.CACHE_LOCK_DIR, exist_ok=True)
+    fd = os.open(_lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+        yield acquired
+    finally:
+        if acquired:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@contextmanager
+def flight_lock(key, blocking=True, timeout=LOCK_WAIT_TIMEOUT):
+    """
+    Exclusive lock on key shared by every thread and worker process.
+    Yields True once held, or False if it could not be taken (immediately
+    when blocking=False, otherwise after timeout seconds).
+    """
+    lock = _file_lock if fcntl else _local_lock
+    started = time.monotonic()
+    with lock(key, blocking, timeout) as acquired:
+        waited = time.monotonic() - started
+        if waited >= LOCK_POLL_INTERVAL:
+            record(lock_waits=1, lock_wait_seconds=waited)
+        if blocking and not acquired:
+            record(lock_timeouts=1)
+        yield acquired
+
+
+def revalidate(key, refresh, fresh_for=None, store=cache):
+    """
+    Run refresh() on a background thread unless a refresh for key is already
+    running in this process or, holding the flight lock, in another one.
+    """
+    with _in_flight_lock:
+        if key in _in_flight:
+            return
+        _in_flight.add(key)
+
+    def run():
+        try:
+            with flight_lock(key, blocking=False) as acquired:
+                if not acquired:
+                    record(revalidations_skipped=1)
+                    return
+                if fresh_for is not None and is_fresh(store.get(key), fresh_for):
+                    record(revalidations_skipped=1)
+                    return
+                record(recomputes=1)
+                refresh()
+        except Exception as e:
+            logger.error(f"Error revalidating {key}: {e}")
+        finally:
+            with _in_flight_lock:
+                _in_flight.discard(key)
+
+    _executor.submit(run)
+
+
+def compute_once(key, refresh, store=cache):
+    """
+    Single-flight fill of a missing key: one caller runs refresh() while the
+    rest wait on the lock and then read what it stored. Returns the entry.
+    """
+    with flight_lock(key):
+        entry = store.get(key)
+        if entry is not None:
+            return entry
+        record(recomputes=1)
+        refresh()
+        return store.get(key)
+
+
+def get_stale_while_revalidate(key, refresh, fresh_for, block_on_miss=False, store=cache):
+    """
+    Return the cached entry for key, never waiting on upstream when one exists.
+    Stale entries are served as-is while refresh() runs in the background.
+    On a cold miss refresh() is scheduled too, unless block_on_miss is set,
+    in which case it runs inline, coalesced with any concurrent callers.
+    Entries live in store (the default cache unless given).
+    Returns the entry dict or None.
+    """
+    entry = store.get(key)
+    if entry is not None:
+        if is_fresh(entry, fresh_for):
+            record(hits=1)
+        else:
+            record(stale_hits=1)
+            revalidate(key, refresh, fresh_for, store)
+        return entry
+
+    record(misses=1)
+    if block_on_miss:
+        return compute_once(key, refresh, store)
+
+    revalidate(key, refresh, fresh_for, store)
+    return None
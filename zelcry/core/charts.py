@@ -0,0 +1,121 @@
+import json
+import numpy as np
+from datetime import timedelta
+from django.utils import timezone
+from .cache_utils import STALE_TIMEOUT, get_stale_while_revalidate, set_entry
+from .price_history import get_price_series
+
+# Points drawn per chart; enough for a smooth line on a phone or desktop.
+DEFAULT_POINT_BUDGET = 120
+CHART_FRESH_SECONDS = 600
+CHART_RANGES = (1, 7, 30, 90)
+EMPTY_CHART_TIMEOUT = 60
+# Minute history only exists for coins the price job tracks, and only since
+# it started tracking them; a minute series starting later than this after
+# the range start gives way to the hourly series backfill seeds.
+MINUTE_COVERAGE_SLACK = timedelta(hours=1)
+
+
+def lttb(x, y, budget):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the next bucket's average, so spikes and dips survive. Returns indices.
+    """
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(budget - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def format_labels(timestamps_ms, with_time=False):
+    """Vectorized 'MM/DD' (or 'MM/DD HH:MM') labels for epoch-millisecond timestamps"""
+    if len(timestamps_ms) == 0:
+        return []
+    moments = np.asarray(timestamps_ms, dtype=np.int64).astype('datetime64[ms]')
+    text = np.datetime_as_string(moments, unit='m', timezone='UTC').astype('U16')
+    width = 11 if with_time else 5
+    # 'YYYY-MM-DDTHH:MM' -> drop the year by slicing the character grid
+    chars = text.view('U1').reshape(-1, 16)[:, 5:5 + width].copy()
+    labels = chars.view(f'U{width}').ravel()
+    labels = np.char.replace(labels, '-', '/', count=1)
+    if with_time:
+        labels = np.char.replace(labels, 'T', ' ')
+    return labels.tolist()
+
+
+def _resolution_for(days):
+    if days <= 2:
+        return 'minute'
+    if days <= 90:
+        return 'hour'
+    return 'day'
+
+
+def _chart_series(coin_id, days):
+    """Price series at the range's resolution, or hourly when minute points do not cover the range"""
+    resolution = _resolution_for(days)
+    series = get_price_series(coin_id, days, resolution=resolution)
+    if resolution != 'minute':
+        return series
+    since = timezone.now() - timedelta(days=days)
+    if series and series[0][0] <= since + MINUTE_COVERAGE_SLACK:
+        return series
+    hourly = get_price_series(coin_id, days, resolution='hour')
+    return hourly if hourly and (not series or hourly[0][0] < series[0][0]) else series
+
+
+def build_chart_payload(coin_id, days=30, points=DEFAULT_POINT_BUDGET):
+    """Downsampled labels/prices for a coin's local history"""
+    series = _chart_series(coin_id, days)
+    if not series:
+        return {'labels': [], 'prices': []}
+
+    timestamps = np.fromiter((moment.timestamp() * 1000 for moment, price in series), dtype=np.int64, count=len(series))
+    prices = np.fromiter((price for moment, price in series), dtype=np.float64, count=len(series))
+
+    keep = lttb(timestamps, prices, points)
+    return {
+        'labels': format_labels(timestamps[keep], with_time=days <= 7),
+        'prices': prices[keep].tolist(),
+    }
+
+
+def get_chart_payload(coin_id, days=30, points=DEFAULT_POINT_BUDGET):
+    """
+    Chart JSON shared by every viewer, cached per (coin, range, resolution,
+    point budget) and rebuilt in the background once it is stale.
+    """
+    key = f'chart_{coin_id}_{days}d_{_resolution_for(days)}_{points}'
+
+    def refresh():
+        payload = build_chart_payload(coin_id, days, points)
+        # An empty chart usually means history is still being backfilled,
+        # so only keep it briefly.
+        set_entry(key, json.dumps(payload), timeout=STALE_TIMEOUT if payload['prices'] else EMPTY_CHART_TIMEOUT)
+
+    entry = get_stale_while_revalidate(key, refresh, CHART_FRESH_SECONDS, block_on_miss=True)
+    return entry['data'] if entry else json.dumps({'labels': [], 'prices': []})
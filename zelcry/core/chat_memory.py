@@ -0,0 +1,95 @@
+import re
+from django.core.cache import cache
+from .models import ChatMessage
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Prompt size stays flat however long a conversation runs: at most
+# HISTORY_TURNS recent turns are read, as many as fit HISTORY_TOKEN_BUDGET
+# are sent verbatim, and older turns survive only as a short rolling
+# summary of what the user asked about.
+HISTORY_TURNS = 12
+HISTORY_TOKEN_BUDGET = 1500
+SUMMARY_TOKEN_BUDGET = 200
+SUMMARY_TIMEOUT = 60 * 60 * 24 * 7
+GIST_LENGTH = 120
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def _conversation(user=None, session_id=None):
+    if user is not None:
+        return ChatMessage.objects.filter(user=user), f'chat_summary_user_{user.pk}'
+    return ChatMessage.objects.filter(session_id=session_id, user__isnull=True), f'chat_summary_session_{session_id}'
+
+
+def _gist(message):
+    """First sentence of a question, clipped to GIST_LENGTH characters"""
+    sentence = re.split(r'(?<=[.?!])\s', ' '.join(message.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= GIST_LENGTH else sentence[:GIST_LENGTH - 1] + '…'
+
+
+def _fold(summary, turns):
+    """Append the gist of each (created_at, message) turn, oldest first, dropping the oldest points over budget"""
+    points = summary['points'] + [_gist(message) for created_at, message in turns]
+    while points and estimate_tokens('; '.join(points)) > SUMMARY_TOKEN_BUDGET:
+        points.pop(0)
+    return {'points': points, 'through': turns[-1][0]}
+
+
+def load_history(user=None, session_id=None):
+    """
+    Recent turns of a user's (or guest session's) conversation as Groq
+    chat messages, newest turns first into the token budget, plus a
+    summary line covering older turns (empty when there are none).
+    """
+    if user is None and not session_id:
+        return [], ''
+    conversation, summary_key = _conversation(user, session_id)
+
+    rows = list(
+        conversation.order_by('-created_at').values_list('created_at', 'message', 'response')[:HISTORY_TURNS]
+    )
+
+    kept = []
+    used = 0
+    for created_at, message, response in rows:
+        cost = estimate_tokens(message) + estimate_tokens(response)
+        if used + cost > HISTORY_TOKEN_BUDGET:
+            break
+        kept.append((message, response))
+        used += cost
+    kept.reverse()
+
+    # Turns that no longer fit are folded into the summary exactly once:
+    # those over budget in this window plus any that slid out of it since
+    # the last fold (bounded to one window's worth).
+    dropped = [(created_at, message) for created_at, message, response in rows[len(kept):]]
+    summary = cache.get(summary_key) or {'points': [], 'through': None}
+    if rows and len(rows) == HISTORY_TURNS:
+        slid_out = conversation.filter(created_at__lt=rows[-1][0])
+        if summary['through']:
+            slid_out = slid_out.filter(created_at__gt=summary['through'])
+        dropped += list(slid_out.order_by('-created_at').values_list('created_at', 'message')[:HISTORY_TURNS])
+
+    new_turns = sorted(
+        (turn for turn in dropped if summary['through'] is None or turn[0] > summary['through']),
+        key=lambda turn: turn[0]
+    )
+    if new_turns:
+        summary = _fold(summary, new_turns)
+        cache.set(summary_key, summary, SUMMARY_TIMEOUT)
+
+    history = []
+    for message, response in kept:
+        history.append({"role": "user", "content": message})
+        history.append({"role": "assistant", "content": response})
+
+    summary_text = ''
+    if summary['points']:
+        summary_text = f"Earlier in this conversation the user asked about: {'; '.join(summary['points'])}"
+    return history, summary_text
@@ -0,0 +1,310 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import hashlib
+import re
+import threading
+import time
+from django.utils import timezone
+from . import http_client
+from .cache_utils import as_of, set_entry, state_cache
+from .market_data import COINGECKO_API_URL, fetch_market_data
+from .models import CoinListing
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The top CATALOG_MARKET_PAGES * CATALOG_PAGE_SIZE coins by market cap get
+# fresh market fields on every sync; /coins/list adds every other coin
+# (name and symbol only) once a day so search covers the whole catalog.
+# Each worker keeps a search index over the listings; a sync that changes
+# an indexed field (a new coin, or a symbol, name, rank or image) stores a
+# new digest of them under INDEX_VERSION_KEY, and a worker reloads its
+# index when that differs from the one it loaded.
+CATALOG_PAGE_SIZE = 250
+CATALOG_MARKET_PAGES = 8
+CATALOG_LIST_INTERVAL = 60 * 60 * 24
+BULK_BATCH_SIZE = 500
+CATALOG_KEY = 'coin_catalog'
+LIST_GUARD_KEY = 'coin_catalog_list_synced'
+INDEX_VERSION_KEY = 'coin_catalog_index_version'
+INDEX_FIELDS = ['coin_id', 'symbol', 'name', 'market_cap_rank', 'image']
+
+MARKET_FIELDS = [
+    'symbol', 'name', 'image', 'market_cap_rank', 'current_price', 'market_cap',
+    'total_volume', 'price_change_24h', 'price_change_7d', 'synced_at',
+]
+
+# Coins that drop out of the top coins keep only their name and symbol, so
+# no sort lists them with market numbers that are no longer updated
+DROPPED_FIELDS = {
+    'market_cap_rank': None,
+    'current_price': None,
+    'market_cap': None,
+    'total_volume': None,
+    'price_change_24h': None,
+    'price_change_7d': None,
+}
+
+# Page sorts: the field that must be present and its indexed ordering
+SORTS = {
+    'rank': ('market_cap_rank', 'market_cap_rank'),
+    'volume': ('total_volume', '-total_volume'),
+    'change': ('price_change_24h', '-price_change_24h'),
+}
+
+# Fuzzy matches need this share of the trigrams of every word in the query
+FUZZY_MIN_SCORE = 0.5
+# Ranking a short, common prefix means visiting thousands of terms, and
+# typeahead sends the same few prefixes over and over, so their results
+# are kept until the next index load.
+BROAD_PREFIX_TERMS = 500
+MEMO_MAX_ENTRIES = 2048
+
+_lock = threading.Lock()
+_index = {'version': None, 'coins': [], 'terms': [], 'trigrams': {}, 'memo': {}, 'loads': 0}
+_stats = {'searches': 0, 'memo_hits': 0, 'search_seconds': 0.0}
+
+
+def _listing(coin, synced_at):
+    return CoinListing(
+        coin_id=coin['id'],
+        symbol=coin.get('symbol') or '',
+        name=coin.get('name') or coin['id'],
+        image=coin.get('image') or '',
+        market_cap_rank=coin.get('market_cap_rank'),
+        current_price=coin.get('current_price'),
+        market_cap=coin.get('market_cap'),
+        total_volume=coin.get('total_volume'),
+        price_change_24h=coin.get('price_change_percentage_24h'),
+        price_change_7d=coin.get('price_change_percentage_7d_in_currency'),
+        synced_at=synced_at,
+    )
+
+
+def _sync_coin_list():
+    """Insert coins from /coins/list that are not in the catalog yet, at most once a day"""
+    if state_cache.get(LIST_GUARD_KEY):
+        return 0
+    coins = http_client.get_json(f'{COINGECKO_API_URL}/coins/list', timeout=30)
+    if not coins:
+        return 0
+    known = set(CoinListing.objects.values_list('coin_id', flat=True))
+    new = [
+        CoinListing(coin_id=coin['id'], symbol=coin.get('symbol') or '', name=coin.get('name') or coin['id'])
+        for coin in coins if coin.get('id') and coin['id'] not in known
+    ]
+    CoinListing.objects.bulk_create(new, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    state_cache.set(LIST_GUARD_KEY, True, CATALOG_LIST_INTERVAL)
+    return len(new)
+
+
+def sync_coin_catalog():
+    """
+    Upsert market fields for the top coins and add any coins not yet
+    listed. Coins that dropped out of a complete sync lose their market
+    fields and leave every sorted listing but stay searchable. Returns the
+    number of listings written.
+    """
+    synced_at = timezone.now()
+    listings = {}
+    complete = False
+    for page in range(1, CATALOG_MARKET_PAGES + 1):
+        coins = fetch_market_data(CATALOG_PAGE_SIZE, page)
+        if not coins:
+            break
+        for coin in coins:
+            if coin.get('id'):
+                listings[coin['id']] = _listing(coin, synced_at)
+        if len(coins) < CATALOG_PAGE_SIZE or page == CATALOG_MARKET_PAGES:
+            complete = True
+            break
+
+    CoinListing.objects.bulk_create(
+        list(listings.values()),
+        batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['coin_id'],
+        update_fields=MARKET_FIELDS,
+    )
+    if complete:
+        CoinListing.objects.filter(market_cap_rank__isnull=False, synced_at__lt=synced_at).update(**DROPPED_FIELDS)
+    added = _sync_coin_list()
+
+    written = len(listings) + added
+    if written:
+        set_entry(CATALOG_KEY, {'coins': CoinListing.objects.count()}, None, store=state_cache)
+        _update_index_version()
+    logger.info(f"Coin catalog sync: {len(listings)} market rows, {added} new listings")
+    return written
+
+
+def _index_rows():
+    return CoinListing.objects.order_by('coin_id').values_list(*INDEX_FIELDS)
+
+
+def _update_index_version():
+    """Store a digest of the indexed fields, so workers reload only when one changed"""
+    digest = hashlib.sha1(repr(list(_index_rows())).encode()).hexdigest()
+    if state_cache.get(INDEX_VERSION_KEY) != digest:
+        state_cache.set(INDEX_VERSION_KEY, digest, None)
+        logger.info(f"Coin search index version now {digest[:12]}")
+
+
+def catalog_as_of():
+    """When the catalog was last synced, or None before the first sync"""
+    return as_of(state_cache.get(CATALOG_KEY))
+
+
+def _normalize(text):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def _trigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _load(version):
+    coins = sorted(
+        ({'id': coin_id, 'symbol': symbol, 'name': name, 'rank': rank, 'image': image}
+         for coin_id, symbol, name, rank, image in _index_rows()),
+        key=lambda coin: (coin['rank'] is None, coin['rank'] or 0, coin['id'])
+    )
+
+    # Positions follow market cap rank, so lower positions win ties
+    terms = []
+    trigrams = defaultdict(list)
+    for position, coin in enumerate(coins):
+        symbol = _normalize(coin['symbol'])
+        name = _normalize(coin['name'])
+        for term in {symbol, name, coin['id'], *name.split()}:
+            if term:
+                terms.append((term, position))
+        for gram in _trigrams(name) | _trigrams(symbol):
+            trigrams[gram].append(position)
+    terms.sort()
+
+    _index.update(version=version, coins=coins, terms=terms, trigrams=dict(trigrams), memo={}, loads=_index['loads'] + 1)
+    logger.info(f"Loaded coin search index ({len(coins)} coins, {len(terms)} terms)")
+
+
+def _get_index():
+    version = state_cache.get(INDEX_VERSION_KEY, 0)
+    if _index['version'] != version:
+        with _lock:
+            if _index['version'] != version:
+                _load(version)
+    return _index
+
+
+def is_ready():
+    """True once the catalog has been synced into this database"""
+    return bool(_get_index()['coins'])
+
+
+def _prefix_matches(index, query):
+    """position -> 0 for an exact term match, 1 for a prefix match, plus the number of terms visited"""
+    terms = index['terms']
+    start = bisect_left(terms, (query,))
+    matches = {}
+    visited = 0
+    for i in range(start, len(terms)):
+        term, position = terms[i]
+        if not term.startswith(query):
+            break
+        visited += 1
+        if term == query or position not in matches:
+            matches[position] = 0 if term == query else 1
+    return matches, visited
+
+
+def _fuzzy_matches(index, query):
+    """
+    position -> mean share of each query word's trigrams found in the coin's
+    name or symbol, for coins where every word reaches FUZZY_MIN_SCORE
+    """
+    words = query.split()
+    scores = None
+    for word in words:
+        grams = _trigrams(word)
+        counts = Counter()
+        for gram in grams:
+            counts.update(index['trigrams'].get(gram, ()))
+        matched = {position: count / len(grams) for position, count in counts.items() if count / len(grams) >= FUZZY_MIN_SCORE}
+        if scores is not None:
+            matched = {position: scores[position] + score for position, score in matched.items() if position in scores}
+        if not matched:
+            return {}
+        scores = matched
+    return {position: score / len(words) for position, score in scores.items()}
+
+
+def search(query, limit=10):
+    """
+    Coins matching query, best first: exact symbol/name/word matches, then
+    prefix matches, then (for queries of three or more characters) fuzzy
+    trigram matches, each by market cap rank.
+    """
+    query = _normalize(query)
+    if not query:
+        return []
+
+    index = _get_index()
+    started = time.perf_counter()
+    ranked = index['memo'].get((query, limit))
+    if ranked is None:
+        matches, visited = _prefix_matches(index, query)
+        ranked = sorted(matches, key=lambda position: (matches[position], position))[:limit]
+        if len(ranked) < limit and len(query) >= 3:
+            fuzzy = _fuzzy_matches(index, query)
+            ranked += sorted(
+                (position for position in fuzzy if position not in matches),
+                key=lambda position: (-fuzzy[position], position)
+            )[:limit - len(ranked)]
+        if visited > BROAD_PREFIX_TERMS and len(index['memo']) < MEMO_MAX_ENTRIES:
+            index['memo'][(query, limit)] = ranked
+    else:
+        with _lock:
+            _stats['memo_hits'] += 1
+
+    results = [index['coins'][position] for position in ranked]
+    with _lock:
+        _stats['searches'] += 1
+        _stats['search_seconds'] += time.perf_counter() - started
+    return results
+
+
+def get_page(sort, page, per_page, coin_ids=None):
+    """
+    One page of listings as market rows plus whether another page follows.
+    Without coin_ids this walks the index for sort; with coin_ids (search
+    results, best first) the 'rank' sort keeps their order and the others
+    reorder them in the database.
+    """
+    offset = (page - 1) * per_page
+    if coin_ids is not None and sort == 'rank':
+        listings = CoinListing.objects.in_bulk(coin_ids[offset:offset + per_page])
+        rows = [listings[coin_id] for coin_id in coin_ids[offset:offset + per_page] if coin_id in listings]
+        return [row.as_market_row() for row in rows], len(coin_ids) > offset + per_page
+
+    field, ordering = SORTS[sort]
+    listings = CoinListing.objects.filter(**{f'{field}__isnull': False})
+    if coin_ids is not None:
+        listings = listings.filter(coin_id__in=coin_ids)
+    rows = list(listings.order_by(ordering, 'coin_id')[offset:offset + per_page + 1])
+    return [row.as_market_row() for row in rows[:per_page]], len(rows) > per_page
+
+
+def get_market_rows(coin_ids):
+    """coin_id -> market row for the listed coins among coin_ids, in one query"""
+    return {coin_id: listing.as_market_row() for coin_id, listing in CoinListing.objects.in_bulk(coin_ids).items()}
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['coins'] = len(_index['coins'])
+    stats['terms'] = len(_index['terms'])
+    stats['loads'] = _index['loads']
+    stats['avg_search_ms'] = round(stats.pop('search_seconds') / stats['searches'] * 1000, 3) if stats['searches'] else None
+    return stats
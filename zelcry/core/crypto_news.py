@@ -1,34 +1,65 @@
-import requests
+from datetime import datetime, timezone as dt_timezone
+import re
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from . import http_client
+from .cache_utils import get_stale_while_revalidate, set_entry, as_of, flight_lock
+from .models import NewsArticle, NewsCategory, NewsTerm
+import logging
 
-def get_crypto_news(limit=20):
+logger = logging.getLogger(__name__)
+
+NEWS_FEED_LIMIT = 50
+NEWS_FRESH_SECONDS = 600
+NEWS_CACHE_KEY = 'crypto_news_feed'
+NEWS_CATEGORIES_KEY = 'crypto_news_categories'
+# Held for the whole ingestion, whether it was started by the scheduler or
+# by a stale read; separate from NEWS_CACHE_KEY, which revalidation holds
+# while it calls in here.
+NEWS_INGEST_LOCK = 'crypto_news_ingest'
+
+# Ingestion pages back through the feed until it reaches stored articles,
+# at most this many pages per run.
+INGEST_MAX_PAGES = 10
+BULK_BATCH_SIZE = 1000
+
+# Articles are searched by whole words from the title and body. Each query
+# walks one term's postings newest first and checks the others per
+# article, so a page costs the same however large the archive grows.
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+MAX_QUERY_TERMS = 5
+STOPWORDS = frozenset('''
+    a an and are as at be been but by for from has have he her his i in into is it its of on or our she
+    so than that the their them then there these they this to was we were which while who will with you
+'''.split())
+
+
+def fetch_crypto_news(limit=NEWS_FEED_LIMIT, before=None):
     """
-    Fetch real-time crypto news from CryptoCompare API
+    Fetch real-time crypto news from CryptoCompare API, newest first.
+    Pass before (a unix timestamp) to page back through older articles.
     Returns list of news articles with titles, descriptions, images, and links
     """
-    cache_key = f'crypto_news_{limit}'
-    cached_news = cache.get(cache_key)
-    
-    if cached_news:
-        return cached_news
-    
     try:
         url = 'https://min-api.cryptocompare.com/data/v2/news/'
         params = {
             'lang': 'EN',
             'limit': limit
         }
-        
+        if before:
+            params['lTs'] = before
+
         if settings.CRYPTOCOMPARE_API_KEY:
             params['api_key'] = settings.CRYPTOCOMPARE_API_KEY
-        
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
+
+        data = http_client.get_json(url, params=params, timeout=10, conditional=before is None)
+
+        if data:
             news_items = []
-            
+
             for article in data.get('Data', []):
                 news_items.append({
                     'id': article.get('id'),
@@ -41,32 +72,222 @@ def get_crypto_news(limit=20):
                     'categories': article.get('categories', '').split('|'),
                     'tags': article.get('tags', '').split('|'),
                 })
-            
-            cache.set(cache_key, news_items, 300)
+
             return news_items
     except Exception as e:
-        print(f"Error fetching crypto news: {e}")
-    
+        logger.error(f"Error fetching crypto news: {e}")
+
     return []
 
 
+def tokenize(text):
+    """Distinct searchable words in text, in first-seen order"""
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    return list(dict.fromkeys(
+        word for word in words
+        if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH and word not in STOPWORDS
+    ))
+
+
+def _article(item):
+    return NewsArticle(
+        article_id=str(item['id']),
+        title=item.get('title') or '',
+        body=item.get('body') or '',
+        url=item.get('url') or '',
+        source=(item.get('source') or '')[:200],
+        image_url=item.get('image_url') or '',
+        published_on=datetime.fromtimestamp(item['published_on'], tz=dt_timezone.utc),
+        categories='|'.join(c for c in item.get('categories', []) if c),
+        tags='|'.join(t for t in item.get('tags', []) if t),
+    )
+
+
+def _store(items):
+    """Insert new articles with their index rows; returns the categories seen"""
+    articles = [_article(item) for item in items]
+    terms = []
+    categories = []
+    for article in articles:
+        for term in tokenize(f'{article.title} {article.body}'):
+            terms.append(NewsTerm(term=term, article=article, published_on=article.published_on))
+        names = {name.lower(): name[:100] for name in article.categories.split('|') if name}
+        for key, name in names.items():
+            categories.append(NewsCategory(key=key[:100], name=name, article=article, published_on=article.published_on))
+
+    # Rows another ingestion stored first are skipped rather than failing the batch
+    with transaction.atomic():
+        NewsArticle.objects.bulk_create(articles, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        NewsTerm.objects.bulk_create(terms, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        NewsCategory.objects.bulk_create(categories, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return {category.name for category in categories}
+
+
+def ingest_news():
+    """
+    Add articles published since the newest stored one, paging back through
+    the feed when more than one page is new. Articles already stored are
+    skipped by id. Returns the number of new articles (0 when another
+    ingestion is already running), or None when the feed could not be fetched.
+    """
+    with flight_lock(NEWS_INGEST_LOCK, blocking=False) as acquired:
+        if not acquired:
+            logger.info("News ingestion already running, skipping")
+            return 0
+        return _ingest_news()
+
+
+def _ingest_news():
+    latest = NewsArticle.objects.aggregate(latest=Max('published_on'))['latest']
+    latest_ts = int(latest.timestamp()) if latest else None
+
+    items = {}
+    before = None
+    for _ in range(INGEST_MAX_PAGES):
+        batch = [item for item in fetch_crypto_news(before=before) if item.get('id') and item.get('published_on')]
+        if not batch:
+            if before is None:
+                return None
+            break
+        for item in batch:
+            if latest_ts is None or item['published_on'] >= latest_ts:
+                items[str(item['id'])] = item
+        oldest = min(item['published_on'] for item in batch)
+        if latest_ts is None or oldest <= latest_ts:
+            break
+        before = oldest
+
+    known = set(NewsArticle.objects.filter(article_id__in=list(items)).values_list('article_id', flat=True))
+    new = [item for article_id, item in items.items() if article_id not in known]
+    if new:
+        categories = _store(new)
+        cache.set(NEWS_CATEGORIES_KEY, sorted(set(get_news_categories()) | categories), None)
+    logger.info(f"News ingestion: {len(new)} new articles")
+    return len(new)
+
+
+def refresh_crypto_news():
+    """Ingest new articles and mark the store as refreshed for stale-while-revalidate reads"""
+    added = ingest_news()
+    if added is not None:
+        set_entry(NEWS_CACHE_KEY, {'added': added})
+    return added
+
+
+def get_crypto_news_snapshot():
+    """When the news store was last refreshed; a stale store is refreshed in the background"""
+    entry = get_stale_while_revalidate(NEWS_CACHE_KEY, refresh_crypto_news, NEWS_FRESH_SECONDS)
+    return {'as_of': as_of(entry)}
+
+
+def get_news_categories():
+    """Every category seen in the archive, sorted"""
+    categories = cache.get(NEWS_CATEGORIES_KEY)
+    if categories is None:
+        categories = sorted(set(NewsCategory.objects.values_list('name', flat=True).distinct()))
+        cache.set(NEWS_CATEGORIES_KEY, categories, None)
+    return categories
+
+
+def _feed_item(article):
+    return {
+        'id': article.article_id,
+        'title': article.title,
+        'body': article.body,
+        'url': article.url,
+        'source': article.source,
+        'image_url': article.image_url,
+        'published_on': article.published_on,
+        'categories': article.categories.split('|') if article.categories else [],
+        'tags': article.tags.split('|') if article.tags else [],
+    }
+
+
+def news_cursor(item):
+    """Position of a feed item in the newest-first order, for ?before= and ?after="""
+    return f"{int(item['published_on'].timestamp())}-{item['id']}"
+
+
+def parse_news_cursor(value):
+    """(published_on, article_id) from news_cursor(), or None when missing or malformed"""
+    timestamp, _, article_id = (value or '').partition('-')
+    if not article_id:
+        return None
+    try:
+        return datetime.fromtimestamp(int(timestamp), tz=dt_timezone.utc), article_id
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def get_news_page(category='', query='', before=None, after=None, per_page=30):
+    """
+    One page of stored articles, newest first, optionally limited to a
+    category and to articles containing every word of query.
+    Pages are addressed by position rather than offset: before (a parsed
+    cursor) gives the articles just older than it, after the ones just newer.
+    Returns the page's articles and whether newer and older ones exist.
+    """
+    category_key = category.lower()[:100]
+    terms = sorted(tokenize(query), key=len, reverse=True)[:MAX_QUERY_TERMS]
+    if query and not terms:
+        return [], False, False
+
+    if after:
+        published_on, article_id = after
+        keyset = Q(published_on__gt=published_on) | Q(published_on=published_on, article_id__gt=article_id)
+        ordering = ('published_on', 'article_id')
+    else:
+        keyset = Q()
+        if before:
+            published_on, article_id = before
+            keyset = Q(published_on__lt=published_on) | Q(published_on=published_on, article_id__lt=article_id)
+        ordering = ('-published_on', '-article_id')
+
+    if terms:
+        # Longest word first: usually the rarest, so the fewest postings to walk
+        postings = NewsTerm.objects.filter(term=terms[0])
+        for term in terms[1:]:
+            postings = postings.filter(Exists(NewsTerm.objects.filter(article=OuterRef('article'), term=term)))
+        if category_key:
+            postings = postings.filter(Exists(NewsCategory.objects.filter(article=OuterRef('article'), key=category_key)))
+    elif category_key:
+        postings = NewsCategory.objects.filter(key=category_key)
+    else:
+        postings = None
+
+    if postings is None:
+        articles = list(NewsArticle.objects.filter(keyset).order_by(*ordering)[:per_page + 1])
+        more = len(articles) > per_page
+        articles = articles[:per_page]
+    else:
+        article_ids = list(postings.filter(keyset).order_by(*ordering).values_list('article_id', flat=True)[:per_page + 1])
+        more = len(article_ids) > per_page
+        by_id = NewsArticle.objects.in_bulk(article_ids[:per_page])
+        articles = [by_id[article_id] for article_id in article_ids[:per_page] if article_id in by_id]
+
+    if after:
+        if not more:
+            # Reached the newest articles: show a full first page instead of the remainder
+            return get_news_page(category, query, per_page=per_page)
+        return [_feed_item(article) for article in reversed(articles)], True, True
+    return [_feed_item(article) for article in articles], before is not None, more
+
+
+def get_crypto_news(limit=20):
+    """Latest stored articles"""
+    return get_news_page(per_page=limit)[0]
+
+
 def get_trending_news(limit=10):
     """Get most recent trending crypto news"""
-    all_news = get_crypto_news(limit=limit)
-    return all_news[:limit]
+    return get_crypto_news(limit=limit)
 
 
 def get_news_by_category(category, limit=10):
-    """Filter news by specific category (DeFi, NFT, Regulation, etc.)"""
-    all_news = get_crypto_news(limit=50)
-    return [n for n in all_news if category.lower() in [c.lower() for c in n['categories']]][:limit]
+    """Latest articles in a category (DeFi, NFT, Regulation, etc.)"""
+    return get_news_page(category=category, per_page=limit)[0]
 
 
 def search_news(query, limit=10):
-    """Search news by keyword"""
-    all_news = get_crypto_news(limit=50)
-    query_lower = query.lower()
-    
-    return [n for n in all_news if 
-            query_lower in n['title'].lower() or 
-            query_lower in n['body'].lower()][:limit]
+    """Latest articles containing every word of query"""
+    return get_news_page(query=query, per_page=limit)[0]
@@ -1,21 +1,34 @@
-from groq import Groq
+from groq import APITimeoutError, AsyncGroq, AuthenticationError, Groq
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from . import ai_cache, llm_router
+from .llm_dispatch import LLMBusyError, allm_slot, call_timeout, deadline_exceeded, llm_slot
+import asyncio
+import threading
+import time
+import weakref
 import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One keep-alive pool per process (and one per event loop for async views)
+# so chats reuse warm TLS connections instead of handshaking every time.
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+# No SDK retries: each attempt already gets the rest of the per-call
+# deadline set in llm_dispatch, and failover to the other model is the retry.
+MAX_RETRIES = 0
+# Failing over is pointless with less of the deadline left than this.
+MIN_ATTEMPT_SECONDS = 1.0
+
+_client_lock = threading.Lock()
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+SYSTEM_MESSAGE = """You are Zelcry AI, the advanced AI advisor for Zelcry - a professional crypto investment platform.
 
-def get_zelcry_ai_response(message, context="", conversation_history=None):
-    """
-    Zelcry AI - Advanced AI advisor powered by Groq
-    Provides personalized crypto investment insights and market analysis
-    """
-    try:
-        if not settings.GROQ_API_KEY or settings.GROQ_API_KEY.strip() == '':
-            return "🔑 Zelcry AI needs a Groq API key to work. Please add your GROQ_API_KEY to Replit Secrets. Get a free API key at console.groq.com"
-        
-        http_client = httpx.Client()
-        client = Groq(api_key=settings.GROQ_API_KEY, http_client=http_client)
-        
-        system_message = """You are Zelcry AI, the advanced AI advisor for Zelcry - a professional crypto investment platform. 
-        
 Your role:
 - Provide expert cryptocurrency analysis and insights
 - Focus on sustainable and responsible investing practices
@@ -25,39 +38,290 @@ Your role:
 - Always encourage due diligence and risk management
 
 Tone: Professional, knowledgeable, supportive, and trustworthy."""
-        
-        if context:
-            system_message += f"\n\n{context}"
-        
-        messages = [{"role": "system", "content": system_message}]
-        
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        messages.append({"role": "user", "content": message})
-        
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model_name="llama-3.1-8b-instant",
-            temperature=0.7,
-            max_tokens=800,
-            top_p=0.95
+
+CUT_SHORT_MESSAGE = " … (Zelcry AI ran out of time on this answer. Please try again.)"
+
+MISSING_KEY_MESSAGE = "🔑 Zelcry AI needs a Groq API key to work. Please add your GROQ_API_KEY to Replit Secrets. Get a free API key at console.groq.com"
+
+def _limits():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+
+def get_client():
+    """Process-wide Groq client over a pooled httpx.Client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=settings.GROQ_API_KEY,
+                    base_url=settings.GROQ_BASE_URL or None,
+                    max_retries=MAX_RETRIES,
+                    http_client=httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT)
+                )
+    return _client
+
+def get_async_client():
+    """AsyncGroq client for the running event loop, created on first use"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL or None,
+            max_retries=MAX_RETRIES,
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT)
         )
-        
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        error_msg = str(e).lower()
-        if 'api key' in error_msg or 'invalid' in error_msg or 'authentication' in error_msg:
-            return "🔑 Invalid Groq API key. Please check your GROQ_API_KEY in Replit Secrets. Get a free key at console.groq.com"
-        return f"⚠️ Zelcry AI error: {str(e)[:100]}. Please check your GROQ_API_KEY in Replit Secrets."
+        _async_clients[loop] = client
+    return client
 
-def get_market_analysis(market_data):
-    """Get AI-powered market analysis"""
+def _has_api_key():
+    return bool(settings.GROQ_API_KEY and settings.GROQ_API_KEY.strip())
+
+def _advisor_messages(message, context="", conversation_history=None):
+    system_message = SYSTEM_MESSAGE
+    if context:
+        system_message += f"\n\n{context}"
+
+    messages = [{"role": "system", "content": system_message}]
+
+    if conversation_history:
+        messages.extend(conversation_history)
+
+    messages.append({"role": "user", "content": message})
+    return messages
+
+def _advisor_request(message, context="", conversation_history=None):
+    return {
+        'messages': _advisor_messages(message, context, conversation_history),
+        'temperature': 0.7,
+        'max_tokens': 800,
+        'top_p': 0.95,
+    }
+
+def _error_message(e):
+    if isinstance(e, APITimeoutError):
+        deadline_exceeded()
+        return "⏱️ Zelcry AI took too long to answer. Please try again in a moment."
+    error_msg = str(e).lower()
+    if 'api key' in error_msg or 'invalid' in error_msg or 'authentication' in error_msg:
+        return "🔑 Invalid Groq API key. Please check your GROQ_API_KEY in Replit Secrets. Get a free key at console.groq.com"
+    return f"⚠️ Zelcry AI error: {str(e)[:100]}. Please check your GROQ_API_KEY in Replit Secrets."
+
+def _response_cache_key(message, context, conversation_history, personalized, model):
+    """ai_cache key for a prompt, or None when its reply must not be shared"""
+    if personalized:
+        ai_cache.record_bypass()
+        return None
+    return ai_cache.response_key(message, context, model, conversation_history)
+
+def _attempt_timeout(started, is_last):
+    """Seconds the next model gets: the rest of the deadline, or LLM_FAILOVER_AFTER if another model follows"""
+    remaining = call_timeout() - (time.monotonic() - started)
+    return remaining if is_last else min(remaining, settings.LLM_FAILOVER_AFTER)
+
+def _fallback(models, index, started, error):
+    """Model to fail over to after models[index] raised error, or None"""
+    if index + 1 >= len(models) or isinstance(error, AuthenticationError):
+        return None
+    if call_timeout() - (time.monotonic() - started) < MIN_ATTEMPT_SECONDS:
+        return None
+    return models[index + 1]
+
+def _complete(request, preferred):
+    """Chat completion on the routed model, failing over to the other model on error"""
+    started = time.monotonic()
+    models = llm_router.candidates(preferred)
+    for index, model in enumerate(models):
+        attempt_started = time.monotonic()
+        try:
+            is_last = index == len(models) - 1
+            completion = get_client().chat.completions.create(
+                **request,
+                model=model,
+                timeout=_attempt_timeout(started, is_last)
+            )
+        except Exception as e:
+            fallback = _fallback(models, index, started, e)
+            llm_router.record_failure(model, time.monotonic() - attempt_started, fallback)
+            if fallback is None:
+                raise
+            continue
+        llm_router.record_success(model, time.monotonic() - attempt_started)
+        return completion.choices[0].message.content
+
+def _stream(request, preferred):
+    """Yield reply chunks from the routed model; fails over only before the first chunk"""
+    started = time.monotonic()
+    models = llm_router.candidates(preferred)
+    for index, model in enumerate(models):
+        attempt_started = time.monotonic()
+        streamed = False
+        try:
+            is_last = index == len(models) - 1
+            stream = get_client().chat.completions.create(
+                **request,
+                model=model,
+                stream=True,
+                timeout=_attempt_timeout(started, is_last)
+            )
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        streamed = True
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+        except Exception as e:
+            fallback = None if streamed else _fallback(models, index, started, e)
+            llm_router.record_failure(model, time.monotonic() - attempt_started, fallback)
+            if fallback is None:
+                raise
+            continue
+        llm_router.record_success(model, time.monotonic() - attempt_started)
+        return
+
+async def _astream(request, preferred):
+    """Async counterpart of _stream"""
+    started = time.monotonic()
+    models = llm_router.candidates(preferred)
+    for index, model in enumerate(models):
+        attempt_started = time.monotonic()
+        streamed = False
+        try:
+            is_last = index == len(models) - 1
+            stream = await get_async_client().chat.completions.create(
+                **request,
+                model=model,
+                stream=True,
+                timeout=_attempt_timeout(started, is_last)
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        streamed = True
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+        except Exception as e:
+            fallback = None if streamed else _fallback(models, index, started, e)
+            llm_router.record_failure(model, time.monotonic() - attempt_started, fallback)
+            if fallback is None:
+                raise
+            continue
+        llm_router.record_success(model, time.monotonic() - attempt_started)
+        return
+
+def get_zelcry_ai_response(message, context="", conversation_history=None, personalized=False):
+    """
+    Zelcry AI - Advanced AI advisor powered by Groq
+    Provides personalized crypto investment insights and market analysis.
+    Replies to non-personal prompts are served from ai_cache when possible;
+    pass personalized=True when the context describes a specific user.
+    The model is picked by llm_router, with failover to the other one.
+    Raises LLMBusyError when no LLM slot frees up in time.
+    """
     try:
-        http_client = httpx.Client()
-        client = Groq(api_key=settings.GROQ_API_KEY, http_client=http_client)
-        
-        prompt = f"""Analyze this cryptocurrency market data and provide brief insights:
+        if not _has_api_key():
+            return MISSING_KEY_MESSAGE
+
+        model = llm_router.advisor_model(message)
+        cache_key = _response_cache_key(message, context, conversation_history, personalized, model)
+        if cache_key:
+            cached = ai_cache.get_response(cache_key)
+            if cached is not None:
+                return cached
+
+        with llm_slot():
+            started = time.monotonic()
+            response = _complete(_advisor_request(message, context, conversation_history), model)
+
+        if cache_key and response:
+            ai_cache.set_response(cache_key, response, time.monotonic() - started)
+        return response
+    except LLMBusyError:
+        raise
+    except Exception as e:
+        return _error_message(e)
+
+def stream_zelcry_ai_response(message, context="", conversation_history=None, personalized=False):
+    """
+    Streaming variant of get_zelcry_ai_response: yields the reply in text
+    chunks as Groq generates them (or whole, on a cache hit). Errors are
+    yielded as a final chunk and never cached. The LLM slot is taken when
+    the first chunk is requested, so LLMBusyError surfaces there.
+    """
+    if not _has_api_key():
+        yield MISSING_KEY_MESSAGE
+        return
+
+    model = llm_router.advisor_model(message)
+    cache_key = _response_cache_key(message, context, conversation_history, personalized, model)
+    if cache_key:
+        cached = ai_cache.get_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    with llm_slot():
+        try:
+            started = time.monotonic()
+            parts = []
+            chunks = _stream(_advisor_request(message, context, conversation_history), model)
+            for content in chunks:
+                if time.monotonic() - started > call_timeout():
+                    chunks.close()
+                    deadline_exceeded()
+                    yield CUT_SHORT_MESSAGE
+                    return
+                parts.append(content)
+                yield content
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {e}")
+            yield _error_message(e)
+            return
+
+    if cache_key and parts:
+        ai_cache.set_response(cache_key, ''.join(parts), time.monotonic() - started)
+
+async def astream_zelcry_ai_response(message, context="", conversation_history=None, personalized=False):
+    """Async counterpart of stream_zelcry_ai_response, for ASGI responses"""
+    if not _has_api_key():
+        yield MISSING_KEY_MESSAGE
+        return
+
+    model = llm_router.advisor_model(message)
+    cache_key = _response_cache_key(message, context, conversation_history, personalized, model)
+    if cache_key:
+        cached = await sync_to_async(ai_cache.get_response, thread_sensitive=False)(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    async with allm_slot():
+        try:
+            started = time.monotonic()
+            parts = []
+            chunks = _astream(_advisor_request(message, context, conversation_history), model)
+            async for content in chunks:
+                if time.monotonic() - started > call_timeout():
+                    await chunks.aclose()
+                    deadline_exceeded()
+                    yield CUT_SHORT_MESSAGE
+                    return
+                parts.append(content)
+                yield content
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {e}")
+            yield _error_message(e)
+            return
+
+    if cache_key and parts:
+        await sync_to_async(ai_cache.set_response, thread_sensitive=False)(
+            cache_key, ''.join(parts), time.monotonic() - started
+        )
+
+def _market_analysis_messages(market_data):
+    prompt = f"""Analyze this cryptocurrency market data and provide brief insights:
 {market_data}
 
 Provide:
@@ -66,17 +330,23 @@ Provide:
 3. Risk factors to consider
 
 Keep it concise and actionable."""
-        
-        response = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a professional crypto market analyst. Provide concise, data-driven insights."},
-                {"role": "user", "content": prompt}
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.5,
-            max_tokens=400
-        )
-        
-        return response.choices[0].message.content
-    except:
+
+    return [
+        {"role": "system", "content": "You are a professional crypto market analyst. Provide concise, data-driven insights."},
+        {"role": "user", "content": prompt}
+    ]
+
+def get_market_analysis(market_data):
+    """Get AI-powered market analysis, or None when it could not be generated"""
+    if not _has_api_key():
+        return None
+    try:
+        with llm_slot():
+            return _complete({
+                'messages': _market_analysis_messages(market_data),
+                'temperature': 0.5,
+                'max_tokens': 400,
+            }, llm_router.analysis_model())
+    except Exception as e:
+        logger.error(f"Error generating market analysis: {e}")
         return None
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import random
+import threading
+import weakref
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+MAX_RETRY_AFTER = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+ETAG_CACHE_SIZE = 256
+
+# One keep-alive session per process, shared by every thread, and one
+# async client per event loop for the async views.
+_lock = threading.Lock()
+_session = None
+_async_clients = weakref.WeakKeyDictionary()
+_etags = OrderedDict()
+_counters = {
+    'requests': 0,
+    'errors': 0,
+    'not_modified': 0,
+}
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with full jitter on backoff. Retry-After is honoured but
+    capped so a rate-limited upstream never parks a page for a full minute.
+    """
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+
+def _build_session():
+    retry = JitteredRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept': 'application/json', 'User-Agent': 'Zelcry/1.0'})
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _increment(counter):
+    with _lock:
+        _counters[counter] += 1
+
+
+def _request_key(url, params):
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+def get(url, params=None, timeout=DEFAULT_TIMEOUT, headers=None):
+    """GET through the shared pool; returns the requests.Response"""
+    _increment('requests')
+    return get_session().get(url, params=params, timeout=timeout, headers=headers)
+
+
+def _conditional_headers(key):
+    """If-None-Match for the last ETag seen at key, plus that cached (etag, body)"""
+    with _lock:
+        cached = _etags.get(key)
+        if cached:
+            _etags.move_to_end(key)
+    return ({'If-None-Match': cached[0]} if cached else {}), cached
+
+
+def _decode(url, status_code, headers, content, key, cached):
+    """Shared response handling for get_json and aget_json"""
+    if status_code == 304 and cached:
+        _increment('not_modified')
+        return json.loads(cached[1])
+
+    if status_code != 200:
+        _increment('errors')
+        logger.error(f"{urlsplit(url).path} returned {status_code}")
+        return None
+
+    try:
+        data = json.loads(content)
+    except ValueError as e:
+        _increment('errors')
+        logger.error(f"Invalid JSON from {urlsplit(url).path}: {e}")
+        return None
+
+    etag = headers.get('ETag')
+    if key and etag:
+        with _lock:
+            _etags[key] = (etag, content)
+            _etags.move_to_end(key)
+            while len(_etags) > ETAG_CACHE_SIZE:
+                _etags.popitem(last=False)
+
+    return data
+
+
+def get_json(url, params=None, timeout=DEFAULT_TIMEOUT, conditional=False):
+    """
+    GET a JSON document through the shared pool.
+    With conditional=True the last ETag for this URL is sent as
+    If-None-Match and a 304 re-decodes the previously stored body.
+    Returns None (and logs) on network errors or non-200 responses.
+    """
+    key = _request_key(url, params) if conditional else None
+    headers, cached = _conditional_headers(key) if conditional else ({}, None)
+
+    try:
+        response = get(url, params=params, timeout=timeout, headers=headers)
+    except requests.exceptions.RequestException as e:
+        _increment('errors')
+        logger.error(f"Error requesting {urlsplit(url).netloc}{urlsplit(url).path}: {e}")
+        return None
+
+    return _decode(url, response.status_code, response.headers, response.content, key, cached)
+
+
+def get_async_client():
+    """Return the pooled httpx.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_CONNECTIONS),
+            headers={'Accept': 'application/json', 'User-Agent': 'Zelcry/1.0'},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _retry_after(response, attempt):
+    """Seconds to wait before retry number attempt, mirroring JitteredRetry"""
+    header = response.headers.get('Retry-After') if response is not None else None
+    if header:
+        try:
+            return min(float(header), MAX_RETRY_AFTER)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(header) - parsedate_to_datetime(response.headers['Date'])).total_seconds()
+                return min(max(delay, 0), MAX_RETRY_AFTER)
+            except (KeyError, TypeError, ValueError):
+                pass
+    return random.uniform(0, BACKOFF_FACTOR * (2 ** attempt))
+
+
+async def aget(url, params=None, timeout=DEFAULT_TIMEOUT, headers=None):
+    """
+    Async GET through the loop's pooled client with the same retry policy
+    as the sync session: up to MAX_RETRIES on errors and RETRY_STATUSES.
+    """
+    client = get_async_client()
+    for attempt in range(MAX_RETRIES + 1):
+        _increment('requests')
+        response = None
+        try:
+            response = await client.get(url, params=params, timeout=timeout, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+        await asyncio.sleep(_retry_after(response, attempt))
+
+
+async def aget_json(url, params=None, timeout=DEFAULT_TIMEOUT, conditional=False):
+    """Async counterpart of get_json, sharing its ETag store and counters"""
+    key = _request_key(url, params) if conditional else None
+    headers, cached = _conditional_headers(key) if conditional else ({}, None)
+
+    try:
+        response = await aget(url, params=params, timeout=timeout, headers=headers)
+    except httpx.HTTPError as e:
+        _increment('errors')
+        logger.error(f"Error requesting {urlsplit(url).netloc}{urlsplit(url).path}: {e}")
+        return None
+
+    return _decode(url, response.status_code, response.headers, response.content, key, cached)
+
+
+def get_stats():
+    """Request counters plus per-host connection reuse from the urllib3 pools"""
+    with _lock:
+        stats = dict(_counters)
+
+    hosts = {}
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                host = hosts.setdefault(pool.host, {'requests': 0, 'connections': 0})
+                host['requests'] += pool.num_requests
+                host['connections'] += pool.num_connections
+
+    for host in hosts.values():
+        host['reused'] = max(0, host['requests'] - host['connections'])
+
+    stats['hosts'] = hosts
+    return stats
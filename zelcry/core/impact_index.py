@@ -0,0 +1,67 @@
+import threading
+from .cache_utils import state_cache
+from .models import CryptoAssetDetails
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every CryptoAssetDetails row, held in memory by each worker and keyed by
+# coin_id. Rows only change through seed_crypto_data and the admin, which
+# bump a version in the shared cache (the admin through the signals in
+# models.py, the bulk seed by calling invalidate); a worker reloads the
+# whole table in one query when it sees a new version.
+VERSION_KEY = 'impact_index_version'
+SUSTAINABLE_IMPACT_SCORE = 7
+
+_lock = threading.Lock()
+_index = {'version': None, 'details': {}, 'sustainable': [], 'loads': 0}
+
+
+def invalidate():
+    """Make every worker reload the index on its next read"""
+    try:
+        state_cache.incr(VERSION_KEY)
+    except ValueError:
+        state_cache.set(VERSION_KEY, 1, None)
+
+
+def current_version():
+    """Version the index is loaded at; changes whenever a details row does"""
+    return state_cache.get(VERSION_KEY, 0)
+
+
+def _load(version):
+    details = {crypto.coin_id: crypto for crypto in CryptoAssetDetails.objects.order_by('-impact_score', 'coin_id')}
+    sustainable = [crypto for crypto in details.values() if crypto.impact_score >= SUSTAINABLE_IMPACT_SCORE]
+    _index.update(version=version, details=details, sustainable=sustainable, loads=_index['loads'] + 1)
+    logger.info(f"Loaded impact index version {version} ({len(details)} coins)")
+
+
+def get_index():
+    """coin_id -> CryptoAssetDetails for every coin with impact scores"""
+    version = current_version()
+    if _index['version'] != version:
+        with _lock:
+            if _index['version'] != version:
+                _load(version)
+    return _index['details']
+
+
+def get_details(coin_id):
+    return get_index().get(coin_id)
+
+
+def impact_score(coin_id):
+    """Impact score for a coin, or None when it has no details row"""
+    crypto = get_details(coin_id)
+    return crypto.get_impact_score if crypto else None
+
+
+def most_sustainable(limit=5):
+    """Coins with an impact score of at least SUSTAINABLE_IMPACT_SCORE, best first"""
+    get_index()
+    return _index['sustainable'][:limit]
+
+
+def get_stats():
+    return {'version': _index['version'], 'coins': len(_index['details']), 'loads': _index['loads']}
@@ -0,0 +1,134 @@
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+import asyncio
+import random
+import threading
+import time
+from django.conf import settings
+from .cache_utils import flight_lock
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Slots and queue tickets are flight locks, so the limits hold across every
+# worker process, not just per process. A caller first takes a ticket (one
+# of LLM_MAX_CONCURRENCY + LLM_MAX_QUEUE) and then waits for a slot; when no
+# ticket is free it is turned away at once.
+SLOT_KEY = 'llm_slot_{}'
+TICKET_KEY = 'llm_ticket_{}'
+POLL_INTERVAL = 0.05
+RETRY_AFTER_SECONDS = 5
+
+_stats_lock = threading.Lock()
+_stats = {
+    'admitted': 0,
+    'queued': 0,
+    'rejected_queue_full': 0,
+    'rejected_wait_timeout': 0,
+    'deadline_exceeded': 0,
+    'wait_seconds': 0.0,
+    'active': 0,
+}
+
+
+class LLMBusyError(Exception):
+    """Every LLM slot is busy and the wait queue is full or too slow"""
+
+    def __init__(self, message, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _record(**counts):
+    with _stats_lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+
+def call_timeout():
+    """Deadline in seconds for one LLM call, start to last token"""
+    return settings.LLM_CALL_TIMEOUT
+
+
+def deadline_exceeded():
+    _record(deadline_exceeded=1)
+
+
+def _take_any(stack, key_format, count):
+    """Hold the first free lock among count keys (in random order) on stack"""
+    for index in random.sample(range(count), count):
+        attempt = ExitStack()
+        if attempt.enter_context(flight_lock(key_format.format(index), blocking=False)):
+            stack.enter_context(attempt)
+            return True
+        attempt.close()
+    return False
+
+
+def _take_ticket(stack):
+    tickets = settings.LLM_MAX_CONCURRENCY + settings.LLM_MAX_QUEUE
+    if not _take_any(stack, TICKET_KEY, tickets):
+        _record(rejected_queue_full=1)
+        raise LLMBusyError("Zelcry AI is handling too many requests right now")
+
+
+def _give_up(waited):
+    _record(rejected_wait_timeout=1, wait_seconds=waited)
+    raise LLMBusyError("Zelcry AI is busy right now")
+
+
+@contextmanager
+def llm_slot():
+    """
+    Hold one of the LLM_MAX_CONCURRENCY global LLM slots for the block.
+    Waits up to LLM_QUEUE_TIMEOUT seconds in a queue bounded by
+    LLM_MAX_QUEUE; raises LLMBusyError when it cannot get one.
+    """
+    with ExitStack() as stack:
+        _take_ticket(stack)
+        started = time.monotonic()
+        if not _take_any(stack, SLOT_KEY, settings.LLM_MAX_CONCURRENCY):
+            _record(queued=1)
+            while not _take_any(stack, SLOT_KEY, settings.LLM_MAX_CONCURRENCY):
+                waited = time.monotonic() - started
+                if waited >= settings.LLM_QUEUE_TIMEOUT:
+                    _give_up(waited)
+                time.sleep(POLL_INTERVAL)
+
+        _record(admitted=1, wait_seconds=time.monotonic() - started, active=1)
+        try:
+            yield
+        finally:
+            _record(active=-1)
+
+
+@asynccontextmanager
+async def allm_slot():
+    """llm_slot for async code; waiting never blocks the event loop"""
+    with ExitStack() as stack:
+        _take_ticket(stack)
+        started = time.monotonic()
+        if not _take_any(stack, SLOT_KEY, settings.LLM_MAX_CONCURRENCY):
+            _record(queued=1)
+            while not _take_any(stack, SLOT_KEY, settings.LLM_MAX_CONCURRENCY):
+                waited = time.monotonic() - started
+                if waited >= settings.LLM_QUEUE_TIMEOUT:
+                    _give_up(waited)
+                await asyncio.sleep(POLL_INTERVAL)
+
+        _record(admitted=1, wait_seconds=time.monotonic() - started, active=1)
+        try:
+            yield
+        finally:
+            _record(active=-1)
+
+
+def get_stats():
+    """Per-process admission counters plus the configured global limits"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+    stats['max_concurrency'] = settings.LLM_MAX_CONCURRENCY
+    stats['max_queue'] = settings.LLM_MAX_QUEUE
+    stats['queue_timeout'] = settings.LLM_QUEUE_TIMEOUT
+    stats['call_timeout'] = settings.LLM_CALL_TIMEOUT
+    return stats
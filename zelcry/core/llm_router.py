@@ -0,0 +1,123 @@
+from collections import deque
+import re
+import threading
+import time
+from django.conf import settings
+from .chat_memory import estimate_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chat questions go to the fast model unless they are long or ask for
+# analysis; market analysis goes to the large model. Each model's recent
+# calls are kept for HEALTH_WINDOW_SECONDS, and a model that is mostly
+# failing or slower than LLM_SLOW_SECONDS is tried after the others until
+# its bad samples age out.
+HEALTH_WINDOW_SECONDS = 300
+HEALTH_MAX_SAMPLES = 50
+HEALTH_MIN_SAMPLES = 3
+UNHEALTHY_ERROR_RATE = 0.5
+
+ANALYSIS_HINTS = re.compile(
+    r'\b(analy[sz]e|analysis|compare|comparison|forecast|outlook|strategy|rebalanc\w*|in[- ]depth|detailed|pros and cons)\b',
+    re.IGNORECASE
+)
+
+_lock = threading.Lock()
+_samples = {}
+_stats = {}
+
+
+def fast_model():
+    return settings.LLM_FAST_MODEL
+
+
+def large_model():
+    return settings.LLM_LARGE_MODEL
+
+
+def advisor_model(message):
+    """Preferred model for a chat question: the large one only for long or analytical asks"""
+    if estimate_tokens(message) > settings.LLM_FAST_MAX_TOKENS or ANALYSIS_HINTS.search(message):
+        return large_model()
+    return fast_model()
+
+
+def analysis_model():
+    return large_model()
+
+
+def _recent(model, now):
+    samples = _samples.setdefault(model, deque(maxlen=HEALTH_MAX_SAMPLES))
+    while samples and samples[0][0] < now - HEALTH_WINDOW_SECONDS:
+        samples.popleft()
+    return samples
+
+
+def _health(model, now):
+    samples = _recent(model, now)
+    latencies = sorted(latency for at, latency, ok in samples if ok)
+    errors = sum(1 for at, latency, ok in samples if not ok)
+    return {
+        'samples': len(samples),
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+    }
+
+
+def _is_healthy(health):
+    if health['samples'] < HEALTH_MIN_SAMPLES:
+        return True
+    if health['error_rate'] >= UNHEALTHY_ERROR_RATE:
+        return False
+    return health['p50_latency'] is None or health['p50_latency'] <= settings.LLM_SLOW_SECONDS
+
+
+def candidates(preferred):
+    """
+    Models to try in order: preferred first unless it is unhealthy, then
+    the other model. When both are unhealthy the preference order stands.
+    """
+    models = [preferred] + [model for model in (fast_model(), large_model()) if model != preferred]
+    now = time.monotonic()
+    with _lock:
+        healthy = [model for model in models if _is_healthy(_health(model, now))]
+        ordered = healthy + [model for model in models if model not in healthy]
+        if ordered[0] != preferred:
+            _record(ordered[0], rerouted=1)
+    return ordered
+
+
+def _record(model, **counts):
+    stats = _stats.setdefault(model, {'calls': 0, 'errors': 0, 'failovers': 0, 'rerouted': 0})
+    for name, value in counts.items():
+        stats[name] += value
+
+
+def record_success(model, latency):
+    with _lock:
+        _recent(model, time.monotonic()).append((time.monotonic(), latency, True))
+        _record(model, calls=1)
+
+
+def record_failure(model, latency, failover_to=None):
+    """Count a failed call; failover_to names the model tried next, if any"""
+    with _lock:
+        _recent(model, time.monotonic()).append((time.monotonic(), latency, False))
+        _record(model, calls=1, errors=1, failovers=1 if failover_to else 0)
+    if failover_to:
+        logger.warning(f"{model} failed after {latency:.2f}s; failing over to {failover_to}")
+
+
+def get_stats():
+    """Per-model call counters and rolling health for this process"""
+    now = time.monotonic()
+    with _lock:
+        stats = {}
+        for model in dict.fromkeys([fast_model(), large_model(), *_stats]):
+            health = _health(model, now)
+            stats[model] = dict(_stats.get(model, {'calls': 0, 'errors': 0, 'failovers': 0, 'rerouted': 0}))
+            stats[model]['healthy'] = _is_healthy(health)
+            stats[model]['error_rate'] = round(health['error_rate'], 4)
+            stats[model]['p50_latency'] = round(health['p50_latency'], 3) if health['p50_latency'] is not None else None
+    return stats
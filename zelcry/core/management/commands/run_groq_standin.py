@@ -0,0 +1,123 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _per_model(values, option, cast):
+    parsed = {}
+    for value in values:
+        model, sep, setting = value.partition('=')
+        if not sep:
+            raise CommandError(f"--{option} expects MODEL=VALUE, got '{value}'")
+        try:
+            parsed[model] = cast(setting)
+        except ValueError:
+            raise CommandError(f"--{option} has an invalid value for {model}: '{setting}'")
+    return parsed
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Answers Groq chat completions (plain and streamed) with canned replies"""
+    protocol_version = 'HTTP/1.1'
+    latency = {}
+    error_rate = {}
+    chunk_delay = 0.05
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = request.get('model', '')
+        time.sleep(self.latency.get(model, 0))
+        if random.random() < self.error_rate.get(model, 0):
+            self._send_json(503, {'error': {'message': f'{model} is over capacity', 'type': 'service_unavailable'}})
+            return
+
+        question = next((m['content'] for m in reversed(request.get('messages', [])) if m.get('role') == 'user'), '')
+        words = f"Stand-in reply from {model} to: {' '.join(question.split())[:80]}".split(' ')
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' '.join(words)}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(words), 'total_tokens': len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for index, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word if index == 0 else f' {word}'}, 'finish_reason': None}],
+            }
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(self.chunk_delay)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the Groq chat completions API (set GROQ_BASE_URL to its address)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8799)
+        parser.add_argument(
+            '--latency',
+            action='append',
+            default=[],
+            metavar='MODEL=SECONDS',
+            help='Delay before answering for a model; repeat per model'
+        )
+        parser.add_argument(
+            '--error-rate',
+            action='append',
+            default=[],
+            metavar='MODEL=RATE',
+            help='Fraction of calls to a model answered with a 503; repeat per model'
+        )
+        parser.add_argument('--chunk-delay', type=float, default=0.05, help='Seconds between streamed chunks')
+
+    def handle(self, *args, **options):
+        StandinHandler.latency = _per_model(options['latency'], 'latency', float)
+        StandinHandler.error_rate = _per_model(options['error_rate'], 'error-rate', float)
+        StandinHandler.chunk_delay = options['chunk_delay']
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StandinHandler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Groq stand-in listening; run the app with GROQ_BASE_URL=http://127.0.0.1:{options['port']}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
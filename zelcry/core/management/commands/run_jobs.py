@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from zelcry.core import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the background job scheduler as the single leader for this deployment'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            metavar='JOB_ID',
+            help='Run one job immediately and exit instead of starting the scheduler'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            job = next((j for j in scheduler.JOBS if j['id'] == options['once']), None)
+            if job is None:
+                raise CommandError(f"Unknown job '{options['once']}'. Choose from: {', '.join(j['id'] for j in scheduler.JOBS)}")
+            scheduler.build_scheduler()
+            scheduler.run_job(job)
+            self.stdout.write(self.style.SUCCESS(f"Ran {job['name']}"))
+            return
+
+        self.stdout.write('Waiting for the job leader lock...')
+        scheduler.acquire_leadership(blocking=True)
+        self.stdout.write(self.style.SUCCESS(f'Acquired job leader lock; running {len(scheduler.JOBS)} jobs'))
+
+        job_scheduler = scheduler.build_scheduler(blocking=True)
+        try:
+            job_scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            job_scheduler.shutdown(wait=False)
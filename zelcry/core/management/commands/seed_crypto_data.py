@@ -1,4 +1,6 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from zelcry.core import impact_index
 from zelcry.core.models import CryptoAssetDetails
 
 
@@ -189,21 +191,28 @@ class Command(BaseCommand):
             }
         ]
 
-        for data in crypto_data:
-            crypto, created = CryptoAssetDetails.objects.update_or_create(
-                coin_id=data['coin_id'],
-                defaults={
-                    'name': data['name'],
-                    'symbol': data['symbol'],
-                    'energy_score': data['energy_score'],
-                    'governance_score': data['governance_score'],
-                    'utility_score': data['utility_score'],
-                    'description': data['description']
-                }
+        rows = [CryptoAssetDetails(**data) for data in crypto_data]
+        for row in rows:
+            row.refresh_impact_score()
+        existing = set(
+            CryptoAssetDetails.objects.filter(coin_id__in=[row.coin_id for row in rows]).values_list('coin_id', flat=True)
+        )
+
+        # One upsert, which skips save() and the model signals, so the
+        # impact index is invalidated here once the rows are committed
+        with transaction.atomic():
+            CryptoAssetDetails.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['coin_id'],
+                update_fields=['name', 'symbol', *CryptoAssetDetails.SCORE_FIELDS, 'impact_score', 'description']
             )
-            if created:
-                self.stdout.write(self.style.SUCCESS(f'Created {crypto.name}'))
+            transaction.on_commit(impact_index.invalidate)
+
+        for row in rows:
+            if row.coin_id in existing:
+                self.stdout.write(self.style.WARNING(f'Updated {row.name}'))
             else:
-                self.stdout.write(self.style.WARNING(f'Updated {crypto.name}'))
+                self.stdout.write(self.style.SUCCESS(f'Created {row.name}'))
 
         self.stdout.write(self.style.SUCCESS('Successfully seeded crypto data!'))
@@ -0,0 +1,68 @@
+import hashlib
+from .cache_utils import as_of, is_fresh, set_entry, state_cache
+from .groq_ai import _has_api_key, get_market_analysis
+from .market_data import get_market_snapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_KEY = 'market_analysis'
+# Kept well past its refresh so a failing Groq call leaves the previous
+# analysis on the page instead of none.
+ANALYSIS_TIMEOUT = 60 * 60 * 24
+# Prices move on every market refresh; this bounds how often the large
+# model is asked to re-read them.
+ANALYSIS_REFRESH_SECONDS = 300
+ANALYSIS_COINS = 10
+
+
+def market_summary_text(market_data):
+    """One line per top coin, as sent to the market analyst prompt"""
+    market_summary = []
+    for coin in market_data[:ANALYSIS_COINS]:
+        market_summary.append(f"{coin['name']}: ${coin['current_price']:.2f} ({coin.get('price_change_percentage_24h') or 0:.2f}%)")
+
+    return "\n".join(market_summary)
+
+
+def summary_digest(summary):
+    return hashlib.sha1(summary.encode()).hexdigest()
+
+
+def refresh_market_analysis():
+    """
+    Generate the shared analysis for the current market snapshot.
+    Skipped without a Groq API key, when the snapshot summary is unchanged
+    or the stored analysis is newer than ANALYSIS_REFRESH_SECONDS; on
+    failure the previous analysis stays in place. Returns True if a new
+    analysis was stored.
+    """
+    if not _has_api_key():
+        return False
+
+    coins = get_market_snapshot()['coins']
+    if not coins:
+        return False
+
+    summary = market_summary_text(coins)
+    digest = summary_digest(summary)
+    entry = state_cache.get(ANALYSIS_CACHE_KEY)
+    if entry and (entry['data']['digest'] == digest or is_fresh(entry, ANALYSIS_REFRESH_SECONDS)):
+        return False
+
+    analysis = get_market_analysis(summary)
+    if not analysis:
+        logger.warning("Market analysis generation failed; keeping the previous analysis")
+        return False
+
+    set_entry(ANALYSIS_CACHE_KEY, {'digest': digest, 'analysis': analysis}, ANALYSIS_TIMEOUT, store=state_cache)
+    return True
+
+
+def get_latest_market_analysis():
+    """The most recent shared analysis and when it was generated; never calls Groq"""
+    entry = state_cache.get(ANALYSIS_CACHE_KEY)
+    return {
+        'analysis': entry['data']['analysis'] if entry else None,
+        'as_of': as_of(entry),
+    }
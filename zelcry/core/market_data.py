@@ -0,0 +1,251 @@
+import asyncio
+import weakref
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from . import http_client
+from .models import PortfolioAsset, Watchlist, PriceAlert
+from .cache_utils import get_stale_while_revalidate, is_fresh, revalidate, set_entries, set_entry, as_of, flight_lock, record, state_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_API_URL = 'https://api.coingecko.com/api/v3'
+
+# The ingester refreshes ahead of these windows; views only revalidate
+# in the background if a refresh was missed.
+PRICE_FRESH_SECONDS = 120
+MARKET_FRESH_SECONDS = 120
+MARKET_PAGE_SIZE = 100
+
+# CoinGecko accepts long id lists, but keep each URL comfortably short.
+PRICE_BATCH_SIZE = 250
+PRICE_FETCH_LOCK = 'coin_price_fetch'
+
+# Async counterpart of PRICE_FETCH_LOCK, one per event loop.
+_async_fetch_locks = weakref.WeakKeyDictionary()
+
+
+def _price_cache_key(coin_id):
+    return f'coin_price_{coin_id}'
+
+
+def _market_cache_key(per_page, page=1):
+    if page == 1:
+        return f'market_data_{per_page}'
+    return f'market_data_{per_page}_page_{page}'
+
+
+def _market_store(page):
+    # The ingested first page is never fetched inline, so it must not be
+    # culled; deeper pages refill on a miss
+    return state_cache if page == 1 else cache
+
+
+def _price_batches(coin_ids):
+    coin_ids = list(coin_ids)
+    for start in range(0, len(coin_ids), PRICE_BATCH_SIZE):
+        yield coin_ids[start:start + PRICE_BATCH_SIZE]
+
+
+def _price_params(batch):
+    return {
+        'ids': ','.join(batch),
+        'vs_currencies': 'usd',
+        'include_24hr_change': 'true',
+        'include_market_cap': 'true',
+        'include_24hr_vol': 'true',
+        'include_last_updated_at': 'true'
+    }
+
+
+def fetch_coin_prices(coin_ids):
+    """Fetch prices for many coins with one /simple/price call per batch"""
+    prices = {}
+    for batch in _price_batches(coin_ids):
+        data = http_client.get_json(f'{COINGECKO_API_URL}/simple/price', params=_price_params(batch), timeout=5)
+        if data:
+            prices.update(data)
+        else:
+            logger.error(f"No prices returned for {len(batch)} coins")
+
+    return prices
+
+
+async def afetch_coin_prices(coin_ids):
+    """fetch_coin_prices on the async client, with every batch in flight at once"""
+    batches = list(_price_batches(coin_ids))
+    results = await asyncio.gather(*(
+        http_client.aget_json(f'{COINGECKO_API_URL}/simple/price', params=_price_params(batch), timeout=5)
+        for batch in batches
+    ))
+    prices = {}
+    for batch, data in zip(batches, results):
+        if data:
+            prices.update(data)
+        else:
+            logger.error(f"No prices returned for {len(batch)} coins")
+    return prices
+
+
+def refresh_coin_prices(coin_ids):
+    """Fetch coin_ids upstream and write each price back to the cache"""
+    wanted = set(coin_ids)
+    fetched = {
+        coin_id: data for coin_id, data in fetch_coin_prices(wanted).items()
+        if coin_id in wanted and data
+    }
+    if fetched:
+        set_entries({_price_cache_key(coin_id): data for coin_id, data in fetched.items()})
+    return fetched
+
+
+async def arefresh_coin_prices(coin_ids):
+    """Async counterpart of refresh_coin_prices"""
+    wanted = set(coin_ids)
+    fetched = {
+        coin_id: data for coin_id, data in (await afetch_coin_prices(wanted)).items()
+        if coin_id in wanted and data
+    }
+    if fetched:
+        await sync_to_async(set_entries, thread_sensitive=False)(
+            {_price_cache_key(coin_id): data for coin_id, data in fetched.items()}
+        )
+    return fetched
+
+
+def _read_cached_prices(coin_ids):
+    """
+    One get_many over the price keys. Stale coins are served and
+    revalidated in the background. Returns (prices, missing coin ids).
+    """
+    keys = {_price_cache_key(coin_id): coin_id for coin_id in coin_ids}
+    cached = cache.get_many(keys.keys())
+
+    prices = {}
+    stale = []
+    for key, entry in cached.items():
+        coin_id = keys[key]
+        prices[coin_id] = entry['data']
+        if not is_fresh(entry, PRICE_FRESH_SECONDS):
+            stale.append(coin_id)
+
+    record(hits=len(prices) - len(stale), stale_hits=len(stale), misses=len(coin_ids) - len(prices))
+
+    if stale:
+        revalidate(f'coin_prices:{",".join(sorted(stale))}', lambda: refresh_coin_prices(stale))
+
+    return prices, [coin_id for coin_id in coin_ids if coin_id not in prices]
+
+
+def _refill(prices, missing):
+    """Add entries stored since the first read; returns what is still missing"""
+    keys = {_price_cache_key(coin_id): coin_id for coin_id in missing}
+    for key, entry in cache.get_many(keys.keys()).items():
+        prices[keys[key]] = entry['data']
+    return [coin_id for coin_id in missing if coin_id not in prices]
+
+
+def get_coin_prices(coin_ids):
+    """
+    Resolve prices for every coin a request needs in one pass.
+    Cached coins are read with a single get_many and served even when
+    stale (those are revalidated in the background). Only coins never seen
+    before are fetched inline, all in one batched upstream call made by a
+    single caller across workers.
+    Returns a dict of coin_id -> price data (empty dict when unavailable).
+    """
+    coin_ids = list(dict.fromkeys(c for c in coin_ids if c))
+    if not coin_ids:
+        return {}
+
+    prices, missing = _read_cached_prices(coin_ids)
+    if missing:
+        # Coalesce concurrent misses: whoever waited re-reads what the
+        # lock holder stored and only fetches what is still missing.
+        with flight_lock(PRICE_FETCH_LOCK):
+            missing = _refill(prices, missing)
+            if missing:
+                record(recomputes=1)
+                prices.update(refresh_coin_prices(missing))
+
+    return {coin_id: prices.get(coin_id, {}) for coin_id in coin_ids}
+
+
+async def aget_coin_prices(coin_ids):
+    """
+    get_coin_prices for async views. Cache reads run off the event loop and
+    misses are fetched on the async client, coalesced per event loop rather
+    than across workers, so waiting requests never hold a thread.
+    """
+    coin_ids = list(dict.fromkeys(c for c in coin_ids if c))
+    if not coin_ids:
+        return {}
+
+    prices, missing = await sync_to_async(_read_cached_prices, thread_sensitive=False)(coin_ids)
+    if missing:
+        loop = asyncio.get_running_loop()
+        lock = _async_fetch_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            missing = await sync_to_async(_refill, thread_sensitive=False)(prices, missing)
+            if missing:
+                record(recomputes=1)
+                prices.update(await arefresh_coin_prices(missing))
+
+    return {coin_id: prices.get(coin_id, {}) for coin_id in coin_ids}
+
+
+def get_tracked_coin_ids():
+    """Every coin held, watched or alerted on by any user"""
+    coin_ids = set(PortfolioAsset.objects.values_list('coin_id', flat=True).distinct())
+    coin_ids.update(Watchlist.objects.values_list('coin_id', flat=True).distinct())
+    coin_ids.update(PriceAlert.objects.filter(is_active=True).values_list('coin_id', flat=True).distinct())
+    coin_ids.discard('')
+    return sorted(coin_ids)
+
+
+def prices_as_of(prices):
+    """Oldest upstream update time across a price dict, for "as of" labels"""
+    timestamps = [data['last_updated_at'] for data in prices.values() if data.get('last_updated_at')]
+    if not timestamps:
+        return None
+    return as_of({'fetched_at': min(timestamps)})
+
+
+def fetch_market_data(per_page=MARKET_PAGE_SIZE, page=1):
+    """Fetch one page of /coins/markets ordered by market cap"""
+    return http_client.get_json(f'{COINGECKO_API_URL}/coins/markets', params={
+        'vs_currency': 'usd',
+        'order': 'market_cap_desc',
+        'per_page': per_page,
+        'page': page,
+        'sparkline': False,
+        'price_change_percentage': '24h,7d'
+    }, timeout=10, conditional=True)
+
+
+def refresh_market_data(per_page=MARKET_PAGE_SIZE, page=1):
+    """Fetch a markets page and store it for stale-while-revalidate reads"""
+    data = fetch_market_data(per_page, page)
+    if data:
+        set_entry(_market_cache_key(per_page, page), data, store=_market_store(page))
+    return data
+
+
+def get_market_snapshot(per_page=MARKET_PAGE_SIZE, page=1):
+    """
+    Pre-warmed markets list plus the time it was fetched.
+    The first page is kept warm by the ingester and never fetched inline;
+    deeper pages are fetched on their first request and then served
+    stale-while-revalidate like everything else.
+    """
+    entry = get_stale_while_revalidate(
+        _market_cache_key(per_page, page),
+        lambda: refresh_market_data(per_page, page),
+        MARKET_FRESH_SECONDS,
+        block_on_miss=page > 1,
+        store=_market_store(page)
+    )
+    return {
+        'coins': entry['data'] if entry else [],
+        'as_of': as_of(entry),
+    }
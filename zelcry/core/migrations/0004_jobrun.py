@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_pricealert_triggered_pricealert_triggered_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('last_status', models.CharField(blank=True, choices=[('running', 'Running'), ('success', 'Success'), ('error', 'Error'), ('timeout', 'Timed out'), ('missed', 'Missed'), ('skipped', 'Skipped')], max_length=10)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('failure_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['job_id'],
+            },
+        ),
+    ]
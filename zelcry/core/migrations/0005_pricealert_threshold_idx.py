@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_jobrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(fields=['is_active', 'coin_id', 'condition', 'target_price'], name='pricealert_threshold_idx'),
+        ),
+    ]
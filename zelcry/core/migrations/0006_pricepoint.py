@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_pricealert_threshold_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coin_id', models.CharField(max_length=100)),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('timestamp', models.DateTimeField()),
+                ('price', models.FloatField()),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'constraints': [models.UniqueConstraint(fields=('coin_id', 'resolution', 'timestamp'), name='unique_price_point')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:13
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Round
+
+
+def backfill_impact_score(apps, schema_editor):
+    CryptoAssetDetails = apps.get_model('core', 'CryptoAssetDetails')
+    total = F('energy_score') + F('governance_score') + F('utility_score')
+    CryptoAssetDetails.objects.update(impact_score=Round(Cast(total, FloatField()) / Value(3.0), 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_chatmessage_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptoassetdetails',
+            name='impact_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_impact_score, migrations.RunPython.noop),
+    ]
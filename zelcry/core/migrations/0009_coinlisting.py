@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_cryptoassetdetails_impact_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinListing',
+            fields=[
+                ('coin_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('symbol', models.CharField(max_length=50)),
+                ('name', models.CharField(max_length=200)),
+                ('image', models.CharField(blank=True, max_length=500)),
+                ('market_cap_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('current_price', models.FloatField(blank=True, null=True)),
+                ('market_cap', models.FloatField(blank=True, null=True)),
+                ('total_volume', models.FloatField(blank=True, null=True)),
+                ('price_change_24h', models.FloatField(blank=True, null=True)),
+                ('price_change_7d', models.FloatField(blank=True, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['market_cap_rank', 'coin_id'],
+                'indexes': [models.Index(fields=['market_cap_rank', 'coin_id'], name='coinlisting_rank_idx'), models.Index(fields=['-total_volume', 'coin_id'], name='coinlisting_volume_idx'), models.Index(fields=['-price_change_24h', 'coin_id'], name='coinlisting_change_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_coinlisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsArticle',
+            fields=[
+                ('article_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('title', models.TextField()),
+                ('body', models.TextField(blank=True)),
+                ('url', models.URLField(max_length=1000)),
+                ('source', models.CharField(blank=True, max_length=200)),
+                ('image_url', models.URLField(blank=True, max_length=1000)),
+                ('published_on', models.DateTimeField()),
+                ('categories', models.TextField(blank=True)),
+                ('tags', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-published_on', '-article_id'],
+                'indexes': [models.Index(fields=['-published_on', '-article_id'], name='newsarticle_published_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('published_on', models.DateTimeField()),
+                ('article', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='category_entries', to='core.newsarticle')),
+            ],
+            options={
+                'verbose_name_plural': 'News categories',
+                'indexes': [models.Index(fields=['key', '-published_on', '-article'], name='newscategory_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'key'), name='unique_news_category')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NewsTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('published_on', models.DateTimeField()),
+                ('article', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='core.newsarticle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', '-published_on', '-article'], name='newsterm_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'term'), name='unique_news_term')],
+            },
+        ),
+    ]
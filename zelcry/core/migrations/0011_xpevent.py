@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    UserProfile = apps.get_model('core', 'UserProfile')
+    XPEvent = apps.get_model('core', 'XPEvent')
+    XPEvent.objects.bulk_create(
+        (XPEvent(user_id=user_id, reason='opening_balance', points=xp)
+         for user_id, xp in UserProfile.objects.exclude(xp_points=0).values_list('user_id', 'xp_points').iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_news_store'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XPEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('opening_balance', 'Opening balance'), ('signup', 'Joined Zelcry'), ('login', 'Logged in'), ('portfolio_add', 'Added a portfolio asset'), ('watchlist_add', 'Added to watchlist'), ('price_alert', 'Created a price alert'), ('ai_chat', 'Asked the AI advisor')], max_length=20)),
+                ('points', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='xp_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='xpevent_user_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
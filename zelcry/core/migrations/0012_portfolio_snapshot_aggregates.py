@@ -0,0 +1,69 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+AGGREGATE_FIELDS = ['period_return', 'growth_index', 'return_count', 'return_sum', 'return_sum_sq']
+
+
+def backfill_aggregates(apps, schema_editor):
+    # Same running aggregates as core.performance.extend, over each user's
+    # existing snapshots in order
+    PortfolioSnapshot = apps.get_model('core', 'PortfolioSnapshot')
+    user_ids = PortfolioSnapshot.objects.values_list('user_id', flat=True).distinct().order_by('user_id')
+    for user_id in list(user_ids):
+        snapshots = list(PortfolioSnapshot.objects.filter(user_id=user_id).order_by('created_at', 'id'))
+        for previous, snapshot in zip(snapshots, snapshots[1:]):
+            period_return = None
+            if previous.total_value > 0:
+                flow = float(snapshot.total_invested - previous.total_invested)
+                period_return = (float(snapshot.total_value) - flow) / float(previous.total_value) - 1
+                if period_return <= -1:
+                    period_return = None
+            snapshot.period_return = period_return
+            snapshot.growth_index = previous.growth_index * (1 + (period_return or 0))
+            snapshot.return_count = previous.return_count + (period_return is not None)
+            snapshot.return_sum = previous.return_sum + (period_return or 0)
+            snapshot.return_sum_sq = previous.return_sum_sq + (period_return or 0) ** 2
+        PortfolioSnapshot.objects.bulk_update(snapshots[1:], AGGREGATE_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_xpevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='growth_index',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='period_return',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='return_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='return_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='return_sum_sq',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='portfoliosnapshot',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='snapshot_user_created_idx'),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
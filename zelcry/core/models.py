@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 class UserProfile(models.Model):
@@ -23,9 +23,32 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+
+class XPEvent(models.Model):
+    """One XP award; UserProfile.xp_points is the running sum of these"""
+    REASON_CHOICES = [
+        ('opening_balance', 'Opening balance'),
+        ('signup', 'Joined Zelcry'),
+        ('login', 'Logged in'),
+        ('portfolio_add', 'Added a portfolio asset'),
+        ('watchlist_add', 'Added to watchlist'),
+        ('price_alert', 'Created a price alert'),
+        ('ai_chat', 'Asked the AI advisor'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='xp_events')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    points = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='xpevent_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} +{self.points} XP ({self.reason})"
 
 
 class PortfolioAsset(models.Model):
@@ -51,19 +74,55 @@ class CryptoAssetDetails(models.Model):
     energy_score = models.IntegerField(default=0)
     governance_score = models.IntegerField(default=0)
     utility_score = models.IntegerField(default=0)
+    # Mean of the three scores, stored so lists can filter and sort by it
+    impact_score = models.FloatField(default=0, db_index=True)
     description = models.TextField(blank=True)
     
     class Meta:
         verbose_name_plural = "Crypto Asset Details"
     
+    SCORE_FIELDS = ('energy_score', 'governance_score', 'utility_score')
+    
+    def refresh_impact_score(self):
+        """Recompute impact_score; bulk writes that skip save() must call this"""
+        self.impact_score = round((self.energy_score + self.governance_score + self.utility_score) / 3, 1)
+    
+    def save(self, *args, **kwargs):
+        self.refresh_impact_score()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(self.SCORE_FIELDS) & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'impact_score'}
+        super().save(*args, **kwargs)
+    
     @property
     def get_impact_score(self):
-        return round((self.energy_score + self.governance_score + self.utility_score) / 3, 1)
+        return self.impact_score
     
     def __str__(self):
         return f"{self.name} ({self.symbol})"
 
 
+@receiver([post_save, post_delete], sender=CryptoAssetDetails)
+def invalidate_impact_index(sender, **kwargs):
+    from .impact_index import invalidate
+    transaction.on_commit(invalidate)
+
+
+@receiver([post_save, post_delete], sender=PortfolioAsset)
+def invalidate_ai_context_on_holdings(sender, instance, **kwargs):
+    from .ai_context import invalidate_user_context
+    invalidate_user_context(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_ai_context_on_profile(sender, instance, update_fields=None, **kwargs):
+    # Theme updates pass update_fields and never touch the context; XP
+    # awards update the balance without a save
+    if update_fields is None or 'risk_tolerance' in update_fields:
+        from .ai_context import invalidate_user_context
+        invalidate_user_context(instance.user_id)
+
+
 class ChatMessage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='chat_messages')
     session_id = models.CharField(max_length=100, null=True, blank=True)
@@ -73,6 +132,10 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='chatmessage_user_created_idx'),
+            models.Index(fields=['session_id', 'created_at'], name='chatmessage_session_idx'),
+        ]
     
     def __str__(self):
         username = self.user.username if self.user else f"Guest-{self.session_id}"
@@ -92,10 +155,20 @@ class PriceAlert(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'coin_id', 'condition', 'target_price'], name='pricealert_threshold_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.coin_name} {self.condition} ${self.target_price}"
 
+@receiver([post_save, post_delete], sender=PriceAlert)
+def invalidate_price_alert_index(sender, instance, created=False, **kwargs):
+    # New alerts are loaded incrementally; edits and deletes need a rebuild
+    if not created:
+        from .alerts import mark_index_dirty
+        mark_index_dirty()
+
 
 class Watchlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watchlist_items')
@@ -119,10 +192,169 @@ class PortfolioSnapshot(models.Model):
     total_invested = models.DecimalField(max_digits=20, decimal_places=2)
     profit_loss = models.DecimalField(max_digits=20, decimal_places=2)
     roi_percentage = models.DecimalField(max_digits=10, decimal_places=2)
+    # Return since the user's previous snapshot net of money added or
+    # removed, and running totals over all of the user's snapshots up to
+    # this one; a range's metrics are the difference between its first and
+    # last rows (see core/performance.py).
+    period_return = models.FloatField(null=True, blank=True)
+    growth_index = models.FloatField(default=1.0)
+    return_count = models.PositiveIntegerField(default=0)
+    return_sum = models.FloatField(default=0)
+    return_sum_sq = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='snapshot_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - ${self.total_value} on {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class PricePoint(models.Model):
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    coin_id = models.CharField(max_length=100)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    timestamp = models.DateTimeField()
+    price = models.FloatField()
+    
+    class Meta:
+        ordering = ['timestamp']
+        constraints = [
+            # Also serves every (coin, resolution, time range) chart query
+            models.UniqueConstraint(fields=['coin_id', 'resolution', 'timestamp'], name='unique_price_point'),
+        ]
+    
+    def __str__(self):
+        return f"{self.coin_id} {self.resolution} {self.timestamp:%Y-%m-%d %H:%M} ${self.price}"
+
+
+class CoinListing(models.Model):
+    # Locally synced CoinGecko catalog (see core/coin_catalog.py). Coins
+    # outside the synced market pages have no rank or market fields.
+    coin_id = models.CharField(max_length=100, primary_key=True)
+    symbol = models.CharField(max_length=50)
+    name = models.CharField(max_length=200)
+    image = models.CharField(max_length=500, blank=True)
+    market_cap_rank = models.PositiveIntegerField(null=True, blank=True)
+    current_price = models.FloatField(null=True, blank=True)
+    market_cap = models.FloatField(null=True, blank=True)
+    total_volume = models.FloatField(null=True, blank=True)
+    price_change_24h = models.FloatField(null=True, blank=True)
+    price_change_7d = models.FloatField(null=True, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['market_cap_rank', 'coin_id']
+        indexes = [
+            # One per sort on the cryptocurrencies page, tie-broken by coin_id
+            models.Index(fields=['market_cap_rank', 'coin_id'], name='coinlisting_rank_idx'),
+            models.Index(fields=['-total_volume', 'coin_id'], name='coinlisting_volume_idx'),
+            models.Index(fields=['-price_change_24h', 'coin_id'], name='coinlisting_change_idx'),
+        ]
+    
+    def as_market_row(self):
+        """The listing shaped like a CoinGecko /coins/markets entry, for templates"""
+        return {
+            'id': self.coin_id,
+            'symbol': self.symbol,
+            'name': self.name,
+            'image': self.image,
+            'market_cap_rank': self.market_cap_rank,
+            'current_price': self.current_price or 0,
+            'market_cap': self.market_cap or 0,
+            'total_volume': self.total_volume or 0,
+            'price_change_percentage_24h': self.price_change_24h or 0,
+            'price_change_percentage_7d_in_currency': self.price_change_7d or 0,
+        }
+    
+    def __str__(self):
+        return f"{self.name} ({self.symbol.upper()})"
+
+
+class NewsArticle(models.Model):
+    article_id = models.CharField(max_length=64, primary_key=True)
+    title = models.TextField()
+    body = models.TextField(blank=True)
+    url = models.URLField(max_length=1000)
+    source = models.CharField(max_length=200, blank=True)
+    image_url = models.URLField(max_length=1000, blank=True)
+    published_on = models.DateTimeField()
+    # '|'-separated, as CryptoCompare sends them
+    categories = models.TextField(blank=True)
+    tags = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-published_on', '-article_id']
+        indexes = [
+            models.Index(fields=['-published_on', '-article_id'], name='newsarticle_published_idx'),
+        ]
+    
+    def __str__(self):
+        return self.title
+
+
+class NewsTerm(models.Model):
+    # Inverted index over article titles and bodies (see core/crypto_news.py)
+    term = models.CharField(max_length=40)
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, related_name='terms', db_index=False)
+    published_on = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            # Also serves "does this article contain term" lookups
+            models.UniqueConstraint(fields=['article', 'term'], name='unique_news_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', '-published_on', '-article'], name='newsterm_lookup_idx'),
+        ]
+
+
+class NewsCategory(models.Model):
+    key = models.CharField(max_length=100)
+    name = models.CharField(max_length=100)
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, related_name='category_entries', db_index=False)
+    published_on = models.DateTimeField()
+    
+    class Meta:
+        verbose_name_plural = "News categories"
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'key'], name='unique_news_category'),
+        ]
+        indexes = [
+            models.Index(fields=['key', '-published_on', '-article'], name='newscategory_lookup_idx'),
+        ]
+
+
+class JobRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('error', 'Error'),
+        ('timeout', 'Timed out'),
+        ('missed', 'Missed'),
+        ('skipped', 'Skipped'),
+    ]
+    
+    job_id = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=200)
+    last_status = models.CharField(max_length=10, choices=STATUS_CHOICES, blank=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['job_id']
+    
+    def __str__(self):
+        return f"{self.name} ({self.last_status or 'never run'})"
@@ -0,0 +1,153 @@
+from datetime import timedelta
+import math
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Avg, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Trunc
+from .models import PortfolioSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Performance over a user's snapshot history. Every snapshot carries its
+# period return and running aggregates (growth index, count, sum and sum of
+# squares of returns), set once when it is appended, so a range's
+# time-weighted return, volatility and Sharpe ratio come from its first and
+# last rows alone. Max drawdown and the chart read the range downsampled in
+# the database. Results are cached per user, range and latest snapshot, so
+# a new snapshot makes the next read recompute and nothing is invalidated.
+PERFORMANCE_RANGES = {'30d': 30, '90d': 90, '1y': 365, 'all': None}
+DEFAULT_RANGE = '90d'
+PERFORMANCE_TIMEOUT = 60 * 60 * 24
+SECONDS_PER_YEAR = 365.25 * 24 * 60 * 60
+
+# Chart buckets by the range's span in days
+BUCKETS = [(2, 'hour'), (180, 'day'), (730, 'week')]
+LONGEST_BUCKET = 'month'
+
+
+def extend(snapshot, previous):
+    """
+    Set snapshot's period return and running aggregates from the user's
+    previous snapshot (None for their first). Money added or removed is
+    taken at cost, the only basis holdings record, and periods that start
+    from an empty portfolio have no return.
+    """
+    if previous is None:
+        snapshot.period_return = None
+        snapshot.growth_index = 1.0
+        snapshot.return_count = 0
+        snapshot.return_sum = 0.0
+        snapshot.return_sum_sq = 0.0
+        return snapshot
+
+    period_return = None
+    if previous.total_value > 0:
+        flow = float(snapshot.total_invested - previous.total_invested)
+        period_return = (float(snapshot.total_value) - flow) / float(previous.total_value) - 1
+        if period_return <= -1:
+            period_return = None
+
+    snapshot.period_return = period_return
+    snapshot.growth_index = previous.growth_index * (1 + (period_return or 0))
+    snapshot.return_count = previous.return_count + (period_return is not None)
+    snapshot.return_sum = previous.return_sum + (period_return or 0)
+    snapshot.return_sum_sq = previous.return_sum_sq + (period_return or 0) ** 2
+    return snapshot
+
+
+def latest_snapshots(user_ids):
+    """user_id -> latest PortfolioSnapshot for those of user_ids that have one, in one query"""
+    latest = PortfolioSnapshot.objects.filter(user=OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+    latest_ids = User.objects.filter(pk__in=user_ids).annotate(latest_id=Subquery(latest)).values('latest_id')
+    return {snapshot.user_id: snapshot for snapshot in PortfolioSnapshot.objects.filter(id__in=latest_ids)}
+
+
+def _bucket_for(days):
+    return next((kind for limit, kind in BUCKETS if days <= limit), LONGEST_BUCKET)
+
+
+def _ratios(first, last):
+    """Time-weighted return, annualized volatility and Sharpe ratio between two snapshots"""
+    twr = last.growth_index / first.growth_index - 1 if first.growth_index > 0 else None
+    count = last.return_count - first.return_count
+    seconds = (last.created_at - first.created_at).total_seconds()
+    if count < 2 or seconds <= 0:
+        return twr, None, None
+
+    total = last.return_sum - first.return_sum
+    mean = total / count
+    variance = max(0.0, (last.return_sum_sq - first.return_sum_sq - total * mean) / (count - 1))
+    periods_per_year = SECONDS_PER_YEAR / (seconds / count)
+    volatility = math.sqrt(variance * periods_per_year)
+    sharpe = (mean * periods_per_year - settings.RISK_FREE_RATE) / volatility if volatility > 0 else None
+    return twr, volatility, sharpe
+
+
+def _history(rows, days):
+    """Downsampled chart points and the max drawdown across them"""
+    kind = _bucket_for(days)
+    buckets = list(
+        rows.annotate(bucket=Trunc('created_at', kind)).values('bucket').annotate(
+            at=Max('created_at'), value=Avg('total_value'), high=Max('growth_index'), low=Min('growth_index')
+        ).order_by('bucket')
+    )
+    if not buckets:
+        return [], [], None
+
+    high = np.fromiter((bucket['high'] for bucket in buckets), dtype=np.float64, count=len(buckets))
+    low = np.fromiter((bucket['low'] for bucket in buckets), dtype=np.float64, count=len(buckets))
+    # Each bucket's low against the highest point of the buckets before it;
+    # a dip and recovery inside a single bucket is not seen
+    peaks = np.maximum.accumulate(np.r_[low[0], high[:-1]])
+    drawdowns = np.divide(low, peaks, out=np.ones_like(low), where=peaks > 0) - 1
+    label_format = '%m/%d %H:%M' if kind == 'hour' else '%m/%d'
+    labels = [bucket['at'].strftime(label_format) for bucket in buckets]
+    values = [round(float(bucket['value']), 2) for bucket in buckets]
+    return labels, values, min(0.0, float(drawdowns.min()))
+
+
+def _percent(ratio):
+    return round(ratio * 100, 2) if ratio is not None else None
+
+
+def _compute(user, range_key, last):
+    rows = PortfolioSnapshot.objects.filter(user=user)
+    days = PERFORMANCE_RANGES[range_key]
+    if days is not None:
+        rows = rows.filter(created_at__gte=last.created_at - timedelta(days=days))
+    first = rows.order_by('created_at', 'id').first()
+    twr, volatility, sharpe = _ratios(first, last)
+    span_days = (last.created_at - first.created_at).total_seconds() / 86400
+    labels, values, max_drawdown = _history(rows, span_days)
+    return {
+        'range': range_key,
+        'periods': last.return_count - first.return_count,
+        'twr': _percent(twr),
+        'volatility': _percent(volatility),
+        'max_drawdown': _percent(max_drawdown),
+        'sharpe': round(sharpe, 2) if sharpe is not None else None,
+        'labels': labels,
+        'values': values,
+        'as_of': last.created_at,
+    }
+
+
+def get_performance(user, range_key=DEFAULT_RANGE):
+    """
+    Time-weighted return, annualized volatility, max drawdown (all in
+    percent) and Sharpe ratio over range_key, plus downsampled chart
+    points. None before the user's first snapshot.
+    """
+    last = PortfolioSnapshot.objects.filter(user=user).order_by('-created_at', '-id').first()
+    if last is None:
+        return None
+
+    key = f'portfolio_performance_{user.pk}_{range_key}_{last.pk}'
+    performance = cache.get(key)
+    if performance is None:
+        performance = _compute(user, range_key, last)
+        cache.set(key, performance, PERFORMANCE_TIMEOUT)
+    return performance
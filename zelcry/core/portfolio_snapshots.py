@@ -0,0 +1,123 @@
+from decimal import Decimal
+from itertools import islice
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import transaction
+from .market_data import get_coin_prices
+from .models import PortfolioAsset, PortfolioSnapshot
+from .performance import extend, latest_snapshots
+from .valuation import PERCENT_PLACES, cents_to_decimal, value_holdings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every holding is streamed once, ordered by user, in chunks of
+# HOLDINGS_CHUNK_SIZE rows. All coins are priced up front from the shared
+# price cache, each chunk is valued in one numpy pass and summed per user,
+# and the snapshots are written SNAPSHOT_BATCH_SIZE at a time, each batch
+# extending its users' running performance aggregates. A user whose
+# holdings straddle two chunks carries their partial totals over. Users
+# holding a coin without a quote are skipped rather than valued at 0:
+# snapshots are permanent and every performance metric is computed from them.
+HOLDINGS_CHUNK_SIZE = 5000
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def build_snapshot(user_id, value_cents, invested_cents):
+    """Unsaved PortfolioSnapshot for totals in cents"""
+    profit_loss_cents = value_cents - invested_cents
+    roi = round(profit_loss_cents * 100 / invested_cents, PERCENT_PLACES) if invested_cents > 0 else 0.0
+    return PortfolioSnapshot(
+        user_id=user_id,
+        total_value=cents_to_decimal(value_cents),
+        total_invested=cents_to_decimal(invested_cents),
+        profit_loss=cents_to_decimal(profit_loss_cents),
+        roi_percentage=Decimal(str(roi)),
+    )
+
+
+def unpriced(coin_ids, prices):
+    """Coins among coin_ids with no USD quote in prices"""
+    return {coin_id for coin_id in coin_ids if not prices.get(coin_id, {}).get('usd')}
+
+
+def append_snapshots(snapshots):
+    """
+    Save new snapshots (at most one per user) after each user's latest,
+    extending its running aggregates. The users' rows are locked first, so
+    a concurrent append for the same user (the scheduled job and a manual
+    snapshot) waits and then extends from this one instead of from the
+    same previous snapshot.
+    """
+    user_ids = [snapshot.user_id for snapshot in snapshots]
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        previous = latest_snapshots(user_ids)
+        for snapshot in snapshots:
+            extend(snapshot, previous.get(snapshot.user_id))
+        PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=SNAPSHOT_BATCH_SIZE)
+    return len(snapshots)
+
+
+def _user_totals(rows, prices, missing):
+    """
+    (user_id, value cents, invested cents, whether any holding is unpriced)
+    for each run of one user's rows in a chunk
+    """
+    user_ids, coin_ids, quantities, cost_prices = zip(*rows)
+    valuation = value_holdings(coin_ids, quantities, cost_prices, prices)
+    owners = np.asarray(user_ids, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    values = np.add.reduceat(valuation['value_cents'], starts)
+    invested = np.add.reduceat(valuation['invested_cents'], starts)
+    unpriced_rows = np.fromiter((coin_id in missing for coin_id in coin_ids), dtype=bool, count=len(coin_ids))
+    incomplete = np.logical_or.reduceat(unpriced_rows, starts)
+    return zip(owners[starts].tolist(), values.tolist(), invested.tolist(), incomplete.tolist())
+
+
+def snapshot_all_portfolios():
+    """
+    Write one PortfolioSnapshot for every user holding at least one asset,
+    valued at the cached prices, except users holding a coin that has no
+    price. Returns the number of snapshots written.
+    """
+    coin_ids = list(PortfolioAsset.objects.order_by().values_list('coin_id', flat=True).distinct())
+    prices = get_coin_prices(coin_ids)
+    missing = unpriced(coin_ids, prices)
+
+    holdings = PortfolioAsset.objects.order_by('user_id').values_list(
+        'user_id', 'coin_id', 'quantity', 'purchase_price'
+    ).iterator(chunk_size=HOLDINGS_CHUNK_SIZE)
+
+    written = 0
+    skipped = 0
+    pending = None
+    snapshots = []
+
+    def finish(user_id, value_cents, invested_cents, incomplete):
+        nonlocal skipped
+        if incomplete:
+            skipped += 1
+        else:
+            snapshots.append(build_snapshot(user_id, value_cents, invested_cents))
+
+    while rows := list(islice(holdings, HOLDINGS_CHUNK_SIZE)):
+        for user_id, value_cents, invested_cents, incomplete in _user_totals(rows, prices, missing):
+            if pending and pending[0] == user_id:
+                pending = (user_id, pending[1] + value_cents, pending[2] + invested_cents, pending[3] or incomplete)
+                continue
+            if pending:
+                finish(*pending)
+            pending = (user_id, value_cents, invested_cents, incomplete)
+
+        if len(snapshots) >= SNAPSHOT_BATCH_SIZE:
+            written += append_snapshots(snapshots)
+            snapshots = []
+
+    if pending:
+        finish(*pending)
+    written += append_snapshots(snapshots)
+    if skipped:
+        logger.warning(f"Portfolio snapshots: skipped {skipped} users holding {len(missing)} coins without a price")
+    logger.info(f"Portfolio snapshots: {written} written for {len(prices) - len(missing)} coins")
+    return written
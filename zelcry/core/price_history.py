@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.db.models import Avg
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from . import http_client
+from .cache_utils import revalidate
+from .market_data import COINGECKO_API_URL, get_tracked_coin_ids
+from .models import CryptoAssetDetails, PricePoint
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long each resolution is kept; None keeps it forever.
+RETENTION = {
+    'minute': timedelta(days=2),
+    'hour': timedelta(days=90),
+    'day': None,
+}
+
+# market_chart is hit at most once per coin per this interval.
+BACKFILL_INTERVAL = 60 * 60 * 6
+BACKFILL_DAYS = 30
+BACKFILL_BATCH_SIZE = 10
+BULK_BATCH_SIZE = 1000
+
+ROLLUPS = [
+    ('minute', 'hour', TruncHour),
+    ('hour', 'day', TruncDay),
+]
+
+
+def _backfill_guard_key(coin_id):
+    return f'price_history_backfill_{coin_id}'
+
+
+def _upsert(points):
+    PricePoint.objects.bulk_create(
+        points,
+        batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['coin_id', 'resolution', 'timestamp'],
+        update_fields=['price'],
+    )
+
+
+def record_ticks(prices, at=None):
+    """Append one minute-resolution point per coin from a {coin_id: usd_price} map"""
+    at = (at or timezone.now()).replace(second=0, microsecond=0)
+    points = [
+        PricePoint(coin_id=coin_id, resolution='minute', timestamp=at, price=price)
+        for coin_id, price in prices.items() if price
+    ]
+    if points:
+        _upsert(points)
+    return len(points)
+
+
+def rollup(since, coin_ids=None):
+    """Aggregate minute points into hours and hours into days from since onwards"""
+    for source, target, trunc in ROLLUPS:
+        rows = PricePoint.objects.filter(resolution=source, timestamp__gte=trunc_start(since, target))
+        if coin_ids is not None:
+            rows = rows.filter(coin_id__in=coin_ids)
+        rows = rows.annotate(bucket=trunc('timestamp')).values('coin_id', 'bucket').annotate(avg_price=Avg('price')).order_by()
+        _upsert([
+            PricePoint(coin_id=row['coin_id'], resolution=target, timestamp=row['bucket'], price=row['avg_price'])
+            for row in rows
+        ])
+
+
+def trunc_start(moment, resolution):
+    if resolution == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def apply_retention():
+    """Delete points older than their resolution's retention window"""
+    now = timezone.now()
+    deleted = 0
+    for resolution, keep in RETENTION.items():
+        if keep is not None:
+            deleted += PricePoint.objects.filter(resolution=resolution, timestamp__lt=now - keep).delete()[0]
+    return deleted
+
+
+def backfill(coin_id, days=BACKFILL_DAYS):
+    """
+    Seed hourly history for a coin from CoinGecko market_chart.
+    Guarded by a shared cache key so the chart endpoint is called at most
+    once per coin per BACKFILL_INTERVAL, however many workers ask.
+    """
+    if not cache.add(_backfill_guard_key(coin_id), True, BACKFILL_INTERVAL):
+        return 0
+
+    data = http_client.get_json(f'{COINGECKO_API_URL}/coins/{coin_id}/market_chart', params={
+        'vs_currency': 'usd',
+        'days': days
+    }, timeout=10)
+    if not data:
+        return 0
+
+    points = {}
+    for timestamp_ms, price in data.get('prices', []):
+        moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=dt_timezone.utc)
+        points[trunc_start(moment, 'hour')] = price
+    _upsert([
+        PricePoint(coin_id=coin_id, resolution='hour', timestamp=moment, price=price)
+        for moment, price in points.items() if price
+    ])
+
+    if points:
+        rows = PricePoint.objects.filter(coin_id=coin_id, resolution='hour', timestamp__gte=min(points))
+        rows = rows.annotate(bucket=TruncDay('timestamp')).values('bucket').annotate(avg_price=Avg('price')).order_by()
+        _upsert([
+            PricePoint(coin_id=coin_id, resolution='day', timestamp=row['bucket'], price=row['avg_price'])
+            for row in rows
+        ])
+    return len(points)
+
+
+def has_history(coin_id, days=BACKFILL_DAYS):
+    """True when hourly points reach back (close to) the start of the range"""
+    start = timezone.now() - timedelta(days=days) + timedelta(days=1)
+    return PricePoint.objects.filter(coin_id=coin_id, resolution='hour', timestamp__lte=start).exists()
+
+
+def backfill_missing(limit=BACKFILL_BATCH_SIZE):
+    """Backfill up to `limit` charted or tracked coins that lack hourly history and were not tried recently"""
+    coin_ids = set(get_tracked_coin_ids())
+    coin_ids.update(CryptoAssetDetails.objects.values_list('coin_id', flat=True))
+    coin_ids.add('bitcoin')
+    missing = [
+        coin_id for coin_id in sorted(coin_ids)
+        if cache.get(_backfill_guard_key(coin_id)) is None and not has_history(coin_id)
+    ]
+    return sum(backfill(coin_id) for coin_id in missing[:limit])
+
+
+def get_price_series(coin_id, days=30, resolution='hour'):
+    """Range query over local history: list of (aware datetime, price), oldest first"""
+    since = timezone.now() - timedelta(days=days)
+    series = list(
+        PricePoint.objects.filter(coin_id=coin_id, resolution=resolution, timestamp__gte=since)
+        .order_by('timestamp').values_list('timestamp', 'price')
+    )
+    if not series or series[0][0] > since + timedelta(days=1):
+        revalidate(f'price_history_backfill:{coin_id}', lambda: backfill(coin_id, min(max(days, BACKFILL_DAYS), 90)))
+    return series
+
@@ -1,30 +1,352 @@
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
 from django.core.management import call_command
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+import os
+import sys
+import threading
+import time
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: every process is its own leader
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Refresh intervals sit well inside the freshness windows in market_data
+# and crypto_news, so page requests always find pre-warmed data.
+MARKET_REFRESH_SECONDS = 60
+PRICE_REFRESH_SECONDS = 60
+NEWS_REFRESH_SECONDS = 300
+
+MISFIRE_GRACE_SECONDS = 30
+# Set by zelcry/asgi.py and zelcry/wsgi.py, the entry points gunicorn and
+# uvicorn load; no other process may start the scheduler in 'web' mode
+WEB_SERVER_ENV = 'ZELCRY_WEB_SERVER'
+LEADER_RETRY_SECONDS = 30
+
+_leader_fd = None
+_scheduler = None
+_job_workers = None
+_running = set()
+_running_lock = threading.Lock()
+
 def seed_crypto_data_job():
     """Background job to seed crypto data"""
+    logger.info("Running automated crypto data seeding...")
+    call_command('seed_crypto_data')
+    logger.info("Crypto data seeding completed successfully")
+
+def refresh_market_data_job():
+    """Background job to keep the markets list warm and record a price tick for each coin"""
+    from .market_data import refresh_market_data
+    from .price_history import record_ticks
+    coins = refresh_market_data()
+    if not coins:
+        raise RuntimeError("Market data refresh returned no data")
+    record_ticks({coin['id']: coin.get('current_price') for coin in coins})
+
+def sync_coin_catalog_job():
+    """Background job to bulk-sync the local coin catalog used for listing and search"""
+    from .coin_catalog import sync_coin_catalog
+    if not sync_coin_catalog():
+        raise RuntimeError("Coin catalog sync returned no coins")
+
+def refresh_market_analysis_job():
+    """Background job to regenerate the shared AI market analysis when the market moved"""
+    from .market_analysis import refresh_market_analysis
+    refresh_market_analysis()
+
+def refresh_tracked_prices_job():
+    """Background job to refresh prices for every held, watched or alerted coin, then evaluate alerts"""
+    from .alerts import evaluate_price_alerts
+    from .market_data import get_tracked_coin_ids, refresh_coin_prices
+    from .price_history import record_ticks
+    coin_ids = get_tracked_coin_ids()
+    if coin_ids:
+        prices = refresh_coin_prices(coin_ids)
+        record_ticks({coin_id: data.get('usd') for coin_id, data in prices.items()})
+        evaluate_price_alerts(prices)
+
+def refresh_news_job():
+    """Background job to add newly published articles to the news store"""
+    from .crypto_news import refresh_crypto_news
+    if refresh_crypto_news() is None:
+        raise RuntimeError("News feed could not be fetched")
+
+def rollup_price_history_job():
+    """Background job to roll minute prices into hours and days and apply retention"""
+    from .price_history import apply_retention, rollup
+    rollup(since=timezone.now() - timedelta(hours=2))
+    apply_retention()
+
+def backfill_price_history_job():
+    """Background job to seed hourly history for coins that have none yet"""
+    from .price_history import backfill_missing
+    backfill_missing()
+
+def snapshot_portfolios_job():
+    """Background job to record every user's portfolio value for the analytics history"""
+    from .portfolio_snapshots import snapshot_all_portfolios
+    snapshot_all_portfolios()
+
+# Ingestion jobs also run once at startup so the cache is warm before the
+# first page request arrives. Timeouts are in seconds.
+JOBS = [
+    {
+        'id': 'seed_crypto_data',
+        'name': 'Seed Cryptocurrency Data',
+        'func': seed_crypto_data_job,
+        'trigger': {'hours': 1},
+        'timeout': 300,
+        'run_at_start': False,
+    },
+    {
+        'id': 'refresh_market_data',
+        'name': 'Refresh Market Data',
+        'func': refresh_market_data_job,
+        'trigger': {'seconds': MARKET_REFRESH_SECONDS},
+        'timeout': 45,
+        'run_at_start': True,
+    },
+    {
+        'id': 'sync_coin_catalog',
+        'name': 'Sync Coin Catalog',
+        'func': sync_coin_catalog_job,
+        'trigger': {'minutes': 10},
+        'timeout': 180,
+        'run_at_start': True,
+    },
+    {
+        'id': 'refresh_market_analysis',
+        'name': 'Refresh AI Market Analysis',
+        'func': refresh_market_analysis_job,
+        'trigger': {'seconds': MARKET_REFRESH_SECONDS},
+        'timeout': 90,
+        'run_at_start': True,
+    },
+    {
+        'id': 'refresh_tracked_prices',
+        'name': 'Refresh Tracked Coin Prices',
+        'func': refresh_tracked_prices_job,
+        'trigger': {'seconds': PRICE_REFRESH_SECONDS},
+        'timeout': 45,
+        'run_at_start': True,
+    },
+    {
+        'id': 'refresh_news',
+        'name': 'Refresh Crypto News',
+        'func': refresh_news_job,
+        'trigger': {'seconds': NEWS_REFRESH_SECONDS},
+        'timeout': 60,
+        'run_at_start': True,
+    },
+    {
+        'id': 'rollup_price_history',
+        'name': 'Roll Up Price History',
+        'func': rollup_price_history_job,
+        'trigger': {'minutes': 10},
+        'timeout': 120,
+        'run_at_start': False,
+    },
+    {
+        'id': 'snapshot_portfolios',
+        'name': 'Snapshot Portfolios',
+        'func': snapshot_portfolios_job,
+        'trigger': {'hours': settings.PORTFOLIO_SNAPSHOT_HOURS},
+        'timeout': 600,
+        'run_at_start': False,
+    },
+    {
+        'id': 'backfill_price_history',
+        'name': 'Backfill Price History',
+        'func': backfill_price_history_job,
+        'trigger': {'minutes': 15},
+        'timeout': 180,
+        'run_at_start': True,
+    },
+]
+
+def _record_run(job_id, name, **fields):
+    from .models import JobRun
+    run, _ = JobRun.objects.get_or_create(job_id=job_id, defaults={'name': name})
+    JobRun.objects.filter(pk=run.pk).update(name=name, **fields)
+
+def run_job(job):
+    """
+    Run one job with timing, a timeout and its outcome recorded in JobRun.
+    The job body runs on a separate worker so a hung upstream call is
+    abandoned after job['timeout'] seconds instead of blocking the slot.
+    """
+    job_id, name = job['id'], job['name']
+    with _running_lock:
+        still_running = job_id in _running
+        _running.add(job_id)
+    if still_running:
+        logger.warning(f"{name} is still running from a previous timed-out run, skipping")
+        _record_skip(job, 'skipped')
+        return
+
+    def body():
+        close_old_connections()
+        try:
+            job['func']()
+        finally:
+            close_old_connections()
+            with _running_lock:
+                _running.discard(job_id)
+
+    started_at = timezone.now()
+    started = time.monotonic()
     try:
-        logger.info("Running automated crypto data seeding...")
-        call_command('seed_crypto_data')
-        logger.info("Crypto data seeding completed successfully")
+        _record_run(job_id, name, last_status='running', last_started_at=started_at)
+        future = _job_workers.submit(body)
     except Exception as e:
-        logger.error(f"Error in crypto data seeding: {e}")
+        with _running_lock:
+            _running.discard(job_id)
+        logger.error(f"Could not start {name}: {e}")
+        close_old_connections()
+        return
 
-def start_scheduler():
-    """Start the background scheduler for automated tasks"""
-    scheduler = BackgroundScheduler()
-    
-    scheduler.add_job(
-        seed_crypto_data_job,
-        'interval',
-        hours=1,
-        id='seed_crypto_data',
-        replace_existing=True,
-        name='Seed Cryptocurrency Data'
+    status, error = 'success', ''
+    try:
+        future.result(timeout=job['timeout'])
+    except FutureTimeoutError:
+        status, error = 'timeout', f"Exceeded {job['timeout']}s"
+        logger.error(f"{name} timed out after {job['timeout']}s")
+    except Exception as e:
+        status, error = 'error', str(e)[:1000]
+        logger.error(f"Error in {name}: {e}")
+
+    try:
+        _record_run(
+            job_id, name,
+            last_status=status,
+            last_finished_at=timezone.now(),
+            last_duration_ms=int((time.monotonic() - started) * 1000),
+            last_error=error,
+            run_count=F('run_count') + 1,
+            failure_count=F('failure_count') + (0 if status == 'success' else 1),
+        )
+    except Exception as e:
+        logger.error(f"Could not record run of {name}: {e}")
+    close_old_connections()
+
+def _record_skip(job, status):
+    try:
+        close_old_connections()
+        _record_run(job['id'], job['name'], last_status=status)
+    except Exception as e:
+        logger.error(f"Could not record {status} run of {job['name']}: {e}")
+    finally:
+        close_old_connections()
+
+def _on_job_skipped(event):
+    job = next((j for j in JOBS if j['id'] == event.job_id), None)
+    if job is None:
+        return
+    status = 'missed' if event.code == EVENT_JOB_MISSED else 'skipped'
+    logger.warning(f"{job['name']} {status} its run scheduled for {event.scheduled_run_time}")
+    _record_skip(job, status)
+
+def build_scheduler(blocking=False):
+    """Scheduler with every job registered, a bounded thread pool and misfire handling"""
+    global _job_workers
+    threads = settings.SCHEDULER_THREADS
+    if _job_workers is None:
+        _job_workers = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='zelcry-job')
+
+    scheduler_class = BlockingScheduler if blocking else BackgroundScheduler
+    scheduler = scheduler_class(
+        executors={'default': SchedulerThreadPool(threads)},
+        job_defaults={
+            'coalesce': True,
+            'max_instances': 1,
+            'misfire_grace_time': MISFIRE_GRACE_SECONDS,
+        },
     )
-    
-    scheduler.start()
-    logger.info("Crypto data scheduler started - running every hour")
+    scheduler.add_listener(_on_job_skipped, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    now = timezone.now()
+    for job in JOBS:
+        extra = {'next_run_time': now} if job['run_at_start'] else {}
+        scheduler.add_job(
+            run_job,
+            'interval',
+            args=[job],
+            id=job['id'],
+            name=job['name'],
+            replace_existing=True,
+            **job['trigger'],
+            **extra
+        )
+    return scheduler
+
+def acquire_leadership(blocking=False):
+    """
+    Take the cluster-wide scheduler lock (an flock on SCHEDULER_LOCK_FILE).
+    The lock is held for the life of the process and released by the OS
+    when it exits, so a replacement leader can take over.
+    """
+    global _leader_fd
+    if _leader_fd is not None:
+        return True
+    if fcntl is None:
+        _leader_fd = -1
+        return True
+
+    os.makedirs(os.path.dirname(settings.SCHEDULER_LOCK_FILE), exist_ok=True)
+    fd = os.open(settings.SCHEDULER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _leader_fd = fd
+    return True
+
+def should_start_in_process():
+    """
+    Only web server processes schedule jobs: those started through the
+    ASGI/WSGI entry points, and runserver. Management commands, tests,
+    shells and other scripts never do.
+    """
+    if settings.SCHEDULER_MODE != 'web':
+        return False
+    if os.environ.get(WEB_SERVER_ENV) == '1':
+        return True
+    argv = sys.argv
+    if len(argv) < 2 or os.path.basename(argv[0]) not in ('manage.py', 'django-admin', '__main__.py') or argv[1] != 'runserver':
+        return False
+    # The autoreloader parent never serves requests
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in argv
+
+def _start_as_leader():
+    global _scheduler
+    _scheduler = build_scheduler()
+    _scheduler.start()
+    logger.info(f"Job scheduler started in process {os.getpid()} with {len(JOBS)} jobs")
+
+def _wait_for_leadership():
+    while not acquire_leadership():
+        time.sleep(LEADER_RETRY_SECONDS)
+    _start_as_leader()
+
+def start_scheduler():
+    """Start the background scheduler if this process wins leader election"""
+    if acquire_leadership():
+        _start_as_leader()
+        return
+    logger.info(f"Process {os.getpid()} is not the job leader; standing by")
+    threading.Thread(target=_wait_for_leadership, name='zelcry-leader-election', daemon=True).start()
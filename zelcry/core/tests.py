@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import math
+import os
+from unittest import mock, skipUnless
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from groq import APIStatusError
+from . import (
+    ai_cache, ai_context, alerts, async_views, cache_utils, charts, chat_memory, coin_catalog, crypto_news, groq_ai, http_client, llm_dispatch, impact_index, llm_router, market_analysis, market_data,
+    performance, portfolio_snapshots, price_history, scheduler, valuation, views, xp,
+)
+from .cache_utils import flight_lock, make_entry, state_cache
+from .management.commands.run_groq_standin import StandinHandler
+from .models import ChatMessage, CoinListing, CryptoAssetDetails, JobRun, NewsArticle, NewsTerm, PortfolioAsset, PortfolioSnapshot, PriceAlert, PricePoint
+from .portfolio_snapshots import append_snapshots, build_snapshot
 
-# Create your tests here.
+# Tests that read or write the cache get a private in-memory one, so they
+# neither see nor clear the file cache of a local run
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'zelcry-tests'},
+    'state': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'zelcry-tests-state'},
+    'template_fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'zelcry-tests-fragments'},
+}
+
+FAST = 'fast-model'
+LARGE = 'large-model'
+
+
+def _reset_router():
+    llm_router._samples.clear()
+    llm_router._stats.clear()
+
+
+@override_settings(LLM_FAST_MODEL=FAST, LLM_LARGE_MODEL=LARGE, LLM_FAST_MAX_TOKENS=120, LLM_SLOW_SECONDS=8)
+class LLMRouterTests(SimpleTestCase):
+    def setUp(self):
+        _reset_router()
+
+    def test_short_question_goes_to_fast_model(self):
+        self.assertEqual(llm_router.advisor_model('What is Bitcoin?'), FAST)
+
+    def test_analytical_question_goes_to_large_model(self):
+        self.assertEqual(llm_router.advisor_model('Compare Ethereum and Solana'), LARGE)
+        self.assertEqual(llm_router.advisor_model('Give me an in-depth outlook'), LARGE)
+
+    def test_long_question_goes_to_large_model(self):
+        self.assertEqual(llm_router.advisor_model('word ' * 200), LARGE)
+
+    def test_candidates_keep_preference_while_healthy(self):
+        self.assertEqual(llm_router.candidates(FAST), [FAST, LARGE])
+        self.assertEqual(llm_router.candidates(LARGE), [LARGE, FAST])
+
+    def test_failing_model_is_tried_last(self):
+        for _ in range(llm_router.HEALTH_MIN_SAMPLES):
+            llm_router.record_failure(FAST, 0.1)
+        self.assertEqual(llm_router.candidates(FAST), [LARGE, FAST])
+        self.assertEqual(llm_router.get_stats()[LARGE]['rerouted'], 1)
+
+    def test_slow_model_is_tried_last(self):
+        for _ in range(llm_router.HEALTH_MIN_SAMPLES):
+            llm_router.record_success(FAST, 20)
+        self.assertEqual(llm_router.candidates(FAST), [LARGE, FAST])
+
+    def test_too_few_samples_do_not_mark_a_model_unhealthy(self):
+        llm_router.record_failure(FAST, 0.1)
+        self.assertEqual(llm_router.candidates(FAST), [FAST, LARGE])
+
+    def test_preference_stands_when_both_models_are_unhealthy(self):
+        for _ in range(llm_router.HEALTH_MIN_SAMPLES):
+            llm_router.record_failure(FAST, 0.1)
+            llm_router.record_failure(LARGE, 0.1)
+        self.assertEqual(llm_router.candidates(FAST), [FAST, LARGE])
+
+
+class StandinTestCase(SimpleTestCase):
+    """Groq calls against the run_groq_standin server with per-model error rates"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.handler = type('Handler', (StandinHandler,), {'latency': {}, 'error_rate': {}, 'chunk_delay': 0})
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), cls.handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        overrides = override_settings(
+            GROQ_API_KEY='test-key',
+            GROQ_BASE_URL=f'http://127.0.0.1:{self.server.server_port}',
+            LLM_FAST_MODEL=FAST,
+            LLM_LARGE_MODEL=LARGE,
+            LLM_CALL_TIMEOUT=10,
+            LLM_FAILOVER_AFTER=5,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.handler.error_rate = {}
+        groq_ai._client = None
+        self.addCleanup(setattr, groq_ai, '_client', None)
+        _reset_router()
+
+
+class GroqFailoverTests(StandinTestCase):
+    def complete(self, preferred):
+        return groq_ai._complete({'messages': [{'role': 'user', 'content': 'hello'}]}, preferred)
+
+    def test_healthy_model_answers(self):
+        self.assertIn(f'Stand-in reply from {FAST}', self.complete(FAST))
+        self.assertEqual(llm_router.get_stats()[FAST]['calls'], 1)
+
+    def test_failing_model_fails_over(self):
+        self.handler.error_rate = {FAST: 1.0}
+        self.assertIn(f'Stand-in reply from {LARGE}', self.complete(FAST))
+        stats = llm_router.get_stats()
+        self.assertEqual(stats[FAST]['errors'], 1)
+        self.assertEqual(stats[FAST]['failovers'], 1)
+        self.assertEqual(stats[LARGE]['calls'], 1)
+
+    def test_repeated_failures_route_around_the_model(self):
+        self.handler.error_rate = {FAST: 1.0}
+        for _ in range(llm_router.HEALTH_MIN_SAMPLES):
+            self.complete(FAST)
+        self.handler.error_rate = {}
+        self.assertIn(f'Stand-in reply from {LARGE}', self.complete(FAST))
+        self.assertEqual(llm_router.get_stats()[FAST]['calls'], llm_router.HEALTH_MIN_SAMPLES)
+
+    def test_error_is_raised_when_every_model_fails(self):
+        self.handler.error_rate = {FAST: 1.0, LARGE: 1.0}
+        with self.assertRaises(APIStatusError):
+            self.complete(FAST)
+        stats = llm_router.get_stats()
+        self.assertEqual(stats[FAST]['failovers'], 1)
+        self.assertEqual(stats[LARGE]['failovers'], 0)
+
+    def test_failed_market_analysis_keeps_the_previous_one(self):
+        self.handler.error_rate = {FAST: 1.0, LARGE: 1.0}
+        self.assertIsNone(groq_ai.get_market_analysis('Bitcoin: $1.00 (0.00%)'))
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GroqStreamingTests(StandinTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        ai_cache._local.clear()
+
+    def test_one_client_serves_every_call(self):
+        groq_ai.get_zelcry_ai_response('hello', personalized=True)
+        client = groq_ai._client
+        groq_ai.get_zelcry_ai_response('hello again', personalized=True)
+        self.assertIs(groq_ai._client, client)
+
+    def test_reply_arrives_in_chunks(self):
+        chunks = list(groq_ai.stream_zelcry_ai_response('what is bitcoin', personalized=True))
+        self.assertGreater(len(chunks), 1)
+        self.assertIn('Stand-in reply from', ''.join(chunks))
+        self.assertTrue(''.join(chunks).endswith('to: what is bitcoin'))
+
+    def test_async_reply_arrives_in_chunks(self):
+        async def collect():
+            return [chunk async for chunk in groq_ai.astream_zelcry_ai_response('what is bitcoin', personalized=True)]
+        chunks = asyncio.run(collect())
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(''.join(chunks).endswith('to: what is bitcoin'))
+
+    def test_streamed_reply_is_cached_whole(self):
+        reply = ''.join(groq_ai.stream_zelcry_ai_response('what is bitcoin'))
+        self.assertEqual(list(groq_ai.stream_zelcry_ai_response('What is Bitcoin?')), [reply])
+
+    def test_stream_fails_over_before_the_first_chunk(self):
+        self.handler.error_rate = {FAST: 1.0}
+        reply = ''.join(groq_ai.stream_zelcry_ai_response('hello', personalized=True))
+        self.assertIn(f'Stand-in reply from {LARGE}', reply)
+
+    def test_stream_error_is_the_last_chunk_and_not_cached(self):
+        self.handler.error_rate = {FAST: 1.0, LARGE: 1.0}
+        with self.assertLogs(groq_ai.logger, 'ERROR'):
+            chunks = list(groq_ai.stream_zelcry_ai_response('hello'))
+        self.assertIn('Zelcry AI error', chunks[-1])
+        self.handler.error_rate = {}
+        self.assertIn('Stand-in reply from', ''.join(groq_ai.stream_zelcry_ai_response('hello')))
+
+
+@override_settings(CACHES=TEST_CACHES, GROQ_API_KEY='test-key')
+class MarketAnalysisTests(SimpleTestCase):
+    def setUp(self):
+        state_cache.clear()
+        self.coins = [{'name': 'Bitcoin', 'current_price': 50000.0, 'price_change_percentage_24h': 1.0}]
+        snapshot = mock.patch.object(market_analysis, 'get_market_snapshot', side_effect=lambda: {'coins': self.coins})
+        snapshot.start()
+        self.addCleanup(snapshot.stop)
+        generate = mock.patch.object(market_analysis, 'get_market_analysis', return_value='Markets are calm.')
+        self.generate = generate.start()
+        self.addCleanup(generate.stop)
+
+    def age_analysis(self, seconds):
+        entry = state_cache.get(market_analysis.ANALYSIS_CACHE_KEY)
+        entry['fetched_at'] -= seconds
+        state_cache.set(market_analysis.ANALYSIS_CACHE_KEY, entry)
+
+    def test_analysis_is_stored_for_readers(self):
+        self.assertEqual(market_analysis.get_latest_market_analysis(), {'analysis': None, 'as_of': None})
+        self.assertTrue(market_analysis.refresh_market_analysis())
+        self.assertEqual(market_analysis.get_latest_market_analysis()['analysis'], 'Markets are calm.')
+        self.generate.assert_called_once_with('Bitcoin: $50000.00 (1.00%)')
+
+    def test_unchanged_market_is_not_reanalyzed(self):
+        market_analysis.refresh_market_analysis()
+        self.age_analysis(market_analysis.ANALYSIS_REFRESH_SECONDS + 1)
+        self.assertFalse(market_analysis.refresh_market_analysis())
+        self.assertEqual(self.generate.call_count, 1)
+
+    def test_moved_market_is_reanalyzed_at_most_once_per_window(self):
+        market_analysis.refresh_market_analysis()
+        self.coins[0]['current_price'] = 51000.0
+        self.assertFalse(market_analysis.refresh_market_analysis())
+        self.age_analysis(market_analysis.ANALYSIS_REFRESH_SECONDS + 1)
+        self.assertTrue(market_analysis.refresh_market_analysis())
+        self.assertEqual(self.generate.call_count, 2)
+
+    def test_failed_generation_keeps_the_previous_analysis(self):
+        market_analysis.refresh_market_analysis()
+        self.age_analysis(market_analysis.ANALYSIS_REFRESH_SECONDS + 1)
+        self.coins[0]['current_price'] = 51000.0
+        self.generate.return_value = None
+        with self.assertLogs(market_analysis.logger, 'WARNING'):
+            self.assertFalse(market_analysis.refresh_market_analysis())
+        self.assertEqual(market_analysis.get_latest_market_analysis()['analysis'], 'Markets are calm.')
+
+
+@override_settings(CACHES=TEST_CACHES, GROQ_API_KEY=' ')
+class MarketAnalysisWithoutKeyTests(SimpleTestCase):
+    def test_refresh_makes_no_calls(self):
+        with mock.patch.object(market_analysis, 'get_market_snapshot') as snapshot, \
+                mock.patch.object(groq_ai, '_complete') as complete:
+            self.assertFalse(market_analysis.refresh_market_analysis())
+            self.assertIsNone(groq_ai.get_market_analysis('Bitcoin: $1.00 (0.00%)'))
+        snapshot.assert_not_called()
+        complete.assert_not_called()
+
+
+
+@override_settings(CACHES=TEST_CACHES, GROQ_API_KEY='test-key')
+class AIResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        ai_cache._local.clear()
+        replies = iter(f'reply {n}' for n in range(100))
+        patcher = mock.patch.object(groq_ai, '_complete', side_effect=lambda request, model: next(replies))
+        self.complete = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ask(self, message, history=None, personalized=False):
+        return groq_ai.get_zelcry_ai_response(message, 'guest', history, personalized=personalized)
+
+    def test_guest_follow_up_with_the_same_history_is_reused(self):
+        history = [{'role': 'user', 'content': 'What is Bitcoin?'}, {'role': 'assistant', 'content': 'A coin.'}]
+        first = self.ask('And Ethereum?', history)
+        same = [{'role': 'user', 'content': 'what is bitcoin'}, {'role': 'assistant', 'content': 'A coin'}]
+        self.assertEqual(self.ask('and ethereum', same), first)
+        self.assertEqual(self.complete.call_count, 1)
+
+    def test_follow_up_to_a_different_conversation_is_not_reused(self):
+        history = [{'role': 'user', 'content': 'What is Bitcoin?'}, {'role': 'assistant', 'content': 'A coin.'}]
+        first = self.ask('And Ethereum?', history)
+        self.assertNotEqual(self.ask('And Ethereum?'), first)
+        self.assertNotEqual(self.ask('And Ethereum?', [{'role': 'user', 'content': 'What is Solana?'}]), first)
+        self.assertEqual(self.complete.call_count, 3)
+
+    def test_personalized_prompts_are_never_shared(self):
+        self.ask('What should I buy?', personalized=True)
+        self.ask('What should I buy?', personalized=True)
+        self.assertEqual(self.complete.call_count, 2)
+
+    def test_reply_from_another_worker_is_served_from_the_shared_cache(self):
+        first = self.ask('What is a stablecoin?')
+        ai_cache._local.clear()
+        self.assertEqual(self.ask('what is a stablecoin'), first)
+        self.assertEqual(self.complete.call_count, 1)
+
+    def test_local_entries_are_bounded(self):
+        with mock.patch.object(ai_cache, 'LOCAL_MAX_ENTRIES', 2):
+            for n in range(3):
+                ai_cache.set_response(f'key-{n}', f'reply {n}', 0.1)
+            self.assertEqual(list(ai_cache._local), ['key-1', 'key-2'])
+            self.assertEqual(ai_cache.get_response('key-0'), 'reply 0')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PriceAlertEvaluationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alerts', password='x')
+        alerts._index.update(coins={}, max_id=0, built_at=0, size=0)
+        state_cache.delete(alerts.INDEX_DIRTY_KEY)
+
+    def alert(self, coin_id, condition, target_price):
+        return PriceAlert.objects.create(
+            user=self.user, coin_id=coin_id, coin_name=coin_id.title(),
+            condition=condition, target_price=Decimal(str(target_price))
+        )
+
+    def triggered_ids(self):
+        return set(PriceAlert.objects.filter(triggered=True).values_list('id', flat=True))
+
+    def test_crossed_thresholds_trigger_on_each_side(self):
+        above = [self.alert('bitcoin', 'above', target) for target in (100, 200, 300)]
+        below = [self.alert('bitcoin', 'below', target) for target in (50, 80)]
+
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 200.0}}), 2)
+        self.assertEqual(self.triggered_ids(), {above[0].id, above[1].id})
+
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 60.0}}), 1)
+        self.assertEqual(self.triggered_ids(), {above[0].id, above[1].id, below[1].id})
+        self.assertFalse(PriceAlert.objects.get(id=below[0].id).triggered)
+
+    def test_triggered_alerts_do_not_fire_again(self):
+        self.alert('bitcoin', 'above', 100)
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 150.0}}), 1)
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 150.0}}), 0)
+
+    def test_coins_without_a_price_are_skipped(self):
+        self.alert('bitcoin', 'above', 100)
+        self.assertEqual(alerts.evaluate_price_alerts({'ethereum': {'usd': 1e9}}), 0)
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 0}}), 0)
+
+    def test_matches_a_scan_of_every_alert(self):
+        rng = random.Random(7)
+        coins = ['bitcoin', 'ethereum', 'solana']
+        for _ in range(300):
+            self.alert(rng.choice(coins), rng.choice(['above', 'below']), round(rng.uniform(1, 1000), 2))
+        prices = {coin: {'usd': round(rng.uniform(1, 1000), 2)} for coin in coins}
+
+        expected = {
+            alert.id for alert in PriceAlert.objects.all()
+            if (alert.condition == 'above' and alert.target_price <= Decimal(str(prices[alert.coin_id]['usd'])))
+            or (alert.condition == 'below' and alert.target_price >= Decimal(str(prices[alert.coin_id]['usd'])))
+        }
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(alerts.evaluate_price_alerts(prices), len(expected))
+        self.assertEqual(self.triggered_ids(), expected)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def test_new_alerts_are_added_incrementally(self):
+        self.alert('bitcoin', 'above', 100)
+        alerts.evaluate_price_alerts({'bitcoin': {'usd': 50.0}})
+        built_at = alerts._index['built_at']
+
+        new = self.alert('bitcoin', 'above', 40)
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 50.0}}), 1)
+        self.assertEqual(self.triggered_ids(), {new.id})
+        self.assertEqual(alerts._index['built_at'], built_at)
+
+    def test_edited_alerts_rebuild_the_index(self):
+        edited = self.alert('bitcoin', 'above', 100)
+        alerts.evaluate_price_alerts({'bitcoin': {'usd': 50.0}})
+
+        edited.target_price = Decimal('40')
+        edited.save()
+        self.assertEqual(alerts.evaluate_price_alerts({'bitcoin': {'usd': 50.0}}), 1)
+        self.assertEqual(alerts.get_index_stats()['alerts'], 0)
+
+
+class LTTBTests(SimpleTestCase):
+    def test_short_series_are_kept_whole(self):
+        self.assertEqual(charts.lttb(range(10), range(10), 10).tolist(), list(range(10)))
+        self.assertEqual(charts.lttb(range(10), range(10), 50).tolist(), list(range(10)))
+        self.assertEqual(charts.lttb(range(10), range(10), 2).tolist(), list(range(10)))
+
+    def test_keeps_budget_points_in_order_with_both_ends(self):
+        rng = np.random.default_rng(3)
+        y = rng.normal(size=5000).cumsum()
+        keep = charts.lttb(np.arange(5000), y, 120)
+        self.assertEqual(len(keep), 120)
+        self.assertEqual((keep[0], keep[-1]), (0, 4999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_spikes_and_dips_survive(self):
+        y = np.zeros(1000)
+        y[321] = 50
+        y[777] = -50
+        keep = charts.lttb(np.arange(1000), y, 20).tolist()
+        self.assertIn(321, keep)
+        self.assertIn(777, keep)
+
+    def test_labels(self):
+        moment = datetime(2024, 3, 9, 14, 5, tzinfo=dt_timezone.utc).timestamp() * 1000
+        self.assertEqual(charts.format_labels([moment]), ['03/09'])
+        self.assertEqual(charts.format_labels([moment], with_time=True), ['03/09 14:05'])
+        self.assertEqual(charts.format_labels([]), [])
+
+
+@mock.patch.object(price_history, 'revalidate')
+class ChartSeriesTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        PricePoint.objects.bulk_create([
+            PricePoint(coin_id='bitcoin', resolution='hour', timestamp=self.now - timedelta(hours=hours), price=100 + hours)
+            for hours in range(48)
+        ])
+
+    def minute_points(self, minutes):
+        PricePoint.objects.bulk_create([
+            PricePoint(coin_id='bitcoin', resolution='minute', timestamp=self.now - timedelta(minutes=minute), price=1)
+            for minute in minutes
+        ])
+
+    def test_short_range_without_minute_history_uses_hourly_points(self, revalidate):
+        payload = charts.build_chart_payload('bitcoin', days=1)
+        self.assertEqual(len(payload['prices']), 24)
+
+    def test_partial_minute_history_gives_way_to_hourly_points(self, revalidate):
+        self.minute_points(range(30))
+        self.assertEqual(len(charts.build_chart_payload('bitcoin', days=1)['prices']), 24)
+
+    def test_minute_history_covering_the_range_is_used(self, revalidate):
+        self.minute_points(range(0, 24 * 60, 5))
+        payload = charts.build_chart_payload('bitcoin', days=1)
+        self.assertEqual(len(payload['prices']), charts.DEFAULT_POINT_BUDGET)
+        self.assertEqual(payload['prices'][-1], 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PerformanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('investor', password='x')
+        self.start = datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+    def snapshot(self, day, value, invested):
+        """Append a snapshot for self.user dated day days after self.start"""
+        snapshot = build_snapshot(self.user.pk, round(value * 100), round(invested * 100))
+        append_snapshots([snapshot])
+        PortfolioSnapshot.objects.filter(pk=snapshot.pk).update(created_at=self.start + timedelta(days=day))
+        return snapshot
+
+    def history(self, days):
+        """Daily snapshots with a random walk in value and occasional deposits and withdrawals"""
+        rng = random.Random(11)
+        value = invested = 1000.0
+        rows = []
+        for day in range(days):
+            if day and rng.random() < 0.2:
+                flow = rng.choice([-200.0, 300.0])
+                value += flow
+                invested += flow
+            rows.append((day, value, invested))
+            self.snapshot(day, value, invested)
+            value *= 1 + rng.gauss(0.002, 0.03)
+        return rows
+
+    def expected(self, rows, days):
+        """Metrics for the last days of rows computed directly from the snapshot values"""
+        last_day = rows[-1][0]
+        window = [row for row in rows if days is None or row[0] >= last_day - days]
+        returns = []
+        for (_, previous_value, previous_invested), (_, value, invested) in zip(window, window[1:]):
+            value, invested = round(value, 2), round(invested, 2)
+            previous_value, previous_invested = round(previous_value, 2), round(previous_invested, 2)
+            returns.append((value - (invested - previous_invested)) / previous_value - 1)
+        growth = np.cumprod([1.0] + [1 + r for r in returns])
+        periods_per_year = performance.SECONDS_PER_YEAR / ((window[-1][0] - window[0][0]) * 86400 / len(returns))
+        volatility = math.sqrt(np.var(returns, ddof=1) * periods_per_year)
+        return {
+            'periods': len(returns),
+            'twr': round((growth[-1] - 1) * 100, 2),
+            'volatility': round(volatility * 100, 2),
+            'sharpe': round((np.mean(returns) * periods_per_year - settings.RISK_FREE_RATE) / volatility, 2),
+            'max_drawdown': round(min(0.0, float((growth / np.maximum.accumulate(growth) - 1).min())) * 100, 2),
+        }
+
+    def test_no_snapshots(self):
+        self.assertIsNone(performance.get_performance(self.user))
+
+    def test_period_return_nets_out_deposits(self):
+        self.snapshot(0, 1000, 1000)
+        self.snapshot(1, 1600, 1500)
+        latest = PortfolioSnapshot.objects.latest('created_at')
+        self.assertAlmostEqual(latest.period_return, 0.1)
+        self.assertAlmostEqual(latest.growth_index, 1.1)
+        self.assertEqual(latest.return_count, 1)
+
+    def test_period_from_an_empty_portfolio_has_no_return(self):
+        self.snapshot(0, 0, 0)
+        self.snapshot(1, 500, 500)
+        latest = PortfolioSnapshot.objects.latest('created_at')
+        self.assertIsNone(latest.period_return)
+        self.assertEqual(latest.return_count, 0)
+        self.assertEqual(latest.growth_index, 1.0)
+
+    def test_metrics_match_a_direct_computation(self):
+        rows = self.history(120)
+        for range_key, days in performance.PERFORMANCE_RANGES.items():
+            with self.subTest(range=range_key):
+                metrics = performance.get_performance(self.user, range_key)
+                expected = self.expected(rows, days)
+                self.assertEqual(metrics['periods'], expected['periods'])
+                for name in ('twr', 'volatility', 'sharpe', 'max_drawdown'):
+                    self.assertAlmostEqual(metrics[name], expected[name], delta=0.011, msg=name)
+                self.assertEqual(len(metrics['values']), expected['periods'] + 1)
+
+    def test_a_new_snapshot_is_picked_up(self):
+        self.snapshot(0, 1000, 1000)
+        self.snapshot(1, 1100, 1000)
+        self.assertEqual(performance.get_performance(self.user, 'all')['twr'], 10.0)
+        self.snapshot(2, 1210, 1000)
+        self.assertEqual(performance.get_performance(self.user, 'all')['twr'], 21.0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SnapshotJobTests(TestCase):
+    prices = {'bitcoin': {'usd': 100.0}, 'ethereum': {'usd': 10.0}, 'delisted': {}}
+
+    def holding(self, user, coin_id, quantity, purchase_price):
+        PortfolioAsset.objects.create(
+            user=user, coin_id=coin_id, coin_name=coin_id.title(), coin_symbol=coin_id[:3],
+            quantity=Decimal(quantity), purchase_price=Decimal(purchase_price)
+        )
+
+    def run_job(self):
+        with mock.patch.object(portfolio_snapshots, 'get_coin_prices', return_value=self.prices):
+            return portfolio_snapshots.snapshot_all_portfolios()
+
+    def test_values_every_portfolio(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        self.holding(alice, 'bitcoin', '2', '50')
+        self.holding(alice, 'ethereum', '3', '20')
+        self.holding(bob, 'ethereum', '1', '5')
+
+        self.assertEqual(self.run_job(), 2)
+        totals = dict(PortfolioSnapshot.objects.values_list('user__username', 'total_value'))
+        self.assertEqual(totals, {'alice': Decimal('230.00'), 'bob': Decimal('10.00')})
+
+    def test_query_count_does_not_grow_with_users(self):
+        def queries_for(users):
+            PortfolioSnapshot.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.run_job(), users)
+            return len(queries)
+
+        for n in range(3):
+            self.holding(User.objects.create(username=f'user{n}'), 'bitcoin', '1', '50')
+        few = queries_for(3)
+        for n in range(3, 30):
+            self.holding(User.objects.create(username=f'user{n}'), 'ethereum', '1', '5')
+        with mock.patch.object(portfolio_snapshots, 'HOLDINGS_CHUNK_SIZE', 1000), \
+                mock.patch.object(portfolio_snapshots, 'SNAPSHOT_BATCH_SIZE', 1000):
+            self.assertEqual(queries_for(30), few)
+
+    def test_prices_are_requested_once_for_every_held_coin(self):
+        for n, coin_id in enumerate(['bitcoin', 'ethereum', 'bitcoin']):
+            self.holding(User.objects.create(username=f'user{n}'), coin_id, '1', '1')
+        with mock.patch.object(portfolio_snapshots, 'get_coin_prices', return_value=self.prices) as get_prices:
+            portfolio_snapshots.snapshot_all_portfolios()
+        get_prices.assert_called_once()
+        self.assertEqual(sorted(get_prices.call_args.args[0]), ['bitcoin', 'ethereum'])
+
+    def test_later_runs_extend_each_history(self):
+        alice = User.objects.create_user('alice', password='x')
+        self.holding(alice, 'bitcoin', '1', '50')
+        self.run_job()
+        self.prices = {'bitcoin': {'usd': 110.0}}
+        self.run_job()
+        self.assertEqual(list(PortfolioSnapshot.objects.order_by('pk').values_list('return_count', flat=True)), [0, 1])
+
+    def test_missing_quote_writes_no_snapshot(self):
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        self.holding(alice, 'bitcoin', '1', '50')
+        self.holding(bob, 'bitcoin', '1', '50')
+        self.holding(bob, 'delisted', '100', '1')
+        self.holding(bob, 'ethereum', '1', '5')
+
+        # Small chunks so bob's holdings straddle two of them
+        with mock.patch.object(portfolio_snapshots, 'HOLDINGS_CHUNK_SIZE', 2):
+            with self.assertLogs('zelcry.core.portfolio_snapshots', 'WARNING') as logs:
+                self.assertEqual(self.run_job(), 1)
+        self.assertEqual(list(PortfolioSnapshot.objects.values_list('user__username', flat=True)), ['alice'])
+        self.assertIn('skipped 1 users', logs.output[0])
+
+    def test_no_prices_writes_nothing(self):
+        alice = User.objects.create_user('alice', password='x')
+        self.holding(alice, 'bitcoin', '1', '50')
+        self.prices = {}
+        with self.assertLogs('zelcry.core.portfolio_snapshots', 'WARNING'):
+            self.assertEqual(self.run_job(), 0)
+        self.assertFalse(PortfolioSnapshot.objects.exists())
+
+
+class SnapshotAppendTests(TransactionTestCase):
+    # Needs a database that takes connections from two threads (not the
+    # in-memory SQLite test database)
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_appends_extend_one_after_the_other(self):
+        user = User.objects.create_user('racer', password='x')
+        append_snapshots([build_snapshot(user.pk, 100000, 100000)])
+        extend = performance.extend
+
+        def slow_extend(snapshot, previous):
+            # Widen the window between reading the previous snapshot and writing
+            time.sleep(0.2)
+            return extend(snapshot, previous)
+
+        def append(value_cents):
+            append_snapshots([build_snapshot(user.pk, value_cents, 100000)])
+            connection.close()
+
+        with mock.patch.object(portfolio_snapshots, 'extend', slow_extend):
+            threads = [threading.Thread(target=append, args=(cents,)) for cents in (110000, 121000)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        counts = sorted(PortfolioSnapshot.objects.values_list('return_count', flat=True))
+        self.assertEqual(counts, [0, 1, 2])
+
+
+class AsyncCryptoDetailsTests(TestCase):
+    async def test_unknown_coin_is_404_without_upstream_calls(self):
+        user = await User.objects.acreate(username='viewer')
+        request = AsyncRequestFactory().get('/crypto/not-a-coin/')
+        request.user = user
+
+        async def auser():
+            return user
+        request.auser = auser
+
+        with mock.patch.object(async_views, 'aget_coin_prices') as prices, \
+                mock.patch.object(async_views, '_chart_payload') as chart:
+            with self.assertRaises(Http404):
+                await async_views.crypto_details(request, 'not-a-coin')
+        prices.assert_not_called()
+        chart.assert_not_called()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'zelcry-tests-small', 'OPTIONS': {'MAX_ENTRIES': 10}},
+    'state': TEST_CACHES['state'],
+})
+class StateCacheTests(SimpleTestCase):
+    def fill_default_cache(self):
+        for i in range(100):
+            cache.set(f'chat_summary_guest_{i}', {'points': []})
+
+    def test_state_survives_a_full_default_cache(self):
+        impact_index.invalidate()
+        alerts.mark_index_dirty()
+        version = impact_index.current_version()
+        self.fill_default_cache()
+        self.assertEqual(impact_index.current_version(), version)
+        self.assertTrue(state_cache.get(alerts.INDEX_DIRTY_KEY))
+
+    def test_first_market_page_survives_a_full_default_cache(self):
+        coins = [{'id': 'bitcoin', 'name': 'Bitcoin'}]
+        with mock.patch.object(market_data, 'fetch_market_data', return_value=coins):
+            market_data.refresh_market_data()
+        self.fill_default_cache()
+        self.assertEqual(market_data.get_market_snapshot()['coins'], coins)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CoinSearchTests(TestCase):
+    def setUp(self):
+        coins = [('bitcoin', 'btc', 'Bitcoin'), ('ethereum', 'eth', 'Ethereum'), ('tether', 'usdt', 'Tether')]
+        coins += [(f'coin-{n}', f'c{n}', f'Coin {n}') for n in range(1, 101)]
+        CoinListing.objects.bulk_create([
+            CoinListing(coin_id=coin_id, symbol=symbol, name=name, market_cap_rank=rank)
+            for rank, (coin_id, symbol, name) in enumerate(coins, start=1)
+        ])
+        coin_catalog._index.update(version=None)
+
+    def ids(self, query, limit=500):
+        return [coin['id'] for coin in coin_catalog.search(query, limit)]
+
+    def test_exact_symbol_and_name(self):
+        self.assertEqual(self.ids('btc', 10)[0], 'bitcoin')
+        self.assertEqual(self.ids('Ethereum', 10)[0], 'ethereum')
+
+    def test_prefix_matches_by_rank(self):
+        self.assertEqual(self.ids('bit'), ['bitcoin'])
+        self.assertEqual(self.ids('coin 1', 3), ['coin-1', 'coin-10', 'coin-11'])
+
+    def test_typo_finds_the_coin(self):
+        self.assertEqual(self.ids('etherium'), ['ethereum'])
+        self.assertEqual(self.ids('bitcoim')[0], 'bitcoin')
+
+    def test_unrelated_query_matches_nothing(self):
+        self.assertEqual(self.ids('zebra'), [])
+        self.assertEqual(self.ids('zebra coin'), [])
+
+    def test_every_word_of_a_fuzzy_query_must_match(self):
+        # 'coin' alone is in every "Coin N"; the fuzzy pass must not add
+        # them all on top of the names starting with "coin 1"
+        expected = ['coin-1', *(f'coin-{n}' for n in range(10, 20)), 'coin-100']
+        self.assertEqual(sorted(self.ids('coin 1')), sorted(expected))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardContextTests(TestCase):
+    def test_impact_scores_come_from_one_index_read(self):
+        user = User.objects.create_user('holder', password='x')
+        coins = ['bitcoin', 'ethereum', 'solana', 'cardano', 'unscored']
+        for coin_id in coins[:4]:
+            CryptoAssetDetails.objects.create(coin_id=coin_id, name=coin_id.title(), symbol=coin_id[:3].upper())
+        assets = [
+            PortfolioAsset.objects.create(
+                user=user, coin_id=coin_id, coin_name=coin_id.title(), coin_symbol=coin_id[:3],
+                quantity=Decimal('1'), purchase_price=Decimal('1')
+            )
+            for coin_id in coins
+        ]
+        market = {'coins': [], 'as_of': None}
+
+        with mock.patch.object(impact_index, 'current_version', wraps=impact_index.current_version) as version:
+            context = views.build_dashboard_context(user, market, assets, {}, '{}')
+        self.assertLessEqual(version.call_count, 2)
+        scores = {asset.coin_id: asset.impact_score for asset in context['portfolio_assets']}
+        self.assertIsNone(scores['unscored'])
+        self.assertEqual(scores['bitcoin'], impact_index.get_details('bitcoin').get_impact_score)
+
+
+def _news_item(n, published_on, title='Market update'):
+    return {
+        'id': n, 'title': f'{title} {n}', 'body': '', 'url': f'https://news.test/{n}', 'source': 'Test',
+        'image_url': '', 'published_on': published_on, 'categories': ['Trading'], 'tags': [],
+    }
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NewsStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Pairs of articles share a timestamp, so paging has ties to break
+        crypto_news._store([
+            _news_item(n, 1_700_000_000 + n // 2, 'Bitcoin rally' if n % 3 == 0 else 'Market update')
+            for n in range(1, 26)
+        ])
+
+    def walk(self, per_page, **filters):
+        ids, before = [], None
+        while True:
+            items, has_newer, has_older = crypto_news.get_news_page(before=before, per_page=per_page, **filters)
+            self.assertEqual(has_newer, before is not None)
+            ids += [item['id'] for item in items]
+            if not has_older:
+                return ids
+            before = crypto_news.parse_news_cursor(crypto_news.news_cursor(items[-1]))
+
+    def test_older_pages_cover_the_archive_once_in_order(self):
+        expected = list(NewsArticle.objects.values_list('article_id', flat=True))
+        self.assertEqual(self.walk(4), expected)
+        self.assertEqual(self.walk(4, category='trading'), expected)
+        self.assertEqual(self.walk(3, query='bitcoin'), [a for a in expected if int(a) % 3 == 0])
+
+    def test_newer_page_returns_the_previous_one(self):
+        first, _, _ = crypto_news.get_news_page(per_page=5)
+        second, _, _ = crypto_news.get_news_page(before=crypto_news.parse_news_cursor(crypto_news.news_cursor(first[-1])), per_page=5)
+        third, _, _ = crypto_news.get_news_page(before=crypto_news.parse_news_cursor(crypto_news.news_cursor(second[-1])), per_page=5)
+
+        back, has_newer, has_older = crypto_news.get_news_page(
+            after=crypto_news.parse_news_cursor(crypto_news.news_cursor(third[0])), per_page=5
+        )
+        self.assertEqual([item['id'] for item in back], [item['id'] for item in second])
+        self.assertEqual((has_newer, has_older), (True, True))
+        # Stepping back into the newest articles shows the full first page
+        top, has_newer, _ = crypto_news.get_news_page(
+            after=crypto_news.parse_news_cursor(crypto_news.news_cursor(first[2])), per_page=5
+        )
+        self.assertEqual([item['id'] for item in top], [item['id'] for item in first])
+        self.assertFalse(has_newer)
+
+    def test_malformed_cursor_is_ignored(self):
+        for value in (None, '', 'abc', '123', 'x-1', '99999999999999999999-1'):
+            self.assertIsNone(crypto_news.parse_news_cursor(value))
+
+    def test_storing_articles_already_stored_is_a_no_op(self):
+        terms = NewsTerm.objects.count()
+        crypto_news._store([_news_item(1, 1_700_000_000), _news_item(30, 1_700_000_100)])
+        self.assertEqual(NewsArticle.objects.count(), 26)
+        self.assertEqual(NewsTerm.objects.filter(article_id='1').count(), 2)
+        self.assertEqual(NewsTerm.objects.count(), terms + 3)
+
+    def test_ingestion_skips_while_another_one_runs(self):
+        with mock.patch.object(crypto_news, 'fetch_crypto_news') as fetch:
+            with flight_lock(crypto_news.NEWS_INGEST_LOCK):
+                self.assertEqual(crypto_news.ingest_news(), 0)
+            fetch.assert_not_called()
+
+
+def _simple_price_response(url, params, timeout):
+    return {coin_id: {'usd': 1.0, 'last_updated_at': 1_700_000_000} for coin_id in params['ids'].split(',')}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CoinPriceServiceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(market_data.http_client, 'get_json', side_effect=_simple_price_response)
+        self.get_json = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def requested_ids(self):
+        return [call.kwargs['params']['ids'].split(',') for call in self.get_json.call_args_list]
+
+    def test_missing_coins_are_fetched_in_one_call(self):
+        prices = market_data.get_coin_prices(['bitcoin', 'ethereum', 'bitcoin', '', 'solana'])
+        self.assertEqual(list(prices), ['bitcoin', 'ethereum', 'solana'])
+        self.assertEqual([sorted(ids) for ids in self.requested_ids()], [['bitcoin', 'ethereum', 'solana']])
+
+    def test_cached_coins_are_not_fetched_again(self):
+        market_data.get_coin_prices(['bitcoin', 'ethereum'])
+        prices = market_data.get_coin_prices(['ethereum', 'bitcoin', 'cardano'])
+        self.assertEqual(prices['ethereum']['usd'], 1.0)
+        self.assertEqual(self.requested_ids()[1], ['cardano'])
+
+    def test_large_requests_are_split_into_batches(self):
+        coin_ids = [f'coin-{n}' for n in range(market_data.PRICE_BATCH_SIZE + 1)]
+        market_data.get_coin_prices(coin_ids)
+        self.assertEqual([len(ids) for ids in self.requested_ids()], [market_data.PRICE_BATCH_SIZE, 1])
+
+    def test_unknown_coin_resolves_to_empty_data(self):
+        self.get_json.side_effect = lambda url, params, timeout: {}
+        self.assertEqual(market_data.get_coin_prices(['nope']), {'nope': {}})
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """JSON endpoint with ETags; /flaky answers 503 for its first failures requests"""
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/flaky') and type(self).failures > 0:
+            type(self).failures -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'{"path": "%s"}' % self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HTTPClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), UpstreamHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def host_stats(self):
+        return http_client.get_stats()['hosts'].get('127.0.0.1', {'requests': 0, 'connections': 0})
+
+    def test_sequential_requests_reuse_one_connection(self):
+        before = self.host_stats()
+        for n in range(3):
+            self.assertEqual(http_client.get_json(f'{self.base}/reuse/{n}'), {'path': f'/reuse/{n}'})
+        after = self.host_stats()
+        self.assertEqual(after['requests'] - before['requests'], 3)
+        self.assertLessEqual(after['connections'] - before['connections'], 1)
+
+    def test_not_modified_returns_the_stored_body(self):
+        url = f'{self.base}/conditional'
+        first = http_client.get_json(url, params={'page': 1}, conditional=True)
+        not_modified = http_client.get_stats()['not_modified']
+        self.assertEqual(http_client.get_json(url, params={'page': 1}, conditional=True), first)
+        self.assertEqual(http_client.get_stats()['not_modified'], not_modified + 1)
+
+    def test_unavailable_upstream_is_retried(self):
+        UpstreamHandler.failures = 2
+        self.assertEqual(http_client.get_json(f'{self.base}/flaky/sync'), {'path': '/flaky/sync'})
+        UpstreamHandler.failures = 2
+        self.assertEqual(asyncio.run(http_client.aget_json(f'{self.base}/flaky/async')), {'path': '/flaky/async'})
+
+    def test_persistent_failure_returns_none(self):
+        UpstreamHandler.failures = http_client.MAX_RETRIES + 1
+        with self.assertLogs(http_client.logger, 'ERROR'):
+            self.assertIsNone(http_client.get_json(f'{self.base}/flaky/down'))
+        UpstreamHandler.failures = 0
+
+
+MARKET_PAGE = [
+    {'id': 'bitcoin', 'name': 'Bitcoin', 'current_price': 50000.0, 'price_change_percentage_24h': 1.5},
+    {'id': 'ethereum', 'name': 'Ethereum', 'current_price': 3000.0, 'price_change_percentage_24h': -2.0},
+]
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MarketIngestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        state_cache.clear()
+        fetch = mock.patch.object(market_data, 'fetch_market_data', return_value=MARKET_PAGE)
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+        revalidate = mock.patch('zelcry.core.cache_utils.revalidate')
+        self.revalidate = revalidate.start()
+        self.addCleanup(revalidate.stop)
+
+    def store(self, age):
+        entry = make_entry(MARKET_PAGE)
+        entry['fetched_at'] -= age
+        state_cache.set(market_data._market_cache_key(market_data.MARKET_PAGE_SIZE), entry)
+
+    def test_cold_first_page_never_waits_on_upstream(self):
+        snapshot = market_data.get_market_snapshot()
+        self.assertEqual(snapshot, {'coins': [], 'as_of': None})
+        self.fetch.assert_not_called()
+        self.revalidate.assert_called_once()
+
+    def test_stale_page_is_served_while_it_refreshes(self):
+        self.store(age=market_data.MARKET_FRESH_SECONDS + 1)
+        self.assertEqual(market_data.get_market_snapshot()['coins'], MARKET_PAGE)
+        self.fetch.assert_not_called()
+        self.revalidate.assert_called_once()
+
+    def test_fresh_page_is_served_as_is(self):
+        self.store(age=0)
+        snapshot = market_data.get_market_snapshot()
+        self.assertEqual(snapshot['coins'], MARKET_PAGE)
+        self.assertIsNotNone(snapshot['as_of'])
+        self.revalidate.assert_not_called()
+
+    def test_job_stores_the_page_and_a_price_tick(self):
+        scheduler.refresh_market_data_job()
+        self.assertEqual(market_data.get_market_snapshot()['coins'], MARKET_PAGE)
+        self.assertEqual(
+            dict(PricePoint.objects.filter(resolution='minute').values_list('coin_id', 'price')),
+            {'bitcoin': 50000.0, 'ethereum': 3000.0}
+        )
+
+    def test_job_fails_loudly_without_data(self):
+        self.fetch.return_value = None
+        with self.assertRaises(RuntimeError):
+            scheduler.refresh_market_data_job()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SingleFlightTests(SimpleTestCase):
+    KEY = 'single_flight_test'
+
+    def setUp(self):
+        cache.clear()
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        overrides = override_settings(CACHE_LOCK_DIR=lock_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.calls = 0
+
+    def refresh(self, delay=0.0):
+        self.calls += 1
+        time.sleep(delay)
+        cache_utils.set_entry(self.KEY, self.calls)
+
+    def wait_for_revalidation(self):
+        deadline = time.monotonic() + 5
+        while self.KEY in cache_utils._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_concurrent_misses_compute_once(self):
+        entries = []
+        threads = [
+            threading.Thread(target=lambda: entries.append(
+                cache_utils.get_stale_while_revalidate(self.KEY, lambda: self.refresh(0.1), 60, block_on_miss=True)
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([entry['data'] for entry in entries], [1] * 5)
+
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        stale = make_entry(0)
+        stale['fetched_at'] -= 120
+        cache.set(self.KEY, stale)
+        for _ in range(3):
+            entry = cache_utils.get_stale_while_revalidate(self.KEY, lambda: self.refresh(0.1), 60)
+            self.assertEqual(entry['data'], 0)
+        self.wait_for_revalidation()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get(self.KEY)['data'], 1)
+
+    def test_revalidation_is_skipped_while_another_worker_holds_the_lock(self):
+        skipped = cache_utils.get_stats()['revalidations_skipped']
+        with flight_lock(self.KEY):
+            cache_utils.revalidate(self.KEY, self.refresh)
+            self.wait_for_revalidation()
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(cache_utils.get_stats()['revalidations_skipped'], skipped + 1)
+
+
+class LeaderElectionTests(SimpleTestCase):
+    def setUp(self):
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        overrides = override_settings(SCHEDULER_LOCK_FILE=os.path.join(lock_dir, 'scheduler.lock'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(self.resign)
+
+    def resign(self):
+        if scheduler._leader_fd not in (None, -1):
+            os.close(scheduler._leader_fd)
+        scheduler._leader_fd = None
+
+    @skipUnless(scheduler.fcntl, 'leader election needs flock')
+    def test_only_one_process_leads(self):
+        # Another worker's lock: flock conflicts across open file descriptions
+        other = os.open(settings.SCHEDULER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        scheduler.fcntl.flock(other, scheduler.fcntl.LOCK_EX | scheduler.fcntl.LOCK_NB)
+        self.assertFalse(scheduler.acquire_leadership())
+
+        os.close(other)
+        self.assertTrue(scheduler.acquire_leadership())
+        self.assertTrue(scheduler.acquire_leadership())
+        with open(settings.SCHEDULER_LOCK_FILE) as lock_file:
+            self.assertEqual(lock_file.read(), str(os.getpid()))
+
+    def test_only_web_servers_start_the_scheduler(self):
+        cases = [
+            (['gunicorn', 'zelcry.wsgi'], {scheduler.WEB_SERVER_ENV: '1'}, True),
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver', '--noreload'], {}, True),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'migrate'], {}, False),
+            (['manage.py', 'test'], {}, False),
+            (['python', 'script.py'], {}, False),
+        ]
+        for argv, env, expected in cases:
+            environ = {k: v for k, v in os.environ.items() if k not in (scheduler.WEB_SERVER_ENV, 'RUN_MAIN')}
+            with self.subTest(argv=argv, env=env), mock.patch.object(sys, 'argv', argv), \
+                    mock.patch.dict(os.environ, {**environ, **env}, clear=True):
+                self.assertIs(scheduler.should_start_in_process(), expected)
+
+    @override_settings(SCHEDULER_MODE='worker')
+    def test_dedicated_worker_mode_never_starts_in_web_processes(self):
+        with mock.patch.dict(os.environ, {scheduler.WEB_SERVER_ENV: '1'}):
+            self.assertFalse(scheduler.should_start_in_process())
+
+
+class JobRunTests(TransactionTestCase):
+    def setUp(self):
+        workers = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(workers.shutdown)
+        patcher = mock.patch.object(scheduler, '_job_workers', workers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def job(self, func, timeout=5):
+        return {'id': 'test_job', 'name': 'Test Job', 'func': func, 'timeout': timeout}
+
+    def run_job(self, func, timeout=5):
+        scheduler.run_job(self.job(func, timeout))
+        return JobRun.objects.get(job_id='test_job')
+
+    def test_success_is_recorded(self):
+        run = self.run_job(lambda: None)
+        self.assertEqual((run.last_status, run.run_count, run.failure_count), ('success', 1, 0))
+        self.assertIsNotNone(run.last_finished_at)
+        self.assertIsNotNone(run.last_duration_ms)
+
+    def test_error_is_recorded(self):
+        def fail():
+            raise RuntimeError('upstream down')
+        with self.assertLogs(scheduler.logger, 'ERROR'):
+            run = self.run_job(fail)
+        self.assertEqual((run.last_status, run.last_error, run.failure_count), ('error', 'upstream down', 1))
+
+    def test_hung_job_times_out_and_is_not_started_twice(self):
+        started = []
+        def hang():
+            started.append(1)
+            self.release.wait(5)
+        with self.assertLogs(scheduler.logger, 'ERROR'):
+            run = self.run_job(hang, timeout=0.1)
+        self.assertEqual((run.last_status, run.last_error), ('timeout', 'Exceeded 0.1s'))
+
+        with self.assertLogs(scheduler.logger, 'WARNING'):
+            run = self.run_job(hang, timeout=0.1)
+        self.assertEqual((run.last_status, run.run_count), ('skipped', 1))
+        self.assertEqual(len(started), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PriceHistoryTests(TestCase):
+    START = datetime(2026, 1, 5, 10, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+
+    def points(self, resolution):
+        return list(
+            PricePoint.objects.filter(resolution=resolution).order_by('coin_id', 'timestamp')
+            .values_list('coin_id', 'timestamp', 'price')
+        )
+
+    def test_ticks_in_one_minute_keep_the_latest_price(self):
+        self.assertEqual(price_history.record_ticks({'bitcoin': 100, 'ethereum': None}, at=self.START), 1)
+        price_history.record_ticks({'bitcoin': 101}, at=self.START + timedelta(seconds=30))
+        self.assertEqual(self.points('minute'), [('bitcoin', self.START, 101)])
+
+    def test_rollup_averages_minutes_into_hours_and_days(self):
+        for minute, price in enumerate([100, 110, 120]):
+            price_history.record_ticks({'bitcoin': price}, at=self.START + timedelta(minutes=minute))
+        price_history.record_ticks({'bitcoin': 200}, at=self.START + timedelta(hours=1))
+
+        price_history.rollup(since=self.START)
+        price_history.rollup(since=self.START)
+        self.assertEqual(self.points('hour'), [
+            ('bitcoin', self.START, 110),
+            ('bitcoin', self.START + timedelta(hours=1), 200),
+        ])
+        self.assertEqual(self.points('day'), [('bitcoin', self.START.replace(hour=0), 155)])
+
+    def test_retention_drops_old_minutes_but_keeps_days(self):
+        old = timezone.now() - timedelta(days=100)
+        price_history.record_ticks({'bitcoin': 1}, at=old)
+        price_history.record_ticks({'bitcoin': 2})
+        PricePoint.objects.create(coin_id='bitcoin', resolution='day', timestamp=old, price=1)
+
+        self.assertEqual(price_history.apply_retention(), 1)
+        self.assertEqual([price for _, _, price in self.points('minute')], [2])
+        self.assertEqual(len(self.points('day')), 1)
+
+    def test_backfill_calls_upstream_once_per_interval(self):
+        hour_ms = 60 * 60 * 1000
+        start_ms = int(self.START.timestamp() * 1000)
+        chart = {'prices': [[start_ms, 100], [start_ms + 60_000, 102], [start_ms + hour_ms, 300]]}
+        with mock.patch.object(price_history.http_client, 'get_json', return_value=chart) as get_json:
+            self.assertEqual(price_history.backfill('bitcoin'), 2)
+            self.assertEqual(price_history.backfill('bitcoin'), 0)
+        get_json.assert_called_once()
+        # The last price of each hour is kept, then averaged into the day
+        self.assertEqual(self.points('hour'), [
+            ('bitcoin', self.START, 102),
+            ('bitcoin', self.START + timedelta(hours=1), 300),
+        ])
+        self.assertEqual(self.points('day'), [('bitcoin', self.START.replace(hour=0), 201)])
+
+
+@override_settings(CACHES=TEST_CACHES, GROQ_API_KEY='test-key', LLM_MAX_CONCURRENCY=1, LLM_MAX_QUEUE=1, LLM_QUEUE_TIMEOUT=0.2)
+class LLMAdmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir, ignore_errors=True)
+        overrides = override_settings(CACHE_LOCK_DIR=lock_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def hold_slot(self):
+        """Occupy the only slot from another thread until the returned event is set"""
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with llm_dispatch.llm_slot():
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait(5)
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        return release
+
+    def test_waiting_caller_gets_the_slot_when_it_frees(self):
+        release = self.hold_slot()
+        threading.Timer(0.05, release.set).start()
+        with llm_dispatch.llm_slot():
+            pass
+
+    def test_caller_gives_up_after_the_queue_timeout(self):
+        self.hold_slot()
+        started = time.monotonic()
+        with self.assertRaises(llm_dispatch.LLMBusyError):
+            with llm_dispatch.llm_slot():
+                pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_full_queue_is_rejected_at_once(self):
+        with flight_lock(llm_dispatch.TICKET_KEY.format(0)), flight_lock(llm_dispatch.TICKET_KEY.format(1)):
+            rejected = llm_dispatch.get_stats()['rejected_queue_full']
+            with self.assertRaises(llm_dispatch.LLMBusyError):
+                with llm_dispatch.llm_slot():
+                    pass
+        self.assertEqual(llm_dispatch.get_stats()['rejected_queue_full'], rejected + 1)
+
+    def test_busy_chat_answers_503_with_retry_after(self):
+        busy = llm_dispatch.LLMBusyError("Zelcry AI is busy right now")
+        with mock.patch.object(views, 'get_zelcry_ai_response', side_effect=busy):
+            response = self.client.post('/guest-chat/', {'message': 'hi'}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(llm_dispatch.RETRY_AFTER_SECONDS))
+        self.assertTrue(response.json()['busy'])
+
+    @override_settings(LLM_CALL_TIMEOUT=0.05)
+    def test_stream_is_cut_short_at_the_deadline(self):
+        def slow_stream(request, model):
+            for word in ['one', ' two', ' three']:
+                yield word
+                time.sleep(0.04)
+
+        with mock.patch.object(groq_ai, '_stream', slow_stream):
+            chunks = list(groq_ai.stream_zelcry_ai_response('count to three'))
+        self.assertEqual(chunks[-1], groq_ai.CUT_SHORT_MESSAGE)
+        self.assertLess(len(chunks), 4)
+        # A cut-short reply is never reused
+        self.assertIsNone(ai_cache.get_response(
+            ai_cache.response_key('count to three', '', groq_ai.llm_router.advisor_model('count to three'))
+        ))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ChatMemoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.now() - timedelta(days=1)
+        self.turns = 0
+
+    def chat(self, message, response='ok', session_id='guest-1'):
+        row = ChatMessage.objects.create(session_id=session_id, message=message, response=response)
+        # auto_now_add ignores a passed value; space the turns a minute apart
+        ChatMessage.objects.filter(pk=row.pk).update(created_at=self.start + timedelta(minutes=self.turns))
+        self.turns += 1
+
+    def history(self, session_id='guest-1'):
+        return chat_memory.load_history(session_id=session_id)
+
+    def questions(self, history):
+        return [turn['content'] for turn in history if turn['role'] == 'user']
+
+    def test_short_conversation_is_sent_whole(self):
+        self.chat('What is Bitcoin?', 'A coin.')
+        self.chat('And Ethereum?', 'Another coin.')
+        self.chat('Hello', session_id='someone-else')
+        history, summary = self.history()
+        self.assertEqual(history, [
+            {'role': 'user', 'content': 'What is Bitcoin?'},
+            {'role': 'assistant', 'content': 'A coin.'},
+            {'role': 'user', 'content': 'And Ethereum?'},
+            {'role': 'assistant', 'content': 'Another coin.'},
+        ])
+        self.assertEqual(summary, '')
+
+    def test_turns_over_the_token_budget_are_summarized(self):
+        # Two-thirds of the budget each, so only the newest turn fits
+        long_reply = 'x' * (chat_memory.HISTORY_TOKEN_BUDGET * 4 * 2 // 3)
+        self.chat('Tell me about staking. In detail please.', long_reply)
+        self.chat('What about Solana?', long_reply)
+        self.chat('And fees?', long_reply)
+        history, summary = self.history()
+        self.assertEqual(self.questions(history), ['And fees?'])
+        used = sum(chat_memory.estimate_tokens(turn['content']) for turn in history)
+        self.assertLessEqual(used, chat_memory.HISTORY_TOKEN_BUDGET)
+        self.assertEqual(summary, 'Earlier in this conversation the user asked about: Tell me about staking.; What about Solana?')
+
+    def test_old_turns_are_summarized_exactly_once(self):
+        for n in range(chat_memory.HISTORY_TURNS + 3):
+            self.chat(f'Question {n}?')
+        history, summary = self.history()
+        self.assertEqual(len(self.questions(history)), chat_memory.HISTORY_TURNS)
+        self.assertEqual(summary, 'Earlier in this conversation the user asked about: Question 0?; Question 1?; Question 2?')
+
+        self.assertEqual(self.history()[1], summary)
+        self.chat('Question 15?')
+        self.assertTrue(self.history()[1].endswith('Question 2?; Question 3?'))
+
+    def test_summary_stays_within_its_budget(self):
+        for n in range(60):
+            self.chat(f'Question {n} about a long topic that goes on and on for a while?')
+            self.history()
+        summary = self.history()[1]
+        self.assertLessEqual(chat_memory.estimate_tokens(summary), chat_memory.SUMMARY_TOKEN_BUDGET + 20)
+        self.assertIn('Question 47', summary)
+        self.assertNotIn('Question 0 ', summary)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AIContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('trader', password='x')
+        prices = {'bitcoin': {'usd': 50000.0}, 'ethereum': {'usd': 2000.0}}
+        patcher = mock.patch.object(
+            ai_context, 'get_coin_prices', side_effect=lambda coin_ids: {c: prices.get(c, {}) for c in coin_ids}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def buy(self, coin_id, quantity, price):
+        return PortfolioAsset.objects.create(
+            user=self.user, coin_id=coin_id, coin_name=coin_id.title(), coin_symbol=coin_id[:3],
+            quantity=Decimal(quantity), purchase_price=Decimal(price)
+        )
+
+    def test_context_summarizes_holdings_by_value(self):
+        self.buy('ethereum', '5', '1000')
+        self.buy('bitcoin', '0.1', '40000')
+        self.buy('bitcoin', '0.1', '60000')
+        self.assertEqual(ai_context.build_user_context(self.user), "\n".join([
+            "User: trader",
+            "Risk tolerance: Low",
+            "Portfolio: 2 coins worth $20,000, +33.3% vs cost",
+            "Top holdings: BIT 0.2 = $10,000 (50%); ETH 5 = $10,000 (50%)",
+            "Focus on sustainable crypto investing. Be concise and helpful.",
+        ]))
+
+    def test_holdings_are_read_once_until_they_change(self):
+        self.buy('bitcoin', '1', '40000')
+        ai_context.build_user_context(self.user)
+        with self.assertNumQueries(0):
+            ai_context.build_user_context(self.user)
+
+        asset = self.buy('ethereum', '1', '1000')
+        self.assertIn('2 coins', ai_context.build_user_context(self.user))
+        asset.delete()
+        self.assertIn('1 coins', ai_context.build_user_context(self.user))
+
+    def test_risk_tolerance_change_drops_the_cached_context(self):
+        ai_context.build_user_context(self.user)
+        profile = self.user.profile
+        profile.theme = 'dark'
+        profile.save(update_fields=['theme'])
+        with self.assertNumQueries(0):
+            ai_context.build_user_context(self.user)
+
+        profile.risk_tolerance = 'High'
+        profile.save()
+        self.assertIn('Risk tolerance: High', ai_context.build_user_context(self.user))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImpactScoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for coin_id, scores in [('alpha', (9, 9, 9)), ('bravo', (8, 7, 6)), ('charlie', (2, 3, 4)), ('delta', (9, 9, 6))]:
+            CryptoAssetDetails.objects.create(
+                coin_id=coin_id, name=coin_id.title(), symbol=coin_id[:3].upper(),
+                energy_score=scores[0], governance_score=scores[1], utility_score=scores[2]
+            )
+        catalog = mock.patch.object(views.coin_catalog, 'get_market_rows', return_value={})
+        catalog.start()
+        self.addCleanup(catalog.stop)
+        prices = mock.patch.object(views, 'get_coin_prices', side_effect=lambda coin_ids: {c: {'usd': 1.0} for c in coin_ids})
+        prices.start()
+        self.addCleanup(prices.stop)
+
+    def test_score_is_stored_on_every_save(self):
+        crypto = CryptoAssetDetails.objects.get(coin_id='bravo')
+        self.assertEqual(crypto.impact_score, 7.0)
+        crypto.energy_score = 2
+        crypto.save(update_fields=['energy_score'])
+        self.assertEqual(CryptoAssetDetails.objects.get(coin_id='bravo').impact_score, 5.0)
+
+    def test_coins_are_filtered_and_ordered_by_score_in_the_database(self):
+        coins, has_next = views.impact_ranked_coins(7, '', 1, 2)
+        self.assertEqual([(coin['id'], coin['impact_score']) for coin in coins], [('alpha', 9.0), ('delta', 8.0)])
+        self.assertTrue(has_next)
+
+        coins, has_next = views.impact_ranked_coins(7, '', 2, 2)
+        self.assertEqual([coin['id'] for coin in coins], ['bravo'])
+        self.assertFalse(has_next)
+        self.assertEqual([coin['id'] for coin in views.impact_ranked_coins(None, 'cha', 1, 10)[0]], ['charlie'])
+
+    def test_bad_filter_values_are_ignored(self):
+        factory = RequestFactory()
+        cases = [
+            ('', ('rank', None)),
+            ('?sort=impact&min_impact=7.5', ('impact', 7.5)),
+            ('?sort=bogus&min_impact=abc', ('rank', None)),
+            ('?min_impact=nan', ('rank', None)),
+            ('?min_impact=42', ('rank', 10.0)),
+            ('?min_impact=-1', ('rank', 0.0)),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(views.get_crypto_filters(factory.get(f'/cryptocurrencies/{query}')), expected)
+
+    def test_listing_filters_by_score(self):
+        response = self.client.get('/cryptocurrencies/?min_impact=8&sort=impact')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([coin['id'] for coin in response.context['coins']], ['alpha', 'delta'])
+
+
+class XPLedgerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('earner', password='x')
+
+    def balance(self):
+        return User.objects.get(pk=self.user.pk).profile.xp_points
+
+    def test_awards_are_logged_and_added_to_the_balance(self):
+        self.assertEqual(xp.award_xp(self.user, 'portfolio_add'), 25)
+        xp.award_xp(self.user, 'ai_chat')
+        self.assertEqual(self.balance(), 27)
+        self.assertEqual(
+            sorted(self.user.xp_events.values_list('reason', 'points')), [('ai_chat', 2), ('portfolio_add', 25)]
+        )
+
+    def test_award_ignores_a_stale_profile(self):
+        profile = self.user.profile
+        xp.award_xp(self.user, 'login')
+        xp.award_xp(self.user, 'login')
+        profile.theme = 'dark'
+        profile.save(update_fields=['theme'])
+        self.assertEqual(self.balance(), 10)
+
+    # Needs a database that takes connections from several threads (not
+    # the in-memory SQLite test database)
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_awards_are_all_counted(self):
+        def award():
+            xp.award_xp(self.user, 'watchlist_add')
+            connection.close()
+
+        threads = [threading.Thread(target=award) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.balance(), 40)
+        self.assertEqual(self.user.xp_events.count(), 8)
+
+
+class ValuationTests(SimpleTestCase):
+    PRICES = {
+        'bitcoin': {'usd': 0.1, 'usd_24h_change': 2.5},
+        'ethereum': {'usd': 0.2, 'usd_24h_change': -1.0},
+    }
+
+    def test_totals_are_exact_sums_of_the_displayed_cents(self):
+        result = valuation.value_holdings(
+            ['bitcoin', 'ethereum', 'bitcoin'], [Decimal('1'), Decimal('1'), Decimal('0.04')],
+            [Decimal('0.05'), Decimal('0.1'), Decimal('0.1')], self.PRICES
+        )
+        self.assertEqual(result['value_cents'].tolist(), [10, 20, 0])
+        self.assertEqual(result['total_value_cents'], 30)
+        self.assertEqual(valuation.cents_to_decimal(result['total_value_cents']), Decimal('0.30'))
+        self.assertEqual(result['total_invested_cents'], 15)
+        self.assertEqual(result['total_roi'], 100.0)
+        self.assertEqual(result['change_24h'].tolist(), [2.5, -1.0, 2.5])
+
+    def test_unpriced_and_zero_value_positions_do_not_divide_by_zero(self):
+        result = valuation.value_holdings(['unknown'], [Decimal('3')], [Decimal('0')], self.PRICES)
+        self.assertEqual(result['value_cents'].tolist(), [0])
+        self.assertEqual(result['roi'].tolist(), [0.0])
+        self.assertEqual(result['allocation'].tolist(), [0.0])
+        self.assertEqual(result['total_roi'], 0.0)
+
+    def test_empty_portfolio(self):
+        result = valuation.value_holdings([], [], [], self.PRICES)
+        self.assertEqual((result['total_value_cents'], result['total_roi']), (0, 0.0))
+        self.assertEqual(len(result['allocation']), 0)
+
+    def test_portfolio_rows_get_their_valuation(self):
+        assets = [
+            SimpleNamespace(coin_id='bitcoin', quantity=Decimal('30'), purchase_price=Decimal('0.2')),
+            SimpleNamespace(coin_id='ethereum', quantity=Decimal('10'), purchase_price=Decimal('0.1')),
+        ]
+        totals = valuation.value_portfolio(assets, self.PRICES)
+        self.assertEqual(
+            (totals['total_value'], totals['total_invested'], totals['profit_loss'], totals['roi_percentage']),
+            (5.0, 7.0, -2.0, -28.57)
+        )
+        self.assertEqual(
+            [(a.current_price, a.total_value, a.profit_loss, a.roi, a.allocation) for a in assets],
+            [(0.1, 3.0, -3.0, -50.0, 60.0), (0.2, 2.0, 1.0, 100.0, 40.0)]
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardFragmentTests(TestCase):
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.user = User.objects.create_user('viewer', password='x')
+        self.client.force_login(self.user)
+        CryptoAssetDetails.objects.create(
+            coin_id='greencoin', name='Greencoin', symbol='GRN', energy_score=9, governance_score=9, utility_score=9
+        )
+        self.market = {'coins': [dict(coin, symbol=coin['id'][:3], image='') for coin in MARKET_PAGE], 'as_of': timezone.now()}
+        for target, name, kwargs in [
+            (views, 'get_market_snapshot', {'side_effect': lambda per_page: self.market}),
+            (views, 'get_chart_payload', {'return_value': '{}'}),
+            (views, 'top_gainers', {'wraps': views.top_gainers}),
+            (impact_index, 'most_sustainable', {'wraps': impact_index.most_sustainable}),
+        ]:
+            patcher = mock.patch.object(target, name, **kwargs)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def get(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_shared_sections_are_built_once_per_data_version(self):
+        page = self.get()
+        self.assertIn('Greencoin', page)
+        self.assertIn('Bitcoin', page)
+        self.assertEqual((self.top_gainers.call_count, self.most_sustainable.call_count), (1, 1))
+
+        self.assertEqual(self.get(), page)
+        self.assertEqual((self.top_gainers.call_count, self.most_sustainable.call_count), (1, 1))
+
+    def test_new_market_tick_or_score_rebuilds_its_section(self):
+        self.get()
+        self.market = dict(self.market, as_of=self.market['as_of'] + timedelta(minutes=1))
+        self.get()
+        self.assertEqual((self.top_gainers.call_count, self.most_sustainable.call_count), (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CryptoAssetDetails.objects.create(
+                coin_id='leafcoin', name='Leafcoin', symbol='LEF', energy_score=10, governance_score=10, utility_score=10
+            )
+        self.assertIn('Leafcoin', self.get())
+        self.assertEqual(self.most_sustainable.call_count, 2)
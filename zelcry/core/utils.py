@@ -1,27 +1,20 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
+from .valuation import cents_to_decimal, value_holdings
 
 def calculate_portfolio_metrics(portfolio_assets, current_prices):
     """Calculate comprehensive portfolio metrics"""
-    total_value = Decimal('0')
-    total_invested = Decimal('0')
-    
-    for asset in portfolio_assets:
-        current_price = current_prices.get(asset.coin_id, {}).get('usd', 0)
-        invested = Decimal(str(asset.quantity)) * asset.purchase_price
-        value = Decimal(str(asset.quantity)) * Decimal(str(current_price))
-        
-        total_value += value
-        total_invested += invested
-    
-    profit_loss = total_value - total_invested
-    roi = ((profit_loss / total_invested) * 100) if total_invested > 0 else Decimal('0')
-    
+    valuation = value_holdings(
+        [asset.coin_id for asset in portfolio_assets],
+        [asset.quantity for asset in portfolio_assets],
+        [asset.purchase_price for asset in portfolio_assets],
+        current_prices,
+    )
     return {
-        'total_value': total_value,
-        'total_invested': total_invested,
-        'profit_loss': profit_loss,
-        'roi_percentage': roi
+        'total_value': cents_to_decimal(valuation['total_value_cents']),
+        'total_invested': cents_to_decimal(valuation['total_invested_cents']),
+        'profit_loss': cents_to_decimal(valuation['total_profit_loss_cents']),
+        'roi_percentage': Decimal(str(valuation['total_roi'])),
     }
 
 def get_risk_score(volatility_24h, market_cap_rank):
@@ -0,0 +1,127 @@
+from decimal import Decimal
+import numpy as np
+
+# Portfolio valuation for every page that shows one. Holdings arrive as
+# parallel arrays (coin ids, quantities, cost prices) and are valued against
+# one price vector per distinct coin in a single pass. Money is rounded to
+# whole cents per position and kept as int64 cents, so totals are exact sums
+# of what is displayed and convert to Decimal without float noise; ROI and
+# allocation are percentages rounded to PERCENT_PLACES.
+PERCENT_PLACES = 2
+
+
+def price_vector(coin_ids, prices):
+    """
+    Distinct coins in coin_ids (first-seen order), the position -> coin
+    index, and their USD price and 24h change from a get_coin_prices()
+    result (0 when missing)
+    """
+    positions = {}
+    inverse = np.fromiter((positions.setdefault(coin_id, len(positions)) for coin_id in coin_ids), dtype=np.int64)
+    coins = list(positions)
+    quotes = [prices.get(coin, {}) for coin in coins]
+    usd = np.fromiter((quote.get('usd') or 0 for quote in quotes), dtype=np.float64, count=len(quotes))
+    change = np.fromiter((quote.get('usd_24h_change') or 0 for quote in quotes), dtype=np.float64, count=len(quotes))
+    return coins, inverse, usd, change
+
+
+def _floats(values):
+    return np.fromiter(map(float, values), dtype=np.float64)
+
+
+def _percent(part, whole):
+    out = np.zeros(len(part), dtype=np.float64)
+    np.divide(part * 100.0, whole, out=out, where=whole != 0)
+    return np.round(out, PERCENT_PLACES)
+
+
+def value_holdings(coin_ids, quantities, cost_prices, prices):
+    """
+    Value positions against prices (coin_id -> {'usd', 'usd_24h_change'}).
+    Returns per-position arrays (price, change_24h, value_cents,
+    invested_cents, profit_loss_cents, roi, allocation) and totals in cents.
+    """
+    quantities = _floats(quantities)
+    cost_prices = _floats(cost_prices)
+    if not len(quantities):
+        empty = np.zeros(0, dtype=np.float64)
+        cents = np.zeros(0, dtype=np.int64)
+        return {
+            'price': empty, 'change_24h': empty, 'value_cents': cents, 'invested_cents': cents,
+            'profit_loss_cents': cents, 'roi': empty, 'allocation': empty,
+            'total_value_cents': 0, 'total_invested_cents': 0, 'total_profit_loss_cents': 0, 'total_roi': 0.0,
+        }
+
+    coins, inverse, usd, change = price_vector(coin_ids, prices)
+    price = usd[inverse]
+    value_cents = np.rint(quantities * price * 100).astype(np.int64)
+    invested_cents = np.rint(quantities * cost_prices * 100).astype(np.int64)
+    profit_loss_cents = value_cents - invested_cents
+
+    total_value_cents = int(value_cents.sum())
+    total_invested_cents = int(invested_cents.sum())
+    total_profit_loss_cents = total_value_cents - total_invested_cents
+    total_roi = round(total_profit_loss_cents * 100 / total_invested_cents, PERCENT_PLACES) if total_invested_cents > 0 else 0.0
+
+    return {
+        'price': price,
+        'change_24h': change[inverse],
+        'value_cents': value_cents,
+        'invested_cents': invested_cents,
+        'profit_loss_cents': profit_loss_cents,
+        'roi': _percent(profit_loss_cents, invested_cents),
+        'allocation': _percent(value_cents, total_value_cents),
+        'total_value_cents': total_value_cents,
+        'total_invested_cents': total_invested_cents,
+        'total_profit_loss_cents': total_profit_loss_cents,
+        'total_roi': total_roi,
+    }
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def dollars(cents):
+    """Cents (a number or an array) as float dollars for templates and charts"""
+    return cents / 100
+
+
+def value_portfolio(assets, prices):
+    """
+    Value PortfolioAsset rows, setting current_price, price_change_24h,
+    total_value, invested, profit_loss, roi and allocation on each, and
+    return the totals in dollars (total_value, total_invested, profit_loss,
+    roi_percentage) alongside the raw valuation.
+    """
+    valuation = value_holdings(
+        [asset.coin_id for asset in assets],
+        [asset.quantity for asset in assets],
+        [asset.purchase_price for asset in assets],
+        prices,
+    )
+    columns = zip(
+        valuation['price'].tolist(),
+        valuation['change_24h'].tolist(),
+        dollars(valuation['value_cents']).tolist(),
+        dollars(valuation['invested_cents']).tolist(),
+        dollars(valuation['profit_loss_cents']).tolist(),
+        valuation['roi'].tolist(),
+        valuation['allocation'].tolist(),
+    )
+    for asset, (price, change, value, invested, profit_loss, roi, allocation) in zip(assets, columns):
+        asset.current_price = price
+        asset.price_change_24h = change
+        asset.total_value = value
+        asset.invested = invested
+        asset.profit_loss = profit_loss
+        asset.roi = roi
+        asset.allocation = allocation
+
+    return {
+        'total_value': dollars(valuation['total_value_cents']),
+        'total_invested': dollars(valuation['total_invested_cents']),
+        'profit_loss': dollars(valuation['total_profit_loss_cents']),
+        'roi_percentage': valuation['total_roi'],
+        'valuation': valuation,
+    }
@@ -1,75 +1,48 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Sum, F, DecimalField
-from django.core.cache import cache
-from .models import UserProfile, PortfolioAsset, CryptoAssetDetails, ChatMessage, Watchlist, PriceAlert, PortfolioSnapshot
-from .groq_ai import get_zelcry_ai_response, get_market_analysis
-import requests
+from django.db.models import Sum, F, DecimalField, Q
+from .models import UserProfile, PortfolioAsset, CryptoAssetDetails, ChatMessage, Watchlist, PriceAlert
+from .groq_ai import get_zelcry_ai_response, stream_zelcry_ai_response, astream_zelcry_ai_response
+from .llm_dispatch import LLMBusyError
+from .market_analysis import get_latest_market_analysis
+from .chat_memory import load_history
+from .ai_context import build_user_context
+from .market_data import get_coin_prices, get_market_snapshot, prices_as_of
+from .charts import CHART_RANGES, get_chart_payload
+from .performance import DEFAULT_RANGE, PERFORMANCE_RANGES, get_performance
+from .portfolio_snapshots import append_snapshots, build_snapshot, unpriced
+from .valuation import dollars, value_portfolio
+from .xp import award_xp
+from . import ai_cache, http_client, cache_utils, coin_catalog, impact_index, llm_dispatch, llm_router
+from asgiref.sync import async_to_sync, sync_to_async
+from functools import partial
 import json
+import math
 import uuid
+from urllib.parse import urlencode
 from datetime import datetime
-from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Cached dashboard fragments are keyed by the data version they render, so
+# this only bounds how long superseded ones linger.
+DASHBOARD_FRAGMENT_TIMEOUT = 60 * 10
+
 def get_cached_coin_price(coin_id):
     """Get cached coin price or fetch from API"""
-    cache_key = f'coin_price_{coin_id}'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
-    try:
-        response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-            'ids': coin_id,
-            'vs_currencies': 'usd',
-            'include_24hr_change': True,
-            'include_market_cap': True,
-            'include_24hr_vol': True
-        }, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json().get(coin_id, {})
-            cache.set(cache_key, data, 300)
-            return data
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching price for {coin_id}: {e}")
-    
-    return {}
+    return get_coin_prices([coin_id]).get(coin_id, {})
 
 def get_cached_market_data(per_page=100):
-    """Get cached market data or fetch from API"""
-    cache_key = f'market_data_{per_page}'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
-    try:
-        response = requests.get('https://api.coingecko.com/api/v3/coins/markets', params={
-            'vs_currency': 'usd',
-            'order': 'market_cap_desc',
-            'per_page': per_page,
-            'page': 1,
-            'sparkline': False,
-            'price_change_percentage': '24h,7d'
-        }, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            cache.set(cache_key, data, 300)
-            return data
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching market data: {e}")
-    
-    return []
+    """Get pre-warmed market data (refreshed by the background ingester)"""
+    return get_market_snapshot(per_page)['coins']
 
 def index(request):
     return render(request, 'index.html')
@@ -92,8 +65,8 @@ def signup_view(request):
         
         user = User.objects.create_user(username=username, email=email, password=password1)
         user.profile.risk_tolerance = risk_tolerance
-        user.profile.xp_points = 50
-        user.profile.save()
+        user.profile.save(update_fields=['risk_tolerance'])
+        award_xp(user, 'signup')
         
         login(request, user)
         messages.success(request, f'Welcome to Zelcry, {username}! You earned 50 XP for joining! 🎉')
@@ -109,8 +82,7 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
-            user.profile.xp_points += 5
-            user.profile.save()
+            award_xp(user, 'login')
             messages.success(request, f'Welcome back! +5 XP')
             return redirect('dashboard')
         else:
@@ -138,101 +110,77 @@ def get_user_level_and_badge(xp_points):
 
 @login_required
 def dashboard(request):
-    all_coins = get_cached_market_data(100)
-    
-    top_coins = all_coins[:50]
+    market = get_market_snapshot(100)
+    portfolio_assets = list(PortfolioAsset.objects.filter(user=request.user))
+    prices = get_coin_prices(asset.coin_id for asset in portfolio_assets)
+    bitcoin_chart_data = get_chart_payload('bitcoin', days=30)
     
-    trending_coins = sorted(
-        [c for c in all_coins if c.get('price_change_percentage_24h')],
+    context = build_dashboard_context(request.user, market, portfolio_assets, prices, bitcoin_chart_data)
+    return render(request, 'dashboard.html', context)
+
+def top_gainers(coins, limit=10):
+    return sorted(
+        [c for c in coins if c.get('price_change_percentage_24h')],
         key=lambda x: x['price_change_percentage_24h'],
         reverse=True
-    )[:10]
-    
-    top_losers = sorted(
-        [c for c in all_coins if c.get('price_change_percentage_24h')],
+    )[:limit]
+
+def top_losers(coins, limit=10):
+    return sorted(
+        [c for c in coins if c.get('price_change_percentage_24h')],
         key=lambda x: x['price_change_percentage_24h']
-    )[:10]
-    
-    portfolio_assets = PortfolioAsset.objects.filter(user=request.user)
-    
-    total_portfolio_value = 0
-    total_invested = 0
+    )[:limit]
+
+def build_dashboard_context(user, market, portfolio_assets, prices, bitcoin_chart_data):
+    """
+    Dashboard context from already-loaded market, holdings, prices and chart.
+    The gainers and sustainable lists are the same for every user, so
+    dashboard.html caches their markup under the market's fetch time and
+    the impact index version; they are passed as callables and only built
+    on a cache miss.
+    """
+    all_coins = market['coins']
+    
+    totals = value_portfolio(portfolio_assets, prices)
     sustainable_count = 0
+    impact_scores = impact_index.get_index()
     
     for asset in portfolio_assets:
-        data = get_cached_coin_price(asset.coin_id)
-        asset.current_price = data.get('usd', 0)
-        asset.price_change_24h = data.get('usd_24h_change', 0)
-        asset.total_value = float(asset.quantity) * asset.current_price
-        asset.invested = float(asset.quantity) * float(asset.purchase_price)
-        asset.profit_loss = asset.total_value - asset.invested
-        asset.roi = ((asset.profit_loss / asset.invested) * 100) if asset.invested > 0 else 0
-        
-        total_portfolio_value += asset.total_value
-        total_invested += asset.invested
-        
-        try:
-            crypto_details = CryptoAssetDetails.objects.get(coin_id=asset.coin_id)
-            asset.impact_score = crypto_details.get_impact_score
-            if asset.impact_score >= 7:
-                sustainable_count += 1
-        except CryptoAssetDetails.DoesNotExist:
-            asset.impact_score = None
-    
-    total_profit_loss = total_portfolio_value - total_invested
-    total_roi = ((total_profit_loss / total_invested) * 100) if total_invested > 0 else 0
+        crypto_details = impact_scores.get(asset.coin_id)
+        asset.impact_score = crypto_details.get_impact_score if crypto_details else None
+        if asset.impact_score is not None and asset.impact_score >= 7:
+            sustainable_count += 1
     
-    num_coins = portfolio_assets.count()
+    num_coins = len(portfolio_assets)
     diversification_score = min(10, (num_coins / 10) * 10) if num_coins > 0 else 0
     sustainability_score = (sustainable_count / num_coins * 10) if num_coins > 0 else 0
     
-    try:
-        bitcoin_response = requests.get('https://api.coingecko.com/api/v3/coins/bitcoin/market_chart', params={
-            'vs_currency': 'usd',
-            'days': 30
-        }, timeout=10)
-        if bitcoin_response.status_code == 200:
-            bitcoin_data = bitcoin_response.json()
-            prices = bitcoin_data.get('prices', [])
-            labels = [datetime.fromtimestamp(p[0]/1000).strftime('%m/%d') for p in prices[::24]]
-            price_values = [p[1] for p in prices[::24]]
-            bitcoin_chart_data = {
-                'labels': labels,
-                'prices': price_values
-            }
-        else:
-            bitcoin_chart_data = {'labels': [], 'prices': []}
-    except:
-        bitcoin_chart_data = {'labels': [], 'prices': []}
-    
-    level_name, badge, level_num = get_user_level_and_badge(request.user.profile.xp_points)
+    level_name, badge, level_num = get_user_level_and_badge(user.profile.xp_points)
     next_level_xp = [50, 100, 250, 500, 1000][min(level_num, 4)]
-    progress_to_next = min(100, (request.user.profile.xp_points / next_level_xp * 100))
+    progress_to_next = min(100, (user.profile.xp_points / next_level_xp * 100))
     
-    sustainable_cryptos = CryptoAssetDetails.objects.filter(energy_score__gte=7).order_by('-energy_score')[:5]
-    
-    context = {
-        'top_coins': top_coins,
-        'trending_coins': trending_coins,
-        'top_losers': top_losers,
+    return {
+        'trending_coins': partial(top_gainers, all_coins),
         'portfolio_assets': portfolio_assets,
-        'total_portfolio_value': total_portfolio_value,
-        'total_invested': total_invested,
-        'total_profit_loss': total_profit_loss,
-        'total_roi': total_roi,
+        'total_portfolio_value': totals['total_value'],
+        'total_invested': totals['total_invested'],
+        'total_profit_loss': totals['profit_loss'],
+        'total_roi': totals['roi_percentage'],
         'num_coins': num_coins,
         'diversification_score': diversification_score,
         'sustainability_score': sustainability_score,
-        'bitcoin_chart_data': json.dumps(bitcoin_chart_data),
+        'bitcoin_chart_data': bitcoin_chart_data,
         'level_name': level_name,
         'badge': badge,
         'level_num': level_num,
         'next_level_xp': next_level_xp,
         'progress_to_next': progress_to_next,
-        'sustainable_cryptos': sustainable_cryptos,
+        'sustainable_cryptos': partial(impact_index.most_sustainable, 5),
+        'market_as_of': market['as_of'],
+        'market_version': market['as_of'].timestamp() if market['as_of'] else 0,
+        'impact_version': impact_index.current_version(),
+        'fragment_timeout': DASHBOARD_FRAGMENT_TIMEOUT,
     }
-    
-    return render(request, 'dashboard.html', context)
 
 @login_required
 def add_to_portfolio(request):
@@ -252,8 +200,7 @@ def add_to_portfolio(request):
             purchase_price=purchase_price
         )
         
-        request.user.profile.xp_points += 25
-        request.user.profile.save()
+        award_xp(request.user, 'portfolio_add')
         
         messages.success(request, f'Added {coin_name} to your portfolio! +25 XP 🎉')
         
@@ -262,50 +209,27 @@ def add_to_portfolio(request):
 @login_required
 def crypto_details(request, coin_id):
     crypto = get_object_or_404(CryptoAssetDetails, coin_id=coin_id)
+    chart_days = get_chart_days(request)
     
-    try:
-        price_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-            'ids': coin_id,
-            'vs_currencies': 'usd',
-            'include_24hr_change': True,
-            'include_market_cap': True,
-            'include_24hr_vol': True
-        }, timeout=5)
-        if price_response.status_code == 200:
-            price_data = price_response.json().get(coin_id, {})
-            current_price = price_data.get('usd', 0)
-            price_change_24h = price_data.get('usd_24h_change', 0)
-            market_cap = price_data.get('usd_market_cap', 0)
-            volume_24h = price_data.get('usd_24h_vol', 0)
-        else:
-            current_price = 0
-            price_change_24h = 0
-            market_cap = 0
-            volume_24h = 0
-    except:
-        current_price = 0
-        price_change_24h = 0
-        market_cap = 0
-        volume_24h = 0
+    price_data = get_cached_coin_price(coin_id)
+    chart_data = get_chart_payload(coin_id, days=chart_days)
     
+    context = build_crypto_details_context(crypto, price_data, chart_data, chart_days)
+    return render(request, 'crypto_details.html', context)
+
+def get_chart_days(request):
+    """Chart range from ?days=, limited to the ranges charts are cached for"""
     try:
-        chart_response = requests.get(f'https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart', params={
-            'vs_currency': 'usd',
-            'days': 30
-        }, timeout=10)
-        if chart_response.status_code == 200:
-            chart_data_raw = chart_response.json()
-            prices = chart_data_raw.get('prices', [])
-            labels = [datetime.fromtimestamp(p[0]/1000).strftime('%m/%d') for p in prices[::24]]
-            price_values = [p[1] for p in prices[::24]]
-            chart_data = {
-                'labels': labels,
-                'prices': price_values
-            }
-        else:
-            chart_data = {'labels': [], 'prices': []}
-    except:
-        chart_data = {'labels': [], 'prices': []}
+        chart_days = int(request.GET.get('days', 30))
+    except ValueError:
+        chart_days = 30
+    return chart_days if chart_days in CHART_RANGES else 30
+
+def build_crypto_details_context(crypto, price_data, chart_data, chart_days):
+    current_price = price_data.get('usd', 0)
+    price_change_24h = price_data.get('usd_24h_change', 0)
+    market_cap = price_data.get('usd_market_cap', 0)
+    volume_24h = price_data.get('usd_24h_vol', 0)
     
     energy_explanation = {
         range(0, 4): "⚠️ High energy consumption - Uses proof-of-work mining which requires significant electricity",
@@ -329,19 +253,19 @@ def crypto_details(request, coin_id):
     governance_exp = next((v for k, v in governance_explanation.items() if crypto.governance_score in k), "")
     utility_exp = next((v for k, v in utility_explanation.items() if crypto.utility_score in k), "")
     
-    context = {
+    return {
         'crypto': crypto,
         'current_price': current_price,
         'price_change_24h': price_change_24h,
         'market_cap': market_cap,
         'volume_24h': volume_24h,
-        'chart_data': json.dumps(chart_data),
+        'chart_data': chart_data,
+        'chart_days': chart_days,
+        'chart_ranges': CHART_RANGES,
         'energy_explanation': energy_exp,
         'governance_explanation': governance_exp,
         'utility_explanation': utility_exp,
     }
-    
-    return render(request, 'crypto_details.html', context)
 
 def ai_advisor(request):
     if request.user.is_authenticated:
@@ -358,6 +282,64 @@ def ai_advisor(request):
     }
     return render(request, 'ai_advisor.html', context)
 
+def llm_busy_response(error):
+    """503 telling the client to retry once an LLM slot is likely free"""
+    response = JsonResponse({
+        'error': str(error),
+        'response': f"{error}. Please try again in a few seconds.",
+        'busy': True,
+    }, status=503)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _first_token(tokens):
+    return await anext(tokens, None)
+
+def stream_ai_response(request, message, context, on_complete, personalized=False, history=None):
+    """
+    Server-sent events for an AI reply: a 'token' event per chunk as Groq
+    generates it, then a 'done' event carrying whatever on_complete(full
+    reply) returns. ASGI requests get an async stream so the reply is not
+    buffered by the handler.
+    """
+    # The first chunk is pulled before responding so a saturated LLM queue
+    # raises LLMBusyError here and becomes a 503 rather than a half-sent
+    # stream, on both paths.
+    if isinstance(request, ASGIRequest):
+        tokens = astream_zelcry_ai_response(message, context, history, personalized=personalized)
+        first = async_to_sync(_first_token)(tokens)
+
+        async def events():
+            parts = [first] if first is not None else []
+            if parts:
+                yield _sse('token', {'text': first})
+            async for token in tokens:
+                parts.append(token)
+                yield _sse('token', {'text': token})
+            yield _sse('done', await sync_to_async(on_complete)(''.join(parts)))
+        content = events()
+    else:
+        tokens = stream_zelcry_ai_response(message, context, history, personalized=personalized)
+        first = next(tokens, None)
+
+        def events():
+            parts = [first] if first is not None else []
+            if parts:
+                yield _sse('token', {'text': first})
+            for token in tokens:
+                parts.append(token)
+                yield _sse('token', {'text': token})
+            yield _sse('done', on_complete(''.join(parts)))
+        content = events()
+
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @csrf_exempt
 def ai_advisor_query(request):
@@ -366,29 +348,30 @@ def ai_advisor_query(request):
             data = json.loads(request.body)
             message = data.get('message', '')
             
-            portfolio_assets = PortfolioAsset.objects.filter(user=request.user)
-            portfolio_count = portfolio_assets.count()
-            risk_tolerance = request.user.profile.risk_tolerance
+            context = build_user_context(request.user)
             
-            portfolio_info = []
-            for asset in portfolio_assets[:5]:
-                portfolio_info.append(f"{asset.coin_name} ({asset.coin_symbol}): {asset.quantity}")
+            history, summary = load_history(user=request.user)
+            if summary:
+                context += f"\n{summary}"
             
-            context = f"""
-            User: {request.user.username}
-            Risk Tolerance: {risk_tolerance}
-            Portfolio: {portfolio_count} cryptocurrencies
-            Holdings: {', '.join(portfolio_info) if portfolio_info else 'No holdings yet'}
-            
-            Focus on sustainable crypto investing. Be concise and helpful.
-            """
+            def save_chat(response):
+                ChatMessage.objects.create(
+                    user=request.user,
+                    message=message,
+                    response=response
+                )
+                award_xp(request.user, 'ai_chat')
+                return {}
             
-            response = get_zelcry_ai_response(message, context)
+            if data.get('stream'):
+                return stream_ai_response(request, message, context, save_chat, personalized=True, history=history)
             
-            request.user.profile.xp_points += 2
-            request.user.profile.save()
+            response = get_zelcry_ai_response(message, context, history, personalized=True)
+            save_chat(response)
             
             return JsonResponse({'response': response})
+        except LLMBusyError as e:
+            return llm_busy_response(e)
         except Exception as e:
             logger.error(f"Error in AI advisor query: {e}")
             return JsonResponse({'response': 'Sorry, I had trouble processing that. Please try again.'})
@@ -401,7 +384,7 @@ def toggle_theme(request):
         data = json.loads(request.body)
         theme = data.get('theme', 'light')
         request.user.profile.theme = theme
-        request.user.profile.save()
+        request.user.profile.save(update_fields=['theme'])
         return JsonResponse({'success': True})
     return JsonResponse({'success': False})
 
@@ -411,25 +394,30 @@ def guest_chat(request):
         try:
             data = json.loads(request.body)
             message = data.get('message', '')
+            stream = bool(data.get('stream'))
 
             if not message:
                 return JsonResponse({'error': 'Message is required'}, status=400)
 
             if request.user.is_authenticated:
-                user_chats = ChatMessage.objects.filter(user=request.user).count()
-                response = get_zelcry_ai_response(message, f"User: {request.user.username}, Portfolio size: {request.user.portfolio_assets.count()} cryptocurrencies")
-
-                ChatMessage.objects.create(
-                    user=request.user,
-                    message=message,
-                    response=response
-                )
-
-                return JsonResponse({
-                    'response': response,
-                    'limit_reached': False,
-                    'messages_remaining': None
-                })
+                context = build_user_context(request.user)
+                history, summary = load_history(user=request.user)
+                if summary:
+                    context += f"\n{summary}"
+
+                def save_chat(response):
+                    ChatMessage.objects.create(
+                        user=request.user,
+                        message=message,
+                        response=response
+                    )
+                    return {'limit_reached': False, 'messages_remaining': None}
+
+                if stream:
+                    return stream_ai_response(request, message, context, save_chat, personalized=True, history=history)
+
+                response = get_zelcry_ai_response(message, context, history, personalized=True)
+                return JsonResponse({'response': response, **save_chat(response)})
             else:
                 session_id = request.session.get('guest_chat_id')
                 if not session_id:
@@ -445,128 +433,198 @@ def guest_chat(request):
                         'messages_remaining': 0
                     })
 
-                response = get_zelcry_ai_response(
-                    message,
-                    f"This is a guest user trying out the app. They have {3 - guest_chat_count} messages left. Be helpful and encourage them to sign up after their trial."
-                )
+                context = f"This is a guest user trying out the app. They have {3 - guest_chat_count} messages left. Be helpful and encourage them to sign up after their trial."
+                history, summary = load_history(session_id=session_id)
+                if summary:
+                    context += f"\n{summary}"
 
-                ChatMessage.objects.create(
-                    session_id=session_id,
-                    message=message,
-                    response=response
-                )
-
-                request.session['guest_chat_count'] = guest_chat_count + 1
                 messages_remaining = 3 - (guest_chat_count + 1)
 
-                return JsonResponse({
-                    'response': response,
-                    'limit_reached': False,
-                    'messages_remaining': messages_remaining
-                })
+                def save_chat(response):
+                    ChatMessage.objects.create(
+                        session_id=session_id,
+                        message=message,
+                        response=response
+                    )
+                    return {'limit_reached': False, 'messages_remaining': messages_remaining}
+
+                if stream:
+                    response = stream_ai_response(request, message, context, save_chat, history=history)
+                else:
+                    reply = get_zelcry_ai_response(message, context, history)
+                    response = JsonResponse({'response': reply, **save_chat(reply)})
+
+                # Counted before returning: a streamed reply is sent after
+                # the session cookie, and a busy LLM never gets this far.
+                request.session['guest_chat_count'] = guest_chat_count + 1
+                return response
+        except LLMBusyError as e:
+            return llm_busy_response(e)
         except Exception as e:
             logger.error(f"Error in guest chat: {e}")
             return JsonResponse({'error': 'An error occurred. Please try again.'}, status=500)
 
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+CRYPTO_SORTS = ('rank', 'impact', 'volume', 'change')
+CATALOG_SEARCH_LIMIT = 500
+COIN_SEARCH_RESULTS = 10
+
+def get_page_number(request):
+    """Page from ?page=, 1 when missing or not a positive number"""
+    try:
+        return max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return 1
+
+def get_crypto_filters(request):
+    """Sort order and minimum impact score (0-10) from the query string, ignoring bad values"""
+    sort = request.GET.get('sort', 'rank')
+    if sort not in CRYPTO_SORTS:
+        sort = 'rank'
+    try:
+        min_impact = float(request.GET.get('min_impact', ''))
+    except ValueError:
+        min_impact = None
+    if min_impact is not None:
+        min_impact = min(10.0, max(0.0, min_impact)) if math.isfinite(min_impact) else None
+    return sort, min_impact
+
+def _coin_from_prices(crypto, price_data):
+    """Table row for a scored coin missing from the catalog"""
+    return {
+        'id': crypto.coin_id,
+        'name': crypto.name,
+        'symbol': crypto.symbol.lower(),
+        'image': '',
+        'market_cap_rank': None,
+        'current_price': price_data.get('usd', 0),
+        'price_change_percentage_24h': price_data.get('usd_24h_change') or 0,
+        'price_change_percentage_7d_in_currency': 0,
+        'market_cap': price_data.get('usd_market_cap', 0),
+        'total_volume': price_data.get('usd_24h_vol', 0),
+    }
+
+def impact_ranked_coins(min_impact, search_query, page, per_page):
+    """
+    One page of scored coins, filtered and ordered by impact score in the
+    database, with market fields from the coin catalog or prices.
+    Returns the page's coins and whether another page follows.
+    """
+    details = CryptoAssetDetails.objects.order_by('-impact_score', 'coin_id')
+    if min_impact is not None:
+        details = details.filter(impact_score__gte=min_impact)
+    if search_query:
+        details = details.filter(Q(name__icontains=search_query) | Q(symbol__icontains=search_query))
+    rows = list(details[(page - 1) * per_page:page * per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    listed = coin_catalog.get_market_rows([crypto.coin_id for crypto in rows])
+    prices = get_coin_prices([crypto.coin_id for crypto in rows if crypto.coin_id not in listed])
+    coins = []
+    for crypto in rows:
+        coin = listed.get(crypto.coin_id) or _coin_from_prices(crypto, prices.get(crypto.coin_id, {}))
+        coin['impact_score'] = crypto.impact_score
+        coins.append(coin)
+    return coins, has_next
+
+def _market_page_coins(sort, search_query, page, per_page):
+    """Coins from the cached upstream markets page, used until the catalog is first synced"""
+    market = get_market_snapshot(per_page, page)
+    coins = market['coins']
+    has_next = len(coins) == per_page
+    if search_query:
+        coins = [c for c in coins if search_query in c['name'].lower() or search_query in c['symbol'].lower()]
+    if sort == 'volume':
+        coins = sorted(coins, key=lambda c: c.get('total_volume') or 0, reverse=True)
+    elif sort == 'change':
+        coins = sorted(coins, key=lambda c: c.get('price_change_percentage_24h') or 0, reverse=True)
+    return coins, has_next, market['as_of']
+
 def cryptocurrencies(request):
-    page = int(request.GET.get('page', 1))
+    page = get_page_number(request)
     search_query = request.GET.get('search', '').lower()
+    sort, min_impact = get_crypto_filters(request)
     per_page = 100
     
-    try:
-        response = requests.get('https://api.coingecko.com/api/v3/coins/markets', params={
-            'vs_currency': 'usd',
-            'order': 'market_cap_desc',
-            'per_page': per_page,
-            'page': page,
-            'sparkline': False,
-            'price_change_percentage': '24h,7d'
-        }, timeout=10)
-        
-        if response.status_code == 200:
-            all_coins = response.json()
-            if search_query:
-                all_coins = [c for c in all_coins if search_query in c['name'].lower() or search_query in c['symbol'].lower()]
-        else:
-            all_coins = []
-    except:
-        all_coins = []
+    catalog_ready = coin_catalog.is_ready()
+    market_as_of = coin_catalog.catalog_as_of()
+    if sort == 'impact' or min_impact is not None:
+        all_coins, has_next = impact_ranked_coins(min_impact, search_query, page, per_page)
+    elif catalog_ready:
+        coin_ids = None
+        if search_query:
+            coin_ids = [coin['id'] for coin in coin_catalog.search(search_query, CATALOG_SEARCH_LIMIT)]
+        all_coins, has_next = coin_catalog.get_page(sort, page, per_page, coin_ids)
+    else:
+        all_coins, has_next, market_as_of = _market_page_coins(sort, search_query, page, per_page)
     
-    for coin in all_coins:
-        try:
-            crypto_details = CryptoAssetDetails.objects.get(coin_id=coin['id'])
-            coin['impact_score'] = crypto_details.get_impact_score
-        except CryptoAssetDetails.DoesNotExist:
-            coin['impact_score'] = None
+    if sort != 'impact' and min_impact is None:
+        impact_scores = impact_index.get_index()
+        for coin in all_coins:
+            crypto_details = impact_scores.get(coin['id'])
+            coin['impact_score'] = crypto_details.get_impact_score if crypto_details else None
     
+    filters = {'search': search_query, 'sort': sort if sort != 'rank' else '', 'min_impact': request.GET.get('min_impact', '') if min_impact is not None else ''}
     context = {
         'coins': all_coins,
         'page': page,
         'search_query': search_query,
-        'has_next': len(all_coins) == per_page,
+        'sort': sort,
+        'min_impact': min_impact,
+        'filter_query': urlencode({name: value for name, value in filters.items() if value}),
+        'has_next': has_next,
         'has_prev': page > 1,
+        'market_as_of': market_as_of,
     }
     
     return render(request, 'cryptocurrencies.html', context)
 
+def coin_search(request):
+    """Typeahead over the whole coin catalog: ?q=<prefix or name>"""
+    results = coin_catalog.search(request.GET.get('q', ''), COIN_SEARCH_RESULTS)
+    return JsonResponse({'results': results})
+
 def news(request):
-    from .crypto_news import get_crypto_news, get_trending_news
+    from .crypto_news import get_crypto_news_snapshot
+    
+    market = get_market_snapshot(100)
+    news_snapshot = get_crypto_news_snapshot()
+    
+    context = build_news_context(request, market, news_snapshot)
+    return render(request, 'news.html', context)
+
+NEWS_PAGE_SIZE = 30
+
+def build_news_context(request, market, news_snapshot):
+    from .crypto_news import get_news_categories, get_news_page, news_cursor, parse_news_cursor
     
     category_filter = request.GET.get('category', '')
     search_query = request.GET.get('search', '')
+    before = parse_news_cursor(request.GET.get('before'))
+    after = None if before else parse_news_cursor(request.GET.get('after'))
     
-    try:
-        response = requests.get('https://api.coingecko.com/api/v3/coins/markets', params={
-            'vs_currency': 'usd',
-            'order': 'market_cap_desc',
-            'per_page': 10,
-            'page': 1,
-            'sparkline': False,
-            'price_change_percentage': '24h,7d'
-        }, timeout=10)
-        
-        top_movers = []
-        if response.status_code == 200:
-            coins = response.json()
-            top_movers = sorted(
-                [c for c in coins if c.get('price_change_percentage_24h')],
-                key=lambda x: abs(x['price_change_percentage_24h']),
-                reverse=True
-            )[:5]
-    except:
-        top_movers = []
-    
-    news_items = get_crypto_news(limit=30)
-    
-    for news_item in news_items:
-        if news_item.get('published_on'):
-            news_item['published_on'] = datetime.fromtimestamp(news_item['published_on'])
-    
-    if category_filter:
-        news_items = [n for n in news_items if category_filter.lower() in [c.lower() for c in n.get('categories', [])]]
-    
-    if search_query:
-        query_lower = search_query.lower()
-        news_items = [n for n in news_items if 
-                     query_lower in n['title'].lower() or 
-                     query_lower in n.get('body', '').lower()]
+    top_movers = sorted(
+        [c for c in market['coins'][:10] if c.get('price_change_percentage_24h')],
+        key=lambda x: abs(x['price_change_percentage_24h']),
+        reverse=True
+    )[:5]
     
-    available_categories = set()
-    for news in news_items:
-        available_categories.update(news.get('categories', []))
-    available_categories.discard('')
+    news_items, has_newer, has_older = get_news_page(category_filter, search_query, before, after, NEWS_PAGE_SIZE)
+    filters = {'search': search_query, 'category': category_filter}
     
-    context = {
+    return {
         'news_items': news_items,
         'top_movers': top_movers,
-        'available_categories': sorted(list(available_categories)),
+        'available_categories': get_news_categories(),
         'selected_category': category_filter,
         'search_query': search_query,
+        'newer_cursor': news_cursor(news_items[0]) if has_newer and news_items else '',
+        'older_cursor': news_cursor(news_items[-1]) if has_older and news_items else '',
+        'filter_query': urlencode({name: value for name, value in filters.items() if value}),
+        'news_as_of': news_snapshot['as_of'],
     }
-    
-    return render(request, 'news.html', context)
 
 def terms_of_service(request):
     context = {'current_date': datetime.now()}
@@ -594,32 +652,27 @@ def watchlist(request):
             }
         )
         
-        request.user.profile.xp_points += 5
-        request.user.profile.save()
+        award_xp(request.user, 'watchlist_add')
         messages.success(request, f'Added {coin_name} to your watchlist! +5 XP')
         return redirect('watchlist')
     
-    watchlist_items = Watchlist.objects.filter(user=request.user)
+    watchlist_items = list(Watchlist.objects.filter(user=request.user))
+    prices = get_coin_prices(item.coin_id for item in watchlist_items)
     
-    for item in watchlist_items:
-        try:
-            price_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-                'ids': item.coin_id,
-                'vs_currencies': 'usd',
-                'include_24hr_change': True
-            }, timeout=5)
-            if price_response.status_code == 200:
-                data = price_response.json().get(item.coin_id, {})
-                item.current_price = data.get('usd', 0)
-                item.price_change_24h = data.get('usd_24h_change', 0)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching price for watchlist {item.coin_id}: {e}")
-            item.current_price = 0
-            item.price_change_24h = 0
-    
-    context = {'watchlist_items': watchlist_items}
+    context = build_watchlist_context(watchlist_items, prices)
     return render(request, 'watchlist.html', context)
 
+def build_watchlist_context(watchlist_items, prices):
+    for item in watchlist_items:
+        data = prices.get(item.coin_id, {})
+        item.current_price = data.get('usd', 0)
+        item.price_change_24h = data.get('usd_24h_change', 0)
+    
+    return {
+        'watchlist_items': watchlist_items,
+        'prices_as_of': prices_as_of(prices),
+    }
+
 
 @login_required
 def remove_from_watchlist(request, coin_id):
@@ -644,36 +697,17 @@ def price_alerts(request):
             condition=condition
         )
         
-        request.user.profile.xp_points += 10
-        request.user.profile.save()
+        award_xp(request.user, 'price_alert')
         messages.success(request, f'Price alert created for {coin_name}! +10 XP')
         return redirect('price_alerts')
     
     alerts = PriceAlert.objects.filter(user=request.user, is_active=True)
     
+    prices = get_coin_prices(alert.coin_id for alert in alerts)
+    
+    # Alerts are triggered by the background evaluator on every price tick
     for alert in alerts:
-        try:
-            price_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-                'ids': alert.coin_id,
-                'vs_currencies': 'usd'
-            }, timeout=5)
-            if price_response.status_code == 200:
-                data = price_response.json().get(alert.coin_id, {})
-                alert.current_price = data.get('usd', 0)
-                
-                if alert.condition == 'above' and alert.current_price >= float(alert.target_price):
-                    alert.triggered = True
-                    alert.triggered_at = datetime.now()
-                    alert.is_active = False
-                    alert.save()
-                elif alert.condition == 'below' and alert.current_price <= float(alert.target_price):
-                    alert.triggered = True
-                    alert.triggered_at = datetime.now()
-                    alert.is_active = False
-                    alert.save()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching price for alert {alert.coin_id}: {e}")
-            alert.current_price = 0
+        alert.current_price = prices.get(alert.coin_id, {}).get('usd', 0)
     
     triggered_alerts = PriceAlert.objects.filter(user=request.user, triggered=True).order_by('-triggered_at')[:10]
     
@@ -693,95 +727,52 @@ def delete_alert(request, alert_id):
 
 @login_required
 def portfolio_analytics(request):
-    portfolio_assets = PortfolioAsset.objects.filter(user=request.user)
-    snapshots = PortfolioSnapshot.objects.filter(user=request.user).order_by('-created_at')[:30]
-    
-    total_value = 0
-    total_invested = 0
-    asset_allocation = []
+    portfolio_assets = list(PortfolioAsset.objects.filter(user=request.user))
     
-    for asset in portfolio_assets:
-        try:
-            price_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-                'ids': asset.coin_id,
-                'vs_currencies': 'usd'
-            }, timeout=5)
-            if price_response.status_code == 200:
-                data = price_response.json().get(asset.coin_id, {})
-                current_price = data.get('usd', 0)
-                asset_value = float(asset.quantity) * current_price
-                total_value += asset_value
-                invested = float(asset.quantity) * float(asset.purchase_price)
-                total_invested += invested
-                
-                asset_allocation.append({
-                    'name': asset.coin_name,
-                    'value': asset_value,
-                    'percentage': 0
-                })
-        except:
-            pass
-    
-    for allocation in asset_allocation:
-        allocation['percentage'] = (allocation['value'] / total_value * 100) if total_value > 0 else 0
-    
-    profit_loss = total_value - total_invested
-    roi = ((profit_loss / total_invested) * 100) if total_invested > 0 else 0
+    prices = get_coin_prices(asset.coin_id for asset in portfolio_assets)
+    totals = value_portfolio(portfolio_assets, prices)
+    valuation = totals['valuation']
     
     if request.method == 'POST' and request.POST.get('create_snapshot'):
-        PortfolioSnapshot.objects.create(
-            user=request.user,
-            total_value=Decimal(str(total_value)),
-            total_invested=Decimal(str(total_invested)),
-            profit_loss=Decimal(str(profit_loss)),
-            roi_percentage=Decimal(str(roi))
-        )
-        messages.success(request, 'Portfolio snapshot created!')
+        if unpriced([asset.coin_id for asset in portfolio_assets], prices):
+            messages.error(request, 'Prices are unavailable for some of your holdings. Please try again shortly.')
+        else:
+            append_snapshots([build_snapshot(request.user.pk, valuation['total_value_cents'], valuation['total_invested_cents'])])
+            messages.success(request, 'Portfolio snapshot created!')
         return redirect('portfolio_analytics')
     
+    performance_range = request.GET.get('range', DEFAULT_RANGE)
+    if performance_range not in PERFORMANCE_RANGES:
+        performance_range = DEFAULT_RANGE
+    performance = get_performance(request.user, performance_range)
     snapshot_data = {
-        'labels': [s.created_at.strftime('%m/%d') for s in reversed(snapshots)],
-        'values': [float(s.total_value) for s in reversed(snapshots)]
+        'labels': performance['labels'] if performance else [],
+        'values': performance['values'] if performance else [],
     }
     
-    for asset in portfolio_assets:
-        try:
-            price_response = requests.get(f'https://api.coingecko.com/api/v3/simple/price', params={
-                'ids': asset.coin_id,
-                'vs_currencies': 'usd',
-                'include_24hr_change': True
-            }, timeout=5)
-            if price_response.status_code == 200:
-                data = price_response.json().get(asset.coin_id, {})
-                asset.current_price = data.get('usd', 0)
-                asset.price_change_24h = data.get('usd_24h_change', 0)
-                asset.total_value = float(asset.quantity) * asset.current_price
-                asset.invested = float(asset.quantity) * float(asset.purchase_price)
-                asset.profit_loss = asset.total_value - asset.invested
-                asset.roi = ((asset.profit_loss / asset.invested) * 100) if asset.invested > 0 else 0
-        except:
-            asset.current_price = 0
-            asset.total_value = 0
-            asset.profit_loss = 0
-            asset.roi = 0
-
     asset_labels = [asset.coin_name for asset in portfolio_assets]
-    asset_values = [float(asset.total_value) if hasattr(asset, 'total_value') else 0 for asset in portfolio_assets]
-    asset_roi = [float(asset.roi) if hasattr(asset, 'roi') else 0 for asset in portfolio_assets]
+    asset_values = dollars(valuation['value_cents']).tolist()
+    asset_allocation = [
+        {'name': asset.coin_name, 'value': asset.total_value, 'percentage': asset.allocation}
+        for asset in portfolio_assets
+    ]
     
     context = {
         'portfolio_assets': portfolio_assets,
-        'total_assets': portfolio_assets.count(),
-        'total_value': total_value,
-        'total_invested': total_invested,
-        'total_profit_loss': profit_loss,
-        'total_roi': roi,
+        'total_assets': len(portfolio_assets),
+        'total_value': totals['total_value'],
+        'total_invested': totals['total_invested'],
+        'total_profit_loss': totals['profit_loss'],
+        'total_roi': totals['roi_percentage'],
         'asset_allocation': asset_allocation,
         'asset_labels': json.dumps(asset_labels),
         'asset_values': json.dumps(asset_values),
-        'asset_roi': json.dumps(asset_roi),
-        'snapshots': snapshots,
-        'snapshot_data': json.dumps(snapshot_data)
+        'asset_roi': json.dumps(valuation['roi'].tolist()),
+        'performance': performance,
+        'performance_range': performance_range,
+        'performance_ranges': list(PERFORMANCE_RANGES),
+        'snapshot_data': json.dumps(snapshot_data),
+        'prices_as_of': prices_as_of(prices),
     }
     
     return render(request, 'portfolio_analytics.html', context)
@@ -790,57 +781,27 @@ def portfolio_analytics(request):
 @login_required
 def market_insights(request):
     """AI-powered market insights and personalized recommendations"""
-    try:
-        response = requests.get('https://api.coingecko.com/api/v3/coins/markets', params={
-            'vs_currency': 'usd',
-            'order': 'market_cap_desc',
-            'per_page': 20,
-            'page': 1,
-            'sparkline': False,
-            'price_change_percentage': '24h'
-        }, timeout=10)
-        
-        if response.status_code == 200:
-            market_data = response.json()
-            
-            market_summary = []
-            for coin in market_data[:10]:
-                market_summary.append(f"{coin['name']}: ${coin['current_price']:.2f} ({coin.get('price_change_percentage_24h', 0):.2f}%)")
-            
-            market_text = "\n".join(market_summary)
-            
-            ai_insights = get_market_analysis(market_text)
-        else:
-            ai_insights = None
-            market_data = []
-    except:
-        ai_insights = None
-        market_data = []
-    
-    portfolio_assets = PortfolioAsset.objects.filter(user=request.user)
-    risk_tolerance = request.user.profile.risk_tolerance
-    
-    top_gainers = sorted(
-        [c for c in market_data if c.get('price_change_percentage_24h')],
-        key=lambda x: x['price_change_percentage_24h'],
-        reverse=True
-    )[:10]
+    market = get_market_snapshot(100)
+    analysis = get_latest_market_analysis()
     
-    top_losers = sorted(
-        [c for c in market_data if c.get('price_change_percentage_24h')],
-        key=lambda x: x['price_change_percentage_24h']
-    )[:10]
+    context = build_market_insights_context(request.user, market, analysis)
+    return render(request, 'market_insights.html', context)
+
+def build_market_insights_context(user, market, analysis):
+    market_data = market['coins'][:20]
+    portfolio_assets = PortfolioAsset.objects.filter(user=user)
+    risk_tolerance = user.profile.risk_tolerance
     
-    context = {
-        'ai_analysis': ai_insights,
-        'top_gainers': top_gainers,
-        'top_losers': top_losers,
+    return {
+        'ai_analysis': analysis['analysis'],
+        'analysis_as_of': analysis['as_of'],
+        'top_gainers': top_gainers(market_data),
+        'top_losers': top_losers(market_data),
         'market_overview': market_data,
         'portfolio_count': portfolio_assets.count(),
-        'risk_tolerance': risk_tolerance
+        'risk_tolerance': risk_tolerance,
+        'market_as_of': market['as_of'],
     }
-    
-    return render(request, 'market_insights.html', context)
 
 
 @csrf_exempt
@@ -854,3 +815,17 @@ def refresh_crypto_data(request):
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+
+
+@staff_member_required
+def ops_stats(request):
+    """Per-process upstream client, cache, AI, LLM and impact index counters for operators"""
+    return JsonResponse({
+        'http': http_client.get_stats(),
+        'cache': cache_utils.get_stats(),
+        'ai_cache': ai_cache.get_stats(),
+        'llm': llm_dispatch.get_stats(),
+        'llm_models': llm_router.get_stats(),
+        'impact_index': impact_index.get_stats(),
+        'coin_catalog': coin_catalog.get_stats(),
+    })
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models import F
+from .models import UserProfile, XPEvent
+
+# Points per action. Every award is a ledger row plus an F() increment of
+# the profile balance in one transaction, so concurrent awards for the same
+# user never overwrite each other.
+XP_AWARDS = {
+    'signup': 50,
+    'login': 5,
+    'portfolio_add': 25,
+    'watchlist_add': 5,
+    'price_alert': 10,
+    'ai_chat': 2,
+}
+
+
+def award_xp(user, reason):
+    """Record an XP award for user and add it to their balance; returns the points"""
+    points = XP_AWARDS[reason]
+    with transaction.atomic():
+        XPEvent.objects.create(user=user, reason=reason, points=points)
+        UserProfile.objects.filter(user=user).update(xp_points=F('xp_points') + points)
+    return points
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from decouple import config
 import os
+import tempfile
 import dj_database_url  # Added for Render database connection
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -101,6 +102,11 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # SQLite ignores select_for_update; taking the write lock when
+            # a transaction starts serializes them instead
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+            },
         }
     }
 
@@ -154,18 +160,88 @@ LOGOUT_REDIRECT_URL = '/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cache Configuration
+# File-backed so every gunicorn worker shares one copy of market data,
+# prices and news instead of fetching its own. Point CACHE_DIR at any
+# writable path; no external cache service is needed.
+CACHE_DIR = config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'zelcry-cache'))
+CACHE_LOCK_DIR = os.path.join(CACHE_DIR, 'locks')
+# Once 'default' holds CACHE_MAX_ENTRIES files Django culls a third of them
+# at random; per-user contexts and per-guest chat summaries are what fill
+# it, so size this for the number of active users and guests.
+CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=20000, cast=int)
+
 CACHES = {
     'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'data'),
+        'OPTIONS': {
+            'MAX_ENTRIES': CACHE_MAX_ENTRIES
+        }
+    },
+    # Index versions, flags and job output that nothing rebuilds on read
+    # (see cache_utils.state_cache). The set of keys is small and fixed, so
+    # this cache never fills up and culls them.
+    'state': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'state'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000
+        }
+    },
+    # {% cache %} fragments. Their keys carry the version of the data they
+    # render, so each worker can keep its own copy in memory and never serve
+    # a stale one; reading a file would cost as much as rendering them.
+    'template_fragments': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'zelcry-cache',
+        'LOCATION': 'zelcry-fragments',
         'OPTIONS': {
-            'MAX_ENTRIES': 1000
+            'MAX_ENTRIES': 500
         }
     }
 }
 
+# Background Jobs
+# 'web': the first gunicorn worker to take SCHEDULER_LOCK_FILE runs the jobs,
+#        the others stand by and take over if it exits. Only processes
+#        loaded through zelcry/asgi.py or wsgi.py (and runserver) qualify.
+# 'worker': web processes never schedule; run `python manage.py run_jobs`.
+SCHEDULER_MODE = config('SCHEDULER_MODE', default='web')
+SCHEDULER_LOCK_FILE = os.path.join(CACHE_DIR, 'scheduler.lock')
+SCHEDULER_THREADS = config('SCHEDULER_THREADS', default=4, cast=int)
+
+# Every user's portfolio value is snapshotted on this interval for the
+# analytics history (see core/portfolio_snapshots.py).
+PORTFOLIO_SNAPSHOT_HOURS = config('PORTFOLIO_SNAPSHOT_HOURS', default=24, cast=int)
+# Annual risk-free rate the Sharpe ratio on portfolio analytics is measured against
+RISK_FREE_RATE = config('RISK_FREE_RATE', default=0.04, cast=float)
+
+# Serve the I/O-heavy pages from core/async_views.py. Only worthwhile under
+# ASGI (gunicorn with uvicorn workers on zelcry.asgi, see render.yaml).
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 # AI Configuration - Zelcry AI (Groq)
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
+# Point at `python manage.py run_groq_standin` to develop without Groq.
+GROQ_BASE_URL = config('GROQ_BASE_URL', default='')
+
+# Model routing (see core/llm_router.py). Chat questions up to
+# LLM_FAST_MAX_TOKENS go to the fast model, analysis to the large one; a
+# model that errors or whose median latency exceeds LLM_SLOW_SECONDS is
+# tried second, and a call that has not answered in LLM_FAILOVER_AFTER
+# seconds moves on to the other model.
+LLM_FAST_MODEL = config('LLM_FAST_MODEL', default='llama-3.1-8b-instant')
+LLM_LARGE_MODEL = config('LLM_LARGE_MODEL', default='llama-3.3-70b-versatile')
+LLM_FAST_MAX_TOKENS = config('LLM_FAST_MAX_TOKENS', default=120, cast=int)
+LLM_SLOW_SECONDS = config('LLM_SLOW_SECONDS', default=8, cast=float)
+LLM_FAILOVER_AFTER = config('LLM_FAILOVER_AFTER', default=12, cast=float)
+
+# LLM admission control, shared by every worker (see core/llm_dispatch.py).
+# At most LLM_MAX_CONCURRENCY Groq calls run at once and LLM_MAX_QUEUE more
+# may wait up to LLM_QUEUE_TIMEOUT seconds; anything beyond that gets a 503.
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', default=2, cast=int)
+LLM_MAX_QUEUE = config('LLM_MAX_QUEUE', default=4, cast=int)
+LLM_QUEUE_TIMEOUT = config('LLM_QUEUE_TIMEOUT', default=5, cast=float)
+LLM_CALL_TIMEOUT = config('LLM_CALL_TIMEOUT', default=30, cast=float)
 
 # Crypto News API (optional - has free tier)
 CRYPTOCOMPARE_API_KEY = config('CRYPTOCOMPARE_API_KEY', default='')
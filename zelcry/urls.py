@@ -14,9 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from zelcry.core import views
+from zelcry.core import views, async_views
+
+# I/O-heavy pages have async variants for ASGI deployments
+io_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,22 +29,24 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', io_views.dashboard, name='dashboard'),
     path('add-to-portfolio/', views.add_to_portfolio, name='add_to_portfolio'),
-    path('crypto/<str:coin_id>/', views.crypto_details, name='crypto_details'),
+    path('crypto/<str:coin_id>/', io_views.crypto_details, name='crypto_details'),
     path('ai-advisor/', views.ai_advisor, name='ai_advisor'),
     path('ai-advisor/query/', views.ai_advisor_query, name='ai_advisor_query'),
     path('toggle-theme/', views.toggle_theme, name='toggle_theme'),
     path('guest-chat/', views.guest_chat, name='guest_chat'),
     path('cryptocurrencies/', views.cryptocurrencies, name='cryptocurrencies'),
-    path('news/', views.news, name='news'),
+    path('cryptocurrencies/search/', views.coin_search, name='coin_search'),
+    path('news/', io_views.news, name='news'),
     path('terms/', views.terms_of_service, name='terms_of_service'),
     path('privacy/', views.privacy_policy, name='privacy_policy'),
-    path('watchlist/', views.watchlist, name='watchlist'),
+    path('watchlist/', io_views.watchlist, name='watchlist'),
     path('watchlist/remove/<str:coin_id>/', views.remove_from_watchlist, name='remove_from_watchlist'),
     path('price-alerts/', views.price_alerts, name='price_alerts'),
     path('price-alerts/delete/<int:alert_id>/', views.delete_alert, name='delete_alert'),
     path('portfolio-analytics/', views.portfolio_analytics, name='portfolio_analytics'),
-    path('market-insights/', views.market_insights, name='market_insights'),
+    path('market-insights/', io_views.market_insights, name='market_insights'),
     path('refresh-crypto-data/', views.refresh_crypto_data, name='refresh_crypto_data'),
+    path('ops/stats/', views.ops_stats, name='ops_stats'),
 ]